@@ -34,6 +34,30 @@ def create_app(config_class=Config):
     # Import models to register them with SQLAlchemy
     from app import models
 
+    # Pool checkout counters and per-scope SQL timing
+    from app.db_monitor import pool_monitor
+    pool_monitor.init_app(app)
+
+    # Per-request SQL/template/total timing, Server-Timing header and /admin/perf
+    from app.perf import request_stats
+    request_stats.init_app(app)
+
+    # Prometheus metrics: request latency histograms and app gauges at /metrics
+    from app.metrics import metrics
+    metrics.init_app(app)
+
+    # Sampled slow-query log with background EXPLAIN, browsed at /admin/perf/slow-queries
+    from app.slow_queries import slow_queries
+    slow_queries.init_app(app)
+
+    # Repeated-statement (N+1) warnings in debug and tests
+    from app.nplusone import nplusone
+    nplusone.init_app(app)
+
+    # Response cache for public pages, invalidated on catalog writes
+    from app.cache import response_cache
+    response_cache.init_app(app)
+
     # Register Blueprints
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
@@ -54,6 +78,17 @@ def create_app(config_class=Config):
     from app.messages import bp as messages_bp
     app.register_blueprint(messages_bp, url_prefix='/messages')
 
+    # Register CLI commands for scheduled jobs
+    from app.commands import register_commands
+    register_commands(app)
+
+    # Template helpers for thumbnail src/srcset
+    from app.services import MediaService, FacetService
+    MediaService.init_app(app)
+
+    # Keep catalog facet counts in step with book writes
+    FacetService.init_app(app)
+
     # Update last_seen timestamp on every request
     @app.before_request
     def before_request():
@@ -63,6 +98,10 @@ def create_app(config_class=Config):
             current_user.last_seen = datetime.utcnow()
             db.session.commit()
 
+    # Green psycopg2 and blocking-call offload when Socket.IO runs on eventlet/gevent
+    from app import concurrency
+    concurrency.init_app(app)
+
     # Initialize Socket.IO with Redis message queue
     socketio.init_app(
         app,
@@ -73,6 +112,18 @@ def create_app(config_class=Config):
         engineio_logger=app.config.get('SOCKETIO_ENGINEIO_LOGGER', False)
     )
     
+    # Coalesced online/offline updates to each user's contacts
+    from app.messages.presence import presence
+    presence.init_app(app)
+    
+    # Open sockets per user, shared across processes when Redis is configured
+    from app.messages.connections import connections
+    connections.init_app(app)
+    
+    # Typing indicators reduced to start/stop transitions per sender/recipient pair
+    from app.messages.typing import typing
+    typing.init_app(app)
+    
     # Register Socket.IO events
     from app.messages import events
 
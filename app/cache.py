@@ -0,0 +1,200 @@
+"""
+Response cache for public pages.
+
+Anonymous GET responses of decorated views are stored per route and query
+string in an in-process or Redis backend. Keys, ETags and Last-Modified
+come from the 'catalog' CacheVersion counter, which is bumped after any
+commit that touched books, ebooks, campaigns, categories or management
+members, so a write invalidates every cached page at once.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+from cachetools import TLRUCache
+from flask import current_app, request, session, make_response, Response
+from flask_login import current_user
+from sqlalchemy import event, select, update, insert
+from app.extensions import db
+
+CATALOG = 'catalog'
+# Tables whose writes change what the cached pages show
+TRACKED_TABLES = {'books', 'ebooks', 'campaigns', 'categories', 'management_members'}
+
+
+class SimpleBackend:
+    """Per-process LRU cache with per-entry TTLs. Each worker has its own copy."""
+
+    def __init__(self, max_entries):
+        self._cache = TLRUCache(maxsize=max_entries, ttu=lambda key, value, now: now + value[0])
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+        return entry[1] if entry else None
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._cache[key] = (ttl, value)
+
+
+class RedisBackend:
+    """Redis cache shared by all workers. Errors count as misses so pages still render."""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5)
+
+    def get(self, key):
+        try:
+            raw = self._redis.get(key)
+        except Exception:
+            current_app.logger.warning('Response cache: Redis unavailable', exc_info=True)
+            return None
+        if raw is None:
+            return None
+        mimetype, _, body = raw.partition(b'\n')
+        return mimetype.decode(), body
+
+    def set(self, key, value, ttl):
+        mimetype, body = value
+        try:
+            self._redis.setex(key, ttl, mimetype.encode() + b'\n' + body)
+        except Exception:
+            current_app.logger.warning('Response cache: Redis unavailable', exc_info=True)
+
+
+class ResponseCache:
+    """Holds the configured backend and hit/miss counters."""
+
+    def __init__(self):
+        self.backend = None
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def init_app(self, app):
+        kind = app.config.get('RESPONSE_CACHE_BACKEND', 'simple')
+        if kind == 'redis':
+            self.backend = RedisBackend(app.config.get('RESPONSE_CACHE_REDIS_URL') or app.config.get('REDIS_URL'))
+        elif kind == 'simple':
+            self.backend = SimpleBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+        else:
+            self.backend = None
+
+        if not event.contains(db.session, 'after_flush', _track_flush):
+            event.listen(db.session, 'after_flush', _track_flush)
+            event.listen(db.session, 'do_orm_execute', _track_execute)
+            event.listen(db.session, 'after_commit', _bump_after_commit)
+            event.listen(db.session, 'after_rollback', _forget_after_rollback)
+
+
+response_cache = ResponseCache()
+
+
+def _track_flush(sess, flush_context):
+    for obj in (*sess.new, *sess.dirty, *sess.deleted):
+        if getattr(obj, '__tablename__', None) in TRACKED_TABLES:
+            sess.info['catalog_changed'] = True
+            return
+
+
+def _track_execute(state):
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, 'table', None)
+        if getattr(table, 'name', None) in TRACKED_TABLES:
+            state.session.info['catalog_changed'] = True
+
+
+def _bump_after_commit(sess):
+    if sess.info.pop('catalog_changed', False):
+        bump_version(CATALOG)
+
+
+def _forget_after_rollback(sess):
+    sess.info.pop('catalog_changed', None)
+
+
+def bump_version(name):
+    """Increment a cache version in its own short transaction, creating it if needed."""
+    table = db.metadata.tables['cache_versions']
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        result = conn.execute(update(table).where(table.c.name == name)
+                              .values(version=table.c.version + 1, updated_at=now))
+        if result.rowcount == 0:
+            conn.execute(insert(table).values(name=name, version=1, updated_at=now))
+
+
+def get_version(name):
+    """(version, updated_at) of a cache version, (0, None) if it was never bumped."""
+    table = db.metadata.tables['cache_versions']
+    row = db.session.execute(select(table.c.version, table.c.updated_at).where(table.c.name == name)).first()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def cached_response(ttl):
+    """
+    Cache a public view's response for anonymous visitors.
+
+    The key holds the endpoint, the sorted query args, the catalog version
+    and the current TTL window, so time-dependent content (like campaign
+    schedules) also refreshes every `ttl` seconds. Conditional requests
+    are answered with 304 before the view runs.
+
+    Args:
+        ttl: Seconds a rendered page may be served from the cache; the
+            RESPONSE_CACHE_TTLS config ({endpoint: seconds}) overrides it
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if response_cache.backend is None or request.method != 'GET' \
+                    or current_user.is_authenticated or session.get('_flashes'):
+                return f(*args, **kwargs)
+
+            timeout = current_app.config.get('RESPONSE_CACHE_TTLS', {}).get(request.endpoint, ttl)
+            version, updated_at = get_version(CATALOG)
+            query = urlencode(sorted(request.args.items(multi=True)))
+            window = int(time.time() // timeout)
+            key = f'page:{request.endpoint}:{version}:{window}:{query}'
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            # The page may also change when a new TTL window starts
+            last_modified = datetime.fromtimestamp(window * timeout, timezone.utc)
+            if updated_at:
+                last_modified = max(last_modified, updated_at.replace(microsecond=0, tzinfo=timezone.utc))
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(request.if_modified_since and request.if_modified_since >= last_modified)
+
+            if not_modified:
+                response = Response(status=304)
+                response_cache.stats['not_modified'] += 1
+            else:
+                cached = response_cache.backend.get(key)
+                if cached:
+                    mimetype, body = cached
+                    response = Response(body, mimetype=mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    response_cache.stats['hits'] += 1
+                else:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    response_cache.backend.set(key, (response.mimetype, response.get_data()), timeout)
+                    response.headers['X-Cache'] = 'MISS'
+                    response_cache.stats['misses'] += 1
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # Always revalidate; logged-in visitors get a different page at the same URL
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            return response
+        return decorated_function
+    return decorator
@@ -2,9 +2,12 @@ import google.generativeai as genai
 from flask import current_app
 from app.models import Book, User, Loan, Cart, CartItem, Sale, Category
 from app.extensions import db
+from app.concurrency import offload
+from app.metrics import observe, CHATBOT_LATENCY, CHATBOT_MESSAGES, LLM_LATENCY, LLM_TOKENS
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
 import json
+import time
 
 class ChatbotService:
     """Service class for handling chatbot interactions with Gemini API"""
@@ -165,6 +168,7 @@ class ChatbotService:
         )
 
         
+    @observe(CHATBOT_LATENCY, CHATBOT_MESSAGES)
     def process_message(self, user_message, user_id=None, is_staff=False, conversation_history=None):
         """
         Process a user message and return a response
@@ -202,7 +206,7 @@ class ChatbotService:
             context += "Regular customer user."
         
         # Send message
-        response = self.chat.send_message(user_message + context)
+        response = self._send(user_message + context)
         
         # Handle function calls
         intent = None
@@ -225,7 +229,7 @@ class ChatbotService:
                     metadata[function_name] = result
                     
                     # Send function response back to model
-                    response = self.chat.send_message(
+                    response = self._send(
                         genai.protos.Content(
                             parts=[genai.protos.Part(
                                 function_response=genai.protos.FunctionResponse(
@@ -237,7 +241,7 @@ class ChatbotService:
                     )
                 except Exception as e:
                     error_msg = f"Error executing {function_name}: {str(e)}"
-                    response = self.chat.send_message(
+                    response = self._send(
                         genai.protos.Content(
                             parts=[genai.protos.Part(
                                 function_response=genai.protos.FunctionResponse(
@@ -260,6 +264,18 @@ class ChatbotService:
             'metadata': metadata
         }
     
+    def _send(self, content):
+        """Send to the model, timing the call and counting its tokens"""
+        # The Gemini client blocks in gRPC, so keep it off the event loop
+        start = time.perf_counter()
+        response = offload(self.chat.send_message, content)
+        LLM_LATENCY.observe(time.perf_counter() - start)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            LLM_TOKENS.labels('prompt').inc(usage.prompt_token_count or 0)
+            LLM_TOKENS.labels('completion').inc(usage.candidates_token_count or 0)
+        return response
+    
     def _execute_function(self, function_name, args, user_id, is_staff):
         """Execute a function call and return the result"""
         
@@ -357,7 +373,7 @@ class ChatbotService:
     
     def _get_user_loans(self, user_id):
         """Get user's active loans"""
-        loans = Loan.query.filter_by(user_id=user_id, status='active').all()
+        loans = Loan.query.filter(Loan.user_id == user_id, Loan.status.in_(Loan.OPEN_STATUSES)).all()
         
         return {
             "count": len(loans),
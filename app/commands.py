@@ -0,0 +1,163 @@
+"""
+CLI commands for scheduled background jobs.
+Meant to be run from cron (or any scheduler), e.g. `flask loans sweep-overdue`.
+"""
+
+import click
+from flask.cli import AppGroup
+
+loans_cli = AppGroup('loans', help='Loan maintenance jobs.')
+
+
+@loans_cli.command('sweep-overdue')
+def sweep_overdue():
+    """Mark active loans past their due date as overdue and queue reminders."""
+    from app.services import LoanService
+    count = LoanService.sweep_overdue()
+    click.echo(f'{count} loan(s) marked overdue.')
+
+
+@loans_cli.command('send-reminders')
+@click.option('--batch-size', default=100, show_default=True, help='Reminders to send per run.')
+def send_reminders(batch_size):
+    """Email queued overdue reminders."""
+    from app.services import LoanService
+    sent = LoanService.send_overdue_reminders(batch_size=batch_size)
+    click.echo(f'{sent} reminder(s) sent.')
+
+
+catalog_cli = AppGroup('catalog', help='Catalog maintenance jobs.')
+
+
+@catalog_cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dry-run', is_flag=True, help='Validate and count without writing books.')
+@click.option('--enrich', is_flag=True, help='Fill missing covers from OpenLibrary.')
+def import_catalog(path, dry_run, enrich):
+    """Import books from a CSV, JSON or JSONL file."""
+    from app.services import CatalogImportService
+    try:
+        job = CatalogImportService.import_file(path, dry_run=dry_run, enrich=enrich)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='PATH')
+    click.echo(f'{job.status}: {job.created_count} created, {job.updated_count} updated, '
+               f'{job.error_count} error(s) across {job.total_rows} row(s).')
+    for item in job.errors or []:
+        click.echo(f"  row {item['row']}: {item['error']}")
+
+
+@catalog_cli.command('facets')
+def rebuild_facets():
+    """Recount the author and category facets from the books table."""
+    from app.models import db
+    from app.services import FacetService
+    written = FacetService.rebuild()
+    db.session.commit()
+    click.echo(f'{written} facet value(s) counted.')
+
+
+supply_cli = AppGroup('supply', help='Supplier and restocking jobs.')
+
+
+@supply_cli.command('float-up')
+def float_up():
+    """Add low-stock books that aren't on order to the supplier shortlist."""
+    from app.services import ReplenishmentService
+    count = ReplenishmentService.float_up_low_stock()
+    click.echo(f'{count} book(s) floated up to the shortlist.')
+
+
+@supply_cli.command('forecast')
+def forecast():
+    """Recompute per-book demand forecasts and reorder points."""
+    from app.services import DemandForecastService
+    count = DemandForecastService.run_forecast()
+    click.echo(f'Forecast updated for {count} book(s).')
+
+
+stock_cli = AppGroup('stock', help='Inventory ledger jobs.')
+
+
+@stock_cli.command('reconcile')
+def reconcile():
+    """Check book stock counters against the stock_movements ledger."""
+    from app.services import StockService
+    result = StockService.reconcile()
+    click.echo(f"{result['movements']} movement(s) applied to {result['advanced']} checkpoint(s).")
+    for row in result['drift']:
+        diffs = ', '.join(f"{name} {row['counters'][name]} != ledger {row['ledger'][name]}"
+                          for name in StockService.COUNTERS if row['counters'][name] != row['ledger'][name])
+        click.echo(f"  drift on book {row['book_id']} ({row['title']}): {diffs}")
+    if not result['drift']:
+        click.echo('All counters match the ledger.')
+
+
+media_cli = AppGroup('media', help='Uploaded image and file store jobs.')
+
+
+@media_cli.command('thumbnails')
+def thumbnails():
+    """Generate any missing WebP thumbnails in the media store."""
+    from app.services import MediaService
+    written = MediaService.backfill_thumbnails()
+    click.echo(f'{written} thumbnail(s) written.')
+
+
+@media_cli.command('purge-uploads')
+def purge_uploads():
+    """Delete chunked uploads that were abandoned or never attached to an ebook."""
+    from app.services import UploadService
+    count = UploadService.purge_stale()
+    click.echo(f'{count} stale upload(s) removed.')
+
+
+ebooks_cli = AppGroup('ebooks', help='E-book processing jobs.')
+
+
+@ebooks_cli.command('process')
+@click.argument('ebook_ids', nargs=-1, type=int)
+@click.option('--pending', is_flag=True, help='Process every ebook not yet processed.')
+def process_ebooks(ebook_ids, pending):
+    """Extract page text, outline and reader chunks for ebooks."""
+    from app.models import EBook
+    from app.services import EBookService, EBookSearchService
+    if pending:
+        ebook_ids = [row.id for row in EBook.query.with_entities(EBook.id).filter(
+            (EBook.processing_status != 'ready') | EBook.processing_status.is_(None))]
+    done = sum(1 for ebook_id in ebook_ids if EBookService.process(ebook_id, reindex=False))
+    if done:
+        EBookSearchService.build()
+    click.echo(f'{done} of {len(ebook_ids)} ebook(s) processed.')
+
+
+@ebooks_cli.command('reindex')
+def reindex_ebooks():
+    """Rebuild the ebook full-text search index."""
+    from app.services import EBookSearchService
+    stats = EBookSearchService.build()
+    click.echo(f"Indexed {stats['docs']} page(s) and title(s), {stats['terms']} term(s).")
+
+
+messages_cli = AppGroup('messages', help='Private messaging jobs.')
+
+
+@messages_cli.command('prune-events')
+@click.option('--days', type=int, default=None, help='Keep this many days (default MESSAGE_EVENT_RETENTION_DAYS).')
+def prune_message_events(days):
+    """Delete old offline-sync events; clients behind them reload their chats."""
+    from datetime import datetime, timedelta
+    from flask import current_app
+    from app.messages import sync
+    days = days if days is not None else current_app.config.get('MESSAGE_EVENT_RETENTION_DAYS', 30)
+    deleted = sync.prune(datetime.utcnow() - timedelta(days=days))
+    click.echo(f'{deleted} sync event(s) older than {days} day(s) removed.')
+
+
+def register_commands(app):
+    app.cli.add_command(loans_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(supply_cli)
+    app.cli.add_command(stock_cli)
+    app.cli.add_command(media_cli)
+    app.cli.add_command(ebooks_cli)
+    app.cli.add_command(messages_cli)
@@ -0,0 +1,101 @@
+"""
+Support for running Socket.IO on a cooperative server.
+
+With SOCKETIO_ASYNC_MODE set to 'eventlet' or 'gevent', every connection
+is a greenlet on one OS thread instead of a thread of its own, so a node
+holds thousands of idle sockets. The catch is that anything blocking in C
+stalls all of them:
+
+    - socket I/O in pure Python (Redis, HTTP, SMTP) is made cooperative by
+      the monkey patching done in wsgi.py or by the gunicorn worker;
+    - psycopg2 gets a wait callback, so a query yields to other greenlets
+      while Postgres is working;
+    - other blocking calls (the Gemini gRPC client, for one) go through
+      offload(), which runs them on a native thread pool.
+"""
+
+GREEN_MODES = ('eventlet', 'gevent')
+
+_mode = 'threading'
+
+
+def init_app(app):
+    global _mode
+    _mode = app.config.get('SOCKETIO_ASYNC_MODE') or 'threading'
+    if _mode not in GREEN_MODES:
+        return
+
+    if not is_patched(_mode):
+        app.logger.warning(
+            'SOCKETIO_ASYNC_MODE is %s but the standard library is not monkey patched; '
+            'start the server with wsgi.py or a gunicorn %s worker', _mode, _mode)
+
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('postgres'):
+        _green_psycopg2(_mode)
+    elif uri.startswith('sqlite'):
+        app.logger.info('SQLite queries run on the event loop under %s; use Postgres for production', _mode)
+
+
+def is_patched(mode):
+    """Whether the socket module has been replaced by the green one for this mode."""
+    if mode == 'eventlet':
+        from eventlet import patcher
+        return patcher.is_monkey_patched('socket')
+    if mode == 'gevent':
+        from gevent import monkey
+        return monkey.is_module_patched('socket')
+    return True
+
+
+def offload(func, *args, **kwargs):
+    """
+    Run a blocking call without stalling the event loop.
+
+    Under eventlet or gevent the call runs on a native thread while the
+    calling greenlet waits; in threading mode it is simply called. The
+    function runs outside the Flask app context, so pass it what it needs.
+
+    Returns:
+        Whatever func returns; exceptions are re-raised in the caller
+    """
+    if _mode == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(func, *args, **kwargs)
+    if _mode == 'gevent':
+        import gevent
+        return gevent.get_hub().threadpool.apply(func, args, kwargs)
+    return func(*args, **kwargs)
+
+
+def _green_psycopg2(mode):
+    """Make psycopg2 wait on the hub instead of blocking in libpq."""
+    try:
+        from psycopg2 import extensions, OperationalError
+    except ImportError:
+        return
+
+    if mode == 'eventlet':
+        from eventlet.hubs import trampoline
+
+        def wait_read(fd):
+            trampoline(fd, read=True)
+
+        def wait_write(fd):
+            trampoline(fd, write=True)
+    else:
+        from gevent.socket import wait_read, wait_write
+
+    def wait(conn, timeout=None):
+        while True:
+            state = conn.poll()
+            if state == extensions.POLL_OK:
+                return
+            if state == extensions.POLL_READ:
+                wait_read(conn.fileno())
+            elif state == extensions.POLL_WRITE:
+                wait_write(conn.fileno())
+            else:
+                raise OperationalError(f'Bad result from poll: {state}')
+
+    extensions.set_wait_callback(wait)
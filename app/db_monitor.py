@@ -0,0 +1,124 @@
+"""
+Connection pool counters and per-scope SQL timing.
+
+PoolMonitor listens to the engine's pool events and keeps checkout
+counters next to the pool's own size and overflow figures, which is what
+pool_size and max_overflow are tuned from (SQLALCHEMY_ENGINE_OPTIONS).
+
+It also times every statement and charges it to the DBScope of the
+current app context, if one was begun, so a unit of work can see what it
+spent in the database and stop once it is over its budget.
+"""
+
+import threading
+import time
+from flask import g, has_app_context
+from sqlalchemy import event
+from app.extensions import db
+
+
+class DBBudgetExceeded(RuntimeError):
+    """Raised before a statement once the active scope has used up its DB time."""
+
+
+class DBScope:
+    """SQL statements and seconds spent by one unit of work."""
+
+    __slots__ = ('queries', 'seconds', 'budget')
+
+    def __init__(self, budget=None):
+        self.queries = 0
+        self.seconds = 0.0
+        self.budget = budget # Seconds; None for no limit
+
+
+def begin_scope(budget=None):
+    """Start charging statements in this app context to a new DBScope."""
+    g._db_scope = DBScope(budget)
+    return g._db_scope
+
+
+def current_scope():
+    return g.get('_db_scope') if has_app_context() else None
+
+
+class PoolMonitor:
+    """Pool checkout counters plus the statement timing hooks."""
+
+    def __init__(self):
+        self.engine = None
+        self._lock = threading.Lock()
+        self.stats = {'connects': 0, 'checkouts': 0, 'overflow_checkouts': 0,
+                      'peak_checked_out': 0, 'invalidated': 0}
+
+    def init_app(self, app):
+        with app.app_context():
+            self.engine = db.engine
+        if event.contains(self.engine, 'checkout', self._on_checkout):
+            return
+        event.listen(self.engine, 'connect', self._on_connect)
+        event.listen(self.engine, 'checkout', self._on_checkout)
+        event.listen(self.engine, 'invalidate', self._on_invalidate)
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def snapshot(self):
+        """
+        Live pool figures and counters since startup.
+
+        Returns:
+            dict: 'pool' (class name), 'size', 'checked_out', 'checked_in' and
+            'overflow' where the pool class has them, plus the counters;
+            overflow_checkouts counts checkouts that found more than
+            pool_size connections out
+        """
+        pool = self.engine.pool
+        data = {'pool': type(pool).__name__}
+        if hasattr(pool, 'size'):
+            data['size'] = pool.size()
+            data['checked_out'] = pool.checkedout()
+            data['checked_in'] = pool.checkedin()
+            # QueuePool counts overflow up from -pool_size
+            data['overflow'] = max(0, pool.overflow())
+            data['max_overflow'] = getattr(pool, '_max_overflow', None)
+        with self._lock:
+            data.update(self.stats)
+        return data
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.stats['connects'] += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        pool = self.engine.pool
+        out = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+        with self._lock:
+            self.stats['checkouts'] += 1
+            if hasattr(pool, 'size') and out > pool.size():
+                self.stats['overflow_checkouts'] += 1
+            if out > self.stats['peak_checked_out']:
+                self.stats['peak_checked_out'] = out
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.stats['invalidated'] += 1
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        scope = current_scope()
+        if scope is None:
+            return
+        if scope.budget is not None and scope.seconds >= scope.budget:
+            raise DBBudgetExceeded(f'{scope.queries} statement(s) took {scope.seconds * 1000:.0f}ms, '
+                                   f'budget {scope.budget * 1000:.0f}ms')
+        context._db_monitor_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_db_monitor_start', None)
+        scope = current_scope()
+        if start is None or scope is None:
+            return
+        scope.queries += 1
+        scope.seconds += time.perf_counter() - start
+
+
+pool_monitor = PoolMonitor()
@@ -1,3 +1,3 @@
 from flask import Blueprint
 bp = Blueprint('main', __name__)
-from app.main import routes, inventory_routes, cart_routes, checkout_routes, inventory_forms, supplier_routes, search_routes, upload_routes, featured_books_routes, ebook_routes
+from app.main import routes, inventory_routes, cart_routes, checkout_routes, inventory_forms, supplier_routes, search_routes, upload_routes, featured_books_routes, ebook_routes, export_routes, perf_routes
@@ -153,6 +153,7 @@ def admin_full_search(query):
             SupplyOrder.status.ilike(search_pattern)
         )
     ).order_by(SupplyOrder.created_at.desc()).limit(20).all()
+    SupplyOrder.load_totals(supply_orders)
     
     return {
         'books': books,
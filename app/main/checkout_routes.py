@@ -7,6 +7,8 @@ from app.models import Book, Sale, Loan, Discount
 from flask_mail import Message
 from app.extensions import mail
 from flask import current_app
+from app.services import ReplenishmentService, StockService
+from app.metrics import CHECKOUTS, CHECKOUT_ITEMS, LOANS_CREATED
 
 @bp.route('/checkout/review', methods=['POST'])
 @login_required
@@ -162,8 +164,8 @@ def confirm_checkout():
                 db.session.add(sale)
                 
             # Update Stock
-            book.stock_sold += item.quantity
-            book.stock_available -= item.quantity
+            StockService.record(book, 'sale', available=-item.quantity, sold=item.quantity,
+                                user_id=current_user.id)
             
         elif item.action == 'borrow':
             # Create Loan Record
@@ -173,19 +175,28 @@ def confirm_checkout():
                 db.session.add(loan)
             
             # Update Stock
-            book.stock_borrowed += item.quantity
-            book.stock_available -= item.quantity
+            StockService.record(book, 'loan', available=-item.quantity, borrowed=item.quantity,
+                                user_id=current_user.id)
             
     if errors:
+        CHECKOUTS.labels('out_of_stock').inc()
         for e in errors:
             flash(e, 'danger')
         return redirect(url_for('main.view_cart'))
         
     # Clear Processed Items from Cart
+    book_ids = [item.book_id for item in items]
+    checked_out = [(item.action, item.quantity) for item in items]
     for item in items:
         db.session.delete(item)
     
     db.session.commit()
+    ReplenishmentService.on_stock_change(book_ids)
+    CHECKOUTS.labels('placed').inc()
+    for action, quantity in checked_out:
+        CHECKOUT_ITEMS.labels(action).inc(quantity)
+        if action == 'borrow':
+            LOANS_CREATED.labels('checkout').inc(quantity)
     
     # Send Confirmation Email
     try:
@@ -1,8 +1,10 @@
-from flask import render_template, redirect, url_for, flash, request, current_app
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify, send_file, abort
 from flask_login import login_required, current_user
 from app.main import bp
 from app.extensions import db
-from app.models import EBook
+from app.models import EBook, UploadSession
+from app.cache import cached_response
+from app.services import MediaService, UploadService, EBookService, EBookSearchService
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -22,10 +24,37 @@ def is_pdf_file(filename):
            filename.rsplit('.', 1)[1].lower() == 'pdf'
 
 @bp.route('/ebooks')
+@cached_response(ttl=300)
 def ebook_list():
     ebooks = EBook.query.order_by(EBook.uploaded_at.desc()).all()
     return render_template('ebooks/list.html', ebooks=ebooks)
 
+@bp.route('/ebooks/search')
+@login_required
+def ebook_search():
+    # Snippets are page text, so search needs a login like reading does
+    query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    results = EBookSearchService.search(query, page=page) if query else {'hits': [], 'total': 0, 'page': page}
+
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'query': query,
+            'total': results['total'],
+            'page': results['page'],
+            'hits': [{
+                'ebook_id': hit['ebook'].id,
+                'title': hit['ebook'].title,
+                'author': hit['ebook'].author,
+                'page': hit['page'],
+                'snippet': str(hit['snippet']),
+                'url': url_for('main.ebook_read', id=hit['ebook'].id, page=hit['page'])
+            } for hit in results['hits']]
+        })
+
+    return render_template('ebooks/search.html', query=query, results=results,
+                           per_page=EBookSearchService.RESULTS_PER_PAGE)
+
 @bp.route('/ebooks/upload', methods=['GET', 'POST'])
 @login_required
 def ebook_upload():
@@ -38,47 +67,54 @@ def ebook_upload():
         author = request.form.get('author')
         description = request.form.get('description')
         
-        # Check if the post request has the file part
-        if 'file' not in request.files:
-            flash('No file part', 'danger')
-            return redirect(request.url)
-        
-        file = request.files['file']
+        file = request.files.get('file')
+        file_upload_id = request.form.get('file_upload_id')
         cover_image = request.files.get('cover_image')
         audio_file = request.files.get('audio_file')
+        audio_upload_id = request.form.get('audio_upload_id')
 
-        if file.filename == '':
+        # The PDF comes either from a finished chunked upload or the form itself
+        if not file_upload_id and (not file or file.filename == ''):
             flash('No selected file', 'danger')
             return redirect(request.url)
 
-        if file and is_pdf_file(file.filename):
-            filename = secure_filename(file.filename)
+        if file_upload_id or is_pdf_file(file.filename):
+            # Handle Cover Image first, so a bad image doesn't leave an orphaned PDF
+            cover_image_url = None
+            if cover_image and cover_image.filename != '':
+                try:
+                    cover_image_url = MediaService.save_url(cover_image)
+                except ValueError as e:
+                    flash(str(e), 'danger')
+                    return redirect(request.url)
+
             upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
             audio_folder = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio')
             
             # Ensure directories exist
             os.makedirs(upload_folder, exist_ok=True)
             os.makedirs(audio_folder, exist_ok=True)
-            
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
-
-            # Handle Audio File
-            audio_filename_str = None
-            if audio_file and audio_file.filename != '' and is_audio_file(audio_file.filename):
-                audio_filename = secure_filename(audio_file.filename)
-                audio_path = os.path.join(audio_folder, audio_filename)
-                audio_file.save(audio_path)
-                audio_filename_str = audio_filename # Store purely filename, path relative to static/ebooks/audio
-            
-            # Handle Cover Image
-            cover_image_url = None
-            if cover_image and cover_image.filename != '':
-                cover_filename = secure_filename(cover_image.filename)
-                cover_path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers')
-                os.makedirs(cover_path, exist_ok=True)
-                cover_image.save(os.path.join(cover_path, cover_filename))
-                cover_image_url = url_for('static', filename=f'ebooks/covers/{cover_filename}')
+
+            try:
+                if file_upload_id:
+                    filename = UploadService.claim(file_upload_id, 'ebook', current_user.id)
+                else:
+                    filename = secure_filename(file.filename)
+                    file.save(os.path.join(upload_folder, filename))
+
+                # Handle Audio File
+                audio_filename_str = None
+                if audio_upload_id:
+                    audio_filename_str = UploadService.claim(audio_upload_id, 'audio', current_user.id)
+                elif audio_file and audio_file.filename != '' and is_audio_file(audio_file.filename):
+                    audio_filename = secure_filename(audio_file.filename)
+                    audio_path = os.path.join(audio_folder, audio_filename)
+                    audio_file.save(audio_path)
+                    audio_filename_str = audio_filename # Store purely filename, path relative to static/ebooks/audio
+            except ValueError as e:
+                db.session.rollback()
+                flash(str(e), 'danger')
+                return redirect(request.url)
             
             new_ebook = EBook(
                 title=title,
@@ -91,6 +127,7 @@ def ebook_upload():
             
             db.session.add(new_ebook)
             db.session.commit()
+            EBookService.process_async(new_ebook.id)
             
             flash('E-book uploaded successfully!', 'success')
             return redirect(url_for('main.ebook_list'))
@@ -103,7 +140,14 @@ def ebook_upload():
 @login_required
 def ebook_read(id):
     ebook = EBook.query.get_or_404(id)
-    return render_template('ebooks/read.html', ebook=ebook)
+    if not ebook.chunk_count:
+        return render_template('ebooks/read.html', ebook=ebook, page=None)
+
+    # Processed books load a few pages at a time instead of the whole PDF
+    page = min(max(request.args.get('page', 1, type=int), 1), ebook.page_count)
+    chunk, page_in_chunk = ebook.chunk_for_page(page)
+    return render_template('ebooks/read.html', ebook=ebook, page=page,
+                           chunk=chunk, page_in_chunk=page_in_chunk)
 
 @bp.route('/ebooks/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -119,60 +163,78 @@ def ebook_edit(id):
         ebook.author = request.form.get('author')
         ebook.description = request.form.get('description')
 
-        # Handle File Update
+        # Handle File Update (from a finished chunked upload or the form)
+        upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
+        audio_folder = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio')
+        try:
+            file_upload_id = request.form.get('file_upload_id')
+            audio_upload_id = request.form.get('audio_upload_id')
+            new_file = UploadService.claim(file_upload_id, 'ebook', current_user.id) if file_upload_id else None
+            new_audio = UploadService.claim(audio_upload_id, 'audio', current_user.id) if audio_upload_id else None
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return render_template('ebooks/edit.html', ebook=ebook)
+
         file = request.files.get('file')
-        if file and file.filename != '' and is_pdf_file(file.filename):
-            filename = secure_filename(file.filename)
-            upload_folder = os.path.join(current_app.root_path, 'static', 'ebooks')
-            
+        if new_file or (file and file.filename != '' and is_pdf_file(file.filename)):
             # Remove old file
-            if ebook.file_path:
+            if ebook.file_path and ebook.file_path != new_file:
                 old_file_path = os.path.join(upload_folder, ebook.file_path)
                 if os.path.exists(old_file_path):
                     os.remove(old_file_path)
             
             # Save new file
-            file_path = os.path.join(upload_folder, filename)
-            file.save(file_path)
-            ebook.file_path = filename
+            if not new_file:
+                new_file = secure_filename(file.filename)
+                file.save(os.path.join(upload_folder, new_file))
+            ebook.file_path = new_file
+            # Old chunks no longer match; the reader uses the full file until reprocessed
+            ebook.chunk_pages = None
+            ebook.processing_status = 'pending'
 
         # Handle Audio Update
         audio_file = request.files.get('audio_file')
-        if audio_file:
-            # Check if user uploaded a file
-            if audio_file.filename != '' and is_audio_file(audio_file.filename):
-                audio_filename = secure_filename(audio_file.filename)
-                audio_folder = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio')
-                os.makedirs(audio_folder, exist_ok=True)
-
-                # Remove old audio
-                if ebook.audio_path:
-                    old_audio_path = os.path.join(audio_folder, ebook.audio_path)
-                    if os.path.exists(old_audio_path):
-                        os.remove(old_audio_path)
-                
-                # Save new audio
-                new_audio_path = os.path.join(audio_folder, audio_filename)
-                audio_file.save(new_audio_path)
-                ebook.audio_path = audio_filename
+        if new_audio or (audio_file and audio_file.filename != '' and is_audio_file(audio_file.filename)):
+            os.makedirs(audio_folder, exist_ok=True)
+
+            # Remove old audio
+            if ebook.audio_path and ebook.audio_path != new_audio:
+                old_audio_path = os.path.join(audio_folder, ebook.audio_path)
+                if os.path.exists(old_audio_path):
+                    os.remove(old_audio_path)
+            
+            # Save new audio
+            if not new_audio:
+                new_audio = secure_filename(audio_file.filename)
+                audio_file.save(os.path.join(audio_folder, new_audio))
+            ebook.audio_path = new_audio
 
         # Handle Cover Update
         cover_image = request.files.get('cover_image')
         if cover_image and cover_image.filename != '':
-            cover_filename = secure_filename(cover_image.filename)
-            cover_path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers')
-            
-            # Remove old cover if it's not the placeholder
-            if 'placehold.co' not in ebook.cover_image_url:
-                old_cover_name = ebook.cover_image_url.split('/')[-1]
-                old_cover_path = os.path.join(cover_path, old_cover_name)
+            try:
+                new_cover_url = MediaService.save_url(cover_image)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return render_template('ebooks/edit.html', ebook=ebook)
+
+            # Remove an old per-ebook cover; media store files may be shared
+            legacy_prefix = url_for('static', filename='ebooks/covers/')
+            if ebook.cover_image_url and ebook.cover_image_url.startswith(legacy_prefix):
+                cover_path = os.path.join(current_app.root_path, 'static', 'ebooks', 'covers')
+                old_cover_path = os.path.join(cover_path, ebook.cover_image_url.split('/')[-1])
                 if os.path.exists(old_cover_path):
                     os.remove(old_cover_path)
 
-            cover_image.save(os.path.join(cover_path, cover_filename))
-            ebook.cover_image_url = url_for('static', filename=f'ebooks/covers/{cover_filename}')
+            ebook.cover_image_url = new_cover_url
 
         db.session.commit()
+        if ebook.processing_status == 'pending':
+            EBookService.process_async(ebook.id)
+        else:
+            # Title or author may have changed
+            EBookSearchService.build_async()
         flash('E-book updated successfully!', 'success')
         return redirect(url_for('main.ebook_list'))
 
@@ -218,7 +280,97 @@ def ebook_delete(id):
         if os.path.exists(cover_path):
             os.remove(cover_path)
 
+    EBookService.remove_artifacts(ebook.id)
+
     db.session.delete(ebook)
     db.session.commit()
+    EBookSearchService.build_async()
     flash('E-book deleted successfully.', 'success')
     return redirect(url_for('main.ebook_list'))
+
+@bp.route('/ebooks/file/<int:id>')
+@login_required
+def ebook_file(id):
+    """Serve the PDF with Range and conditional request support, for seeking readers."""
+    ebook = EBook.query.get_or_404(id)
+    path = os.path.join(current_app.root_path, 'static', 'ebooks', ebook.file_path)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(path, mimetype='application/pdf', conditional=True,
+                     max_age=current_app.config.get('EBOOK_FILE_MAX_AGE'))
+
+@bp.route('/ebooks/<int:id>/chunk/<int:index>')
+@login_required
+def ebook_chunk(id, index):
+    """Serve one progressive-loading chunk of a processed PDF."""
+    ebook = EBook.query.get_or_404(id)
+    if index >= ebook.chunk_count:
+        abort(404)
+    path = EBookService.chunk_path(ebook.id, index)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(path, mimetype='application/pdf', conditional=True,
+                     max_age=current_app.config.get('EBOOK_FILE_MAX_AGE'))
+
+@bp.route('/ebooks/audio/<int:id>')
+@login_required
+def ebook_audio(id):
+    """Serve the audiobook with Range support, so players can seek without a full download."""
+    ebook = EBook.query.get_or_404(id)
+    if not ebook.audio_path:
+        abort(404)
+    path = os.path.join(current_app.root_path, 'static', 'ebooks', 'audio', ebook.audio_path)
+    if not os.path.isfile(path):
+        abort(404)
+    return send_file(path, conditional=True, max_age=current_app.config.get('EBOOK_FILE_MAX_AGE'))
+
+# Resumable chunked uploads: POST opens a session, PATCH appends a chunk at
+# the offset in the Upload-Offset header, GET reports the offset to resume from.
+
+@bp.route('/ebooks/uploads', methods=['POST'])
+@login_required
+def ebook_upload_start():
+    if not current_user.is_admin():
+        return jsonify({'error': 'Not authorized'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = UploadService.start(current_user.id, data.get('kind'), data.get('filename'), data.get('size'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    result = upload.to_dict()
+    result['chunk_size'] = current_app.config.get('EBOOK_UPLOAD_CHUNK_SIZE')
+    return jsonify(result), 201
+
+def _get_upload_or_404(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload or upload.user_id != current_user.id:
+        abort(404)
+    return upload
+
+@bp.route('/ebooks/uploads/<upload_id>', methods=['GET'])
+@login_required
+def ebook_upload_status(upload_id):
+    return jsonify(_get_upload_or_404(upload_id).to_dict())
+
+@bp.route('/ebooks/uploads/<upload_id>', methods=['PATCH'])
+@login_required
+def ebook_upload_chunk(upload_id):
+    upload = _get_upload_or_404(upload_id)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Missing Upload-Offset header'}), 400
+    try:
+        accepted = UploadService.write_chunk(upload, offset, request.stream, request.content_length)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not accepted:
+        # Client is out of sync; it should resume from the returned offset
+        return jsonify(upload.to_dict()), 409
+    return jsonify(upload.to_dict())
+
+@bp.route('/ebooks/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def ebook_upload_cancel(upload_id):
+    UploadService.discard(_get_upload_or_404(upload_id))
+    return '', 204
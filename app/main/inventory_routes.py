@@ -1,8 +1,9 @@
-from flask import render_template, redirect, url_for, flash, request
-from flask_login import login_required
+from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask_login import login_required, current_user
 from app import db
 from app.main import bp, search_utils
-from app.models import Book
+from app.models import Book, ImportJob
+from app.services import CatalogImportService, ReplenishmentService, StockService
 from app.decorators import staff_required
 import requests
 from app.main.inventory_forms import RestockForm, EditForm
@@ -59,6 +60,7 @@ def add_book():
             image_url=image_url if image_url else None
         )
         db.session.add(book)
+        StockService.record_new_book(book, user_id=current_user.id)
         db.session.commit()
         flash('Book added to inventory!')
         return redirect(url_for('main.inventory'))
@@ -76,8 +78,7 @@ def restock_book(book_id):
     if form.validate_on_submit():
         qty = form.quantity.data
 
-        book.stock_total += qty
-        book.stock_available += qty
+        StockService.record(book, 'restock', total=qty, available=qty, user_id=current_user.id)
 
         db.session.commit()
         flash(f"Successfully restocked {qty} copies of '{book.title}'.", "success")
@@ -113,12 +114,16 @@ def edit_book(book_id):
         book.category = form.category.data
         book.location = form.location.data
         book.image_url = form.image_url.data
-        book.stock_available = form.stock_available.data
-        book.stock_borrowed = form.stock_borrowed.data
-        book.stock_sold = form.stock_sold.data
-        book.stock_total = book.stock_borrowed + book.stock_sold + book.stock_available
+        StockService.set_counters(
+            book, user_id=current_user.id,
+            stock_available=form.stock_available.data,
+            stock_borrowed=form.stock_borrowed.data,
+            stock_sold=form.stock_sold.data,
+            stock_total=form.stock_borrowed.data + form.stock_sold.data + form.stock_available.data
+        )
                 
         db.session.commit()
+        ReplenishmentService.on_stock_change([book.id])
         flash(f"Successfully Edited '{book.title}'.", "success")
         return redirect(url_for("main.inventory"))
 
@@ -177,6 +182,7 @@ def add_ext_book():
         book.stock_sold = form.stock_sold.data
         book.stock_total = book.stock_borrowed + book.stock_sold + book.stock_available
         db.session.add(book)        
+        StockService.record_new_book(book, user_id=current_user.id)
         db.session.commit()
         flash(f"Successfully Added '{book.title}'.", "success")
         return redirect(url_for("main.inventory"))
@@ -184,6 +190,68 @@ def add_ext_book():
     return render_template("admin/edit_book.html", form=form, action='add_ext_book')
 
 
+@bp.route('/inventory/import', methods=['GET', 'POST'])
+@login_required
+@staff_required
+def import_books():
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename:
+            flash('Choose a CSV or JSON file to import.', 'danger')
+            return redirect(url_for('main.import_books'))
+        try:
+            job = CatalogImportService.start_upload_import(
+                current_user.id, file,
+                dry_run=bool(request.form.get('dry_run')),
+                enrich=bool(request.form.get('enrich'))
+            )
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.import_books'))
+        return redirect(url_for('main.import_job', job_id=job.id))
+
+    jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(10).all()
+    return render_template('admin/import_books.html', jobs=jobs, job=None)
+
+
+@bp.route('/inventory/import/<int:job_id>')
+@login_required
+@staff_required
+def import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    jobs = ImportJob.query.order_by(ImportJob.created_at.desc()).limit(10).all()
+    return render_template('admin/import_books.html', jobs=jobs, job=job)
+
+
+@bp.route('/inventory/import/<int:job_id>/progress')
+@login_required
+@staff_required
+def import_progress(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify(job.to_dict())
+
+
+@bp.route('/inventory/import/ext', methods=['POST'])
+@login_required
+@staff_required
+def import_ext_books():
+    titles = request.form.getlist('title')
+    authors = request.form.getlist('author')
+    covers = request.form.getlist('cover')
+    selected = {int(i) for i in request.form.getlist('selected') if i.isdigit()}
+
+    records = [
+        {'title': titles[i], 'author': authors[i], 'image_url': covers[i] if i < len(covers) else None}
+        for i in sorted(selected) if i < len(titles) and i < len(authors)
+    ]
+    if not records:
+        flash('Select at least one book to import.', 'warning')
+        return redirect(request.referrer or url_for('main.inventory'))
+
+    job = CatalogImportService.start_record_import(current_user.id, records)
+    return redirect(url_for('main.import_job', job_id=job.id))
+
+
 @bp.route('/inventory/delete/<int:book_id>', methods=['POST'])
 @login_required
 @staff_required
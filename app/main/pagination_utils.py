@@ -0,0 +1,109 @@
+"""
+Keyset (seek) pagination for large admin listings.
+
+Instead of OFFSET, each page link carries an opaque cursor holding the sort
+value and id of the boundary row, so page 500 costs the same as page 1.
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(value, row_id):
+    """Pack a (sort value, id) pair into a URL-safe token."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_column):
+    """
+    Unpack a cursor token, returning None if it is malformed.
+
+    Cursors arrive in public URLs, so anything but a [scalar, int] pair is
+    rejected here rather than reaching the query: the value must be a
+    string or number (an ISO string for datetime columns) and the id an int.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if type(row_id) is not int or isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            return None
+        if sort_column.type.python_type is datetime:
+            if not isinstance(value, str):
+                return None
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError, NotImplementedError):
+        return None
+    return value, row_id
+
+
+class KeysetPage:
+    """One page of keyset-paginated results with cursors for its neighbours."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=20):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, sort_column, id_column, descending=True,
+                    after=None, before=None, per_page=20):
+    """
+    Fetch one page of `query` ordered by (sort_column, id_column).
+
+    `after` returns the page following a cursor and `before` the page
+    preceding it. Only per_page + 1 rows are read, and with an index on the
+    sort column the seek is a range scan rather than an OFFSET walk.
+    """
+    backwards = before is not None and after is None
+    cursor = decode_cursor(before if backwards else after, sort_column) if (after or before) else None
+
+    # Walking backwards flips the comparison and ordering, then the page is reversed
+    scan_desc = descending != backwards
+    if cursor:
+        value, row_id = cursor
+        if scan_desc:
+            query = query.filter(or_(sort_column < value,
+                                     and_(sort_column == value, id_column < row_id)))
+        else:
+            query = query.filter(or_(sort_column > value,
+                                     and_(sort_column == value, id_column > row_id)))
+
+    if scan_desc:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor is not None
+
+    def cursor_for(row):
+        return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
+
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_for(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor_for(rows[0]) if rows and has_prev else None,
+        per_page=per_page
+    )
@@ -0,0 +1,66 @@
+import hmac
+from flask import abort, current_app, jsonify, render_template, redirect, request, url_for, flash
+from flask_login import login_required
+from app.main import bp
+from app.decorators import admin_required
+from app.db_monitor import pool_monitor
+from app.messages.handlers import event_stats
+from app.metrics import registry
+from app.perf import request_stats
+from app.slow_queries import slow_queries
+
+
+@bp.route('/admin/perf')
+@login_required
+@admin_required
+def perf():
+    """Per-endpoint latency percentiles, SQL and template time, pool and socket usage."""
+    return render_template('admin/perf.html', endpoints=request_stats.summary(),
+                           pool=pool_monitor.snapshot(), socket_events=event_stats.snapshot())
+
+
+@bp.route('/admin/perf/reset', methods=['POST'])
+@login_required
+@admin_required
+def perf_reset():
+    request_stats.reset()
+    flash('Request timings cleared.', 'success')
+    return redirect(url_for('main.perf'))
+
+
+@bp.route('/admin/perf/slow-queries')
+@login_required
+@admin_required
+def slow_query_log():
+    """Recent statements over SLOW_QUERY_MS, newest first, with their plans."""
+    return render_template('admin/slow_queries.html', entries=list(slow_queries.entries),
+                           counts=dict(slow_queries.stats))
+
+
+@bp.route('/admin/perf/slow-queries/clear', methods=['POST'])
+@login_required
+@admin_required
+def slow_query_clear():
+    slow_queries.clear()
+    flash('Slow-query log cleared.', 'success')
+    return redirect(url_for('main.slow_query_log'))
+
+
+@bp.route('/admin/perf/db')
+@login_required
+@admin_required
+def perf_db():
+    """Connection pool figures and per-event Socket.IO DB usage, for sizing pool_size."""
+    return jsonify({'pool': pool_monitor.snapshot(), 'socket_events': event_stats.snapshot()})
+
+
+@bp.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's metrics; 404 until METRICS_TOKEN is set."""
+    token = current_app.config.get('METRICS_TOKEN')
+    # Not a loopback check: behind a reverse proxy every request comes from localhost
+    if not current_app.config.get('METRICS_ENABLED', True) or not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return registry.expose(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
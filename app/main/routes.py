@@ -1,13 +1,16 @@
 from flask import render_template, request, flash, redirect, url_for, current_app
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import os
 from app.main import bp
 from app.models import Book, User, Loan, Campaign, Category, SupplyOrder, Sale, ManagementMember
 from app import db
 from app.decorators import admin_required
+from app.cache import cached_response
+from app.services import MediaService, FacetService
 from app.main import featured_books_routes
 from app.main.inventory_forms import EditForm
+from app.main.pagination_utils import keyset_paginate
+from app.main.export_utils import csv_response, stream_rows
+from sqlalchemy.orm import joinedload, load_only
 from datetime import datetime
 
 @bp.route('/admin/dashboard')
@@ -23,7 +26,7 @@ def admin_dashboard():
     # Basic Stats
     pending_customer_orders = Sale.query.filter_by(delivery_status='pending').count()
     total_books = Book.query.count()
-    active_loans = Loan.query.filter_by(status='active').count()
+    active_loans = Loan.query.filter(Loan.status.in_(Loan.OPEN_STATUSES)).count()
     pending_orders = SupplyOrder.query.filter(SupplyOrder.status.in_(['shortlist', 'pending_review', 'placed'])).count()
     
     # Enhanced Stats with Trends
@@ -51,12 +54,10 @@ def admin_dashboard():
     # Book trend (simplified)
     books_trend = {'direction': 'neutral', 'percentage': 0}
     
-    # Overdue Loans
-    overdue_loans = Loan.query.filter(
-        Loan.status == 'active',
-        Loan.due_date < now
-    ).all()
-    overdue_count = len(overdue_loans)
+    # Overdue Loans (flagged by the overdue sweep job)
+    overdue_query = Loan.query.filter_by(status='overdue')
+    overdue_count = overdue_query.count()
+    overdue_loans = overdue_query.order_by(Loan.due_date.asc()).limit(5).all()
     
     # Stock Alerts (books with low stock)
     STOCK_THRESHOLD = 5
@@ -175,7 +176,7 @@ def admin_dashboard():
     
     # Additional data for modals
     all_pending_customer_orders = Sale.query.filter_by(delivery_status='pending').order_by(Sale.sale_date.desc()).all()
-    all_active_loans = Loan.query.filter_by(status='active').order_by(Loan.due_date).all()
+    all_active_loans = Loan.query.filter(Loan.status.in_(Loan.OPEN_STATUSES)).order_by(Loan.due_date).all()
     all_pending_orders = SupplyOrder.query.filter(SupplyOrder.status.in_(['shortlist', 'pending_review', 'placed'])).order_by(SupplyOrder.created_at.desc()).all()
     
     stats = {
@@ -187,7 +188,7 @@ def admin_dashboard():
         'books_trend': books_trend,
         'overdue_count': overdue_count,
         'stock_alerts_count': stock_alerts_count,
-        'overdue_loans': overdue_loans[:5],  # Top 5 overdue
+        'overdue_loans': overdue_loans,  # Top 5 overdue
         'low_stock_books': low_stock_books[:10],  # Top 10 low stock
         'recent_activity': recent_activity,
         'recent_activity_pagination': recent_activity_pagination,
@@ -219,12 +220,56 @@ from app.models import (
     Cart
 )
 
+MEMBER_SORTS = {
+    'username': (User.username, False),
+    'newest': (User.id, True),
+}
+
+def _filtered_members_query(args):
+    """Apply the members role/membership filters from the query string"""
+    role = args.get('role', 'all')
+    membership = args.get('membership', 'all')
+    
+    query = User.query
+    if role in ('admin', 'librarian', 'customer'):
+        query = query.filter(User.role == role)
+    else:
+        role = 'all'
+    if membership and membership != 'all':
+        query = query.filter(User.membership_type == membership)
+    else:
+        membership = 'all'
+    return query, role, membership
+
 @bp.route('/members')
 @login_required
 @admin_required
 def members():
-    users = User.query.all()
-    return render_template('admin/members.html', users=users)
+    query, role, membership = _filtered_members_query(request.args)
+    sort = request.args.get('sort', 'username')
+    if sort not in MEMBER_SORTS:
+        sort = 'username'
+    sort_column, descending = MEMBER_SORTS[sort]
+    
+    # Only the columns the table shows
+    query = query.options(load_only(User.id, User.username, User.email, User.role, User.membership_type))
+    pagination = keyset_paginate(query, sort_column, User.id, descending=descending,
+                                 after=request.args.get('after'), before=request.args.get('before'),
+                                 per_page=25)
+    
+    return render_template('admin/members.html', users=pagination.items, pagination=pagination,
+                           current_role=role, current_membership=membership, current_sort=sort)
+
+@bp.route('/members/export')
+@login_required
+@admin_required
+def export_members():
+    query, _, _ = _filtered_members_query(request.args)
+    rows = stream_rows(query.with_entities(User.id, User.username, User.email, User.phone_number,
+                                           User.role, User.membership_type, User.membership_expiry,
+                                           User.last_seen).order_by(User.id))
+    header = ['id', 'username', 'email', 'phone_number', 'role', 'membership_type', 'membership_expiry', 'last_seen']
+    return csv_response('members', header, rows)
 
 @bp.route('/admin/user/<username>')
 @login_required
@@ -235,8 +280,8 @@ def admin_user_profile(username):
     
     # Get user's loans
     loans = Loan.query.filter_by(user_id=user.id).order_by(Loan.checkout_date.desc()).all()
-    active_loans = [l for l in loans if l.status == 'active']
-    overdue_loans = [l for l in active_loans if l.due_date and l.due_date < datetime.utcnow()]
+    active_loans = [l for l in loans if l.is_open]
+    overdue_loans = [l for l in loans if l.status == 'overdue']
     
     # Get user's purchases
     sales = Sale.query.filter_by(user_id=user.id).order_by(Sale.sale_date.desc()).all()
@@ -348,16 +393,59 @@ def admin_offers():
     
     return render_template('admin/offers.html', books=books, search_query=search_query)
 
+LOAN_SORTS = {
+    'newest': (Loan.checkout_date, True),
+    'oldest': (Loan.checkout_date, False),
+    'due_soon': (Loan.due_date, False),
+    'due_late': (Loan.due_date, True),
+}
+
+def _filtered_loans_query(args):
+    """Apply the admin loans status/overdue filters from the query string"""
+    status_filter = args.get('status', 'all')
+    overdue_only = args.get('overdue') == '1'
+    
+    query = Loan.query
+    if status_filter in ('active', 'overdue', 'returned'):
+        query = query.filter(Loan.status == status_filter)
+    else:
+        status_filter = 'all'
+    if overdue_only:
+        # Past due, including loans the overdue sweep hasn't flagged yet
+        query = query.filter(Loan.status.in_(Loan.OPEN_STATUSES), Loan.due_date < datetime.utcnow())
+    return query, status_filter, overdue_only
+
 @bp.route('/admin/loans')
 @login_required
 @admin_required
 def admin_loans():
-    loans = Loan.query.order_by(Loan.checkout_date.desc()).all()
-    for loan in loans:
-        if loan.status == 'active':
-            delta = loan.due_date - datetime.utcnow() 
-            loan.days_remaining = delta.days
-    return render_template('admin/loans.html', loans=loans)
+    query, status_filter, overdue_only = _filtered_loans_query(request.args)
+    sort = request.args.get('sort', 'newest')
+    if sort not in LOAN_SORTS:
+        sort = 'newest'
+    sort_column, descending = LOAN_SORTS[sort]
+    
+    # Load borrower and book in the same query, restricted to the columns the table shows
+    query = query.options(
+        load_only(Loan.id, Loan.user_id, Loan.book_id, Loan.checkout_date,
+                  Loan.due_date, Loan.return_date, Loan.status),
+        joinedload(Loan.user).load_only(User.username, User.email),
+        joinedload(Loan.book).load_only(Book.title, Book.author)
+    )
+    pagination = keyset_paginate(query, sort_column, Loan.id, descending=descending,
+                                 after=request.args.get('after'), before=request.args.get('before'),
+                                 per_page=20)
+    
+    return render_template('admin/loans.html', loans=pagination.items, pagination=pagination,
+                           current_status=status_filter, overdue_only=overdue_only, current_sort=sort)
+
+@bp.route('/admin/loans/export')
+@login_required
+@admin_required
+def export_loans():
+    """The loans page's export link; one loans export, served by admin_export."""
+    from app.main.export_routes import admin_export
+    return admin_export('loans')
 
 @bp.route('/admin/loans/return/<int:loan_id>', methods=['POST'])
 @login_required
@@ -416,11 +504,11 @@ def add_campaign():
         
         # Handle file upload (overrides URL if provided)
         if form.image_file.data:
-            filename = secure_filename(form.image_file.data.filename)
-            upload_folder = os.path.join(current_app.root_path, 'static', 'images', 'campaigns')
-            os.makedirs(upload_folder, exist_ok=True)
-            form.image_file.data.save(os.path.join(upload_folder, filename))
-            image_url = url_for('static', filename=f'images/campaigns/{filename}')
+            try:
+                image_url = MediaService.save_url(form.image_file.data)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return render_template('admin/add_edit_campaign.html', form=form, campaign=None)
         
         campaign = Campaign(
             title=form.title.data,
@@ -462,11 +550,11 @@ def edit_campaign(id):
         
         # Handle file upload (overrides URL)
         if form.image_file.data:
-            filename = secure_filename(form.image_file.data.filename)
-            upload_folder = os.path.join(current_app.root_path, 'static', 'images', 'campaigns')
-            os.makedirs(upload_folder, exist_ok=True)
-            form.image_file.data.save(os.path.join(upload_folder, filename))
-            campaign.image_url = url_for('static', filename=f'images/campaigns/{filename}')
+            try:
+                campaign.image_url = MediaService.save_url(form.image_file.data)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return render_template('admin/add_edit_campaign.html', form=form, campaign=campaign)
         
         db.session.commit()
         flash('Campaign updated successfully.', 'success')
@@ -489,6 +577,7 @@ def delete_campaign(id):
     return redirect(url_for('main.admin_campaigns'))
 
 @bp.route('/')
+@cached_response(ttl=60)
 def index():
     books = featured_books_routes.fetch_most_sold(6)
     
@@ -517,45 +606,61 @@ def index():
         
     return render_template('index.html', books=books, academic_books=academic_books, islamic_books=islamic_books, campaigns=campaigns, categories=categories, management_members=management_members)
 
+# Catalog sort name -> (column, descending); all of them page by keyset
+CATALOG_SORTS = {
+    'a to z': (Book.title, False),
+    'z to a': (Book.title, True),
+    'low to high': (Book.price, False),
+    'high to low': (Book.price, True),
+}
+CATALOG_PAGE_SIZES = (5, 10, 20, 50)
+CATALOG_MAX_FILTER_VALUES = 20
+
 @bp.route('/catalog')
+@cached_response(ttl=120)
 def catalog():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    category = request.args.get('category')
-    author = request.args.get('author')
+    if per_page not in CATALOG_PAGE_SIZES:
+        per_page = 20
+    # Several categories/authors may be selected at once (?category=A&category=B)
+    categories = list(dict.fromkeys(c for c in request.args.getlist('category') if c))[:CATALOG_MAX_FILTER_VALUES]
+    authors = list(dict.fromkeys(a for a in request.args.getlist('author') if a))[:CATALOG_MAX_FILTER_VALUES]
+    in_stock = request.args.get('in_stock') == '1'
+    offers = request.args.get('filter') == 'offers'
     sort = request.args.get('sort')
+    if sort not in CATALOG_SORTS:
+        sort = None
 
-    # Fetch all categories from DB
-    categories = [c.name for c in Category.query.order_by(Category.name).all()]
-    # Fetch distinct authors
-    authors = [a[0] for a in db.session.query(Book.author).distinct().all() if a[0]]
-    
     query = Book.query
-    if category:
-        query = query.filter_by(category=category)
-    if author:
-        query = query.filter_by(author=author)
-
-    if request.args.get('filter') == 'offers':
+    if categories:
+        query = query.filter(Book.category.in_(categories))
+    if authors:
+        query = query.filter(Book.author.in_(authors))
+    if in_stock:
+        query = query.filter(Book.stock_available > 0)
+    if offers:
         query = query.filter(Book.discount_percentage > 0)
-        
+
     if sort:
-        if sort == 'a to z':
-            query = query.order_by(Book.title.asc())
-        elif sort == 'z to a':
-            query = query.order_by(Book.title.desc())
-        elif sort == 'low to high':
-            query = query.order_by(Book.price.asc())
-        elif sort == 'high to low':
-            query = query.order_by(Book.price.desc())
-            
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    books = pagination.items
-        
-    return render_template('catalog.html', books=books, current_category=category, 
-                           current_author=author, categories=categories, 
-                           authors=authors, current_sort=sort, 
-                           pagination=pagination, current_per_page=per_page)
+        sort_column, descending = CATALOG_SORTS[sort]
+        pagination = keyset_paginate(query, sort_column, Book.id, descending=descending,
+                                     after=request.args.get('after'), before=request.args.get('before'),
+                                     per_page=per_page)
+    else:
+        pagination = query.order_by(Book.id).paginate(page=page, per_page=per_page, error_out=False)
+
+    # Counts come from the catalog_facets summary, not a scan of books
+    facets = FacetService.facets(selected_authors=authors)
+    filters = {'category': categories, 'author': authors, 'in_stock': 1 if in_stock else None,
+               'filter': 'offers' if offers else None, 'sort': sort, 'per_page': per_page}
+
+    return render_template('catalog.html', books=pagination.items, pagination=pagination,
+                           keyset=bool(sort), filters=filters,
+                           current_categories=categories, current_authors=authors,
+                           category_facets=facets['category'], author_facets=facets['author'],
+                           in_stock=in_stock, offers=offers, current_sort=sort,
+                           current_per_page=per_page, page_sizes=CATALOG_PAGE_SIZES)
 
 @bp.route('/profile')
 @login_required
@@ -588,43 +693,39 @@ def user_profile(username):
     # Initialize private variables for public view
     loans = []
     sales = None
-    active_loans = []
-    overdue_loans = []
+    active_loan_count = 0
+    overdue_loan_count = 0
     loans_pagination = None
     
     if current_user.is_authenticated and current_user.id == user.id:
         # Paginate loans (Borrowing History)
         query = Loan.query.filter_by(user_id=user.id)
         
-        if loan_filter == 'active':
-            query = query.filter_by(status='active')
-        elif loan_filter == 'returned':
-            query = query.filter_by(status='returned')
+        if loan_filter in ('active', 'overdue', 'returned'):
+            query = query.filter_by(status=loan_filter)
             
-        # Sort: Active first (asc works because 'active' < 'returned'), then checkout date desc
+        # Sort: Active first (asc works because 'active' < 'overdue' < 'returned'), then checkout date desc
         loans_pagination = query.order_by(Loan.status.asc(), Loan.checkout_date.desc()).paginate(page=loan_page, per_page=loan_per_page, error_out=False)
         loans = loans_pagination.items
         
         # Paginate sales (Purchase History)
         sales = Sale.query.filter_by(user_id=user.id).order_by(Sale.sale_date.desc()).paginate(page=sale_page, per_page=sale_per_page, error_out=False)
         
-        # Stats are calculated from all active loans (not just current page)
-        all_active = Loan.query.filter_by(user_id=user.id, status='active').all()
-        active_loans = all_active
-        overdue_loans = [l for l in all_active if l.due_date < datetime.utcnow()]
-        
-        # Calculate days remaining for loans on the current page
-        for loan in loans:
-            if loan.status == 'active':
-                delta = loan.due_date - datetime.utcnow()
-                loan.days_remaining = delta.days
+        # Stats are counted over all of the user's open loans (not just current page)
+        status_counts = dict(
+            db.session.query(Loan.status, db.func.count(Loan.id))
+            .filter(Loan.user_id == user.id, Loan.status.in_(Loan.OPEN_STATUSES))
+            .group_by(Loan.status).all()
+        )
+        active_loan_count = sum(status_counts.values())
+        overdue_loan_count = status_counts.get('overdue', 0)
     
     return render_template('profile.html', user=user, loans=loans, sales=sales, 
                            forum_posts=forum_posts, forum_pagination=forum_pagination,
                            loans_pagination=loans_pagination,
                            loan_per_page=loan_per_page, sale_per_page=sale_per_page,
                            forum_per_page=forum_per_page, loan_filter=loan_filter,
-                           active_loans=active_loans, overdue_loans=overdue_loans)
+                           active_loan_count=active_loan_count, overdue_loan_count=overdue_loan_count)
 
 @bp.route('/admin/management/update', methods=['POST'])
 @login_required
@@ -644,18 +745,12 @@ def update_management_member():
     if 'image' in request.files:
         file = request.files['image']
         if file and file.filename != '':
-            filename = secure_filename(file.filename)
-            import uuid
-            _, ext = os.path.splitext(filename)
-            unique_filename = f"management_{member.id}_{uuid.uuid4().hex[:8]}{ext}"
-            
-            # Save to 'app/static/images'
-            images_dir = os.path.join(current_app.root_path, 'static', 'images')
-            if not os.path.exists(images_dir):
-                os.makedirs(images_dir)
-            
-            file.save(os.path.join(images_dir, unique_filename))
-            member.image_file = f"images/{unique_filename}"
+            try:
+                # Stored relative to static/, like the bundled images
+                member.image_file = MediaService.save(file)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('main.admin_dashboard'))
             
     db.session.commit()
     flash('Member updated successfully', 'success')
@@ -99,3 +99,28 @@ def ext_search(query):
     books.sort(key=lambda book: "ben" in book.lang, reverse=True)
     return books, None
 
+
+def lookup_openlibrary(title, author, timeout=5):
+    "looks up the best OpenLibrary match for a title/author. returns {'cover': url} or None"
+    try:
+        response = requests.get(URL,
+                                params={
+                                    "title": title,
+                                    "author": author,
+                                    "limit": 1,
+                                    "fields": "cover_edition_key,cover_i"
+                                },
+                                headers=OPENLIBRARY_HEADER,
+                                timeout=timeout
+                                )
+        docs = response.json().get("docs", [])
+    except (requests.RequestException, ValueError):
+        return None
+    if not docs:
+        return None
+    doc = docs[0]
+    if "cover_edition_key" in doc:
+        return {"cover": f"https://covers.openlibrary.org/b/olid/{doc['cover_edition_key']}-M.jpg"}
+    if "cover_i" in doc:
+        return {"cover": f"https://covers.openlibrary.org/b/id/{doc['cover_i']}-M.jpg"}
+    return None
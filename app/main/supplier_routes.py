@@ -1,10 +1,12 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, send_file
 from flask_login import login_required, current_user
 from app.main import bp
 from app import db
 from app.models import Book, SupplyOrder, SupplyOrderItem, User, Supplier
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from app.services import ReplenishmentService, StockService, InvoiceService
 
 @bp.route('/supplier/orders', methods=['GET'])
 @login_required
@@ -64,23 +66,27 @@ def supplier_orders():
     # Pagination
     page = request.args.get('page', 1, type=int)
     per_page = 20
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    orders = pagination.items
+    pagination = query.options(joinedload(SupplyOrder.supplier)).paginate(page=page, per_page=per_page, error_out=False)
+    orders = SupplyOrder.load_totals(pagination.items)
     
-    # Summary Statistics (Calculated on the filtered query)
-    stats = {
-        'total_orders': query.count(),
-        'pending': query.filter(SupplyOrder.status == 'placed').count(),
-        'completed': query.filter(SupplyOrder.status == 'completed').count(),
-        'total_amount': 0
-    }
+    # Summary Statistics (Calculated on the filtered query, in one pass)
+    total_orders, pending, completed = query.order_by(None).with_entities(
+        func.count(SupplyOrder.id),
+        func.coalesce(func.sum(case((SupplyOrder.status == 'placed', 1), else_=0)), 0),
+        func.coalesce(func.sum(case((SupplyOrder.status == 'completed', 1), else_=0)), 0)
+    ).one()
     
     amount_query = query.order_by(None)\
                         .join(SupplyOrderItem, SupplyOrderItem.order_id == SupplyOrder.id)\
                         .join(Book, SupplyOrderItem.book_id == Book.id)\
                         .with_entities(func.sum(SupplyOrderItem.mass * Book.price))
     
-    stats['total_amount'] = amount_query.scalar() or 0
+    order_stats = {
+        'total_orders': total_orders,
+        'pending': pending,
+        'completed': completed,
+        'total_amount': amount_query.scalar() or 0
+    }
 
     suppliers = Supplier.query.order_by(Supplier.name).all()
     
@@ -97,61 +103,45 @@ def supplier_orders():
                            current_start_date=start_date_str,
                            current_end_date=end_date_str,
                            current_sort=sort_by,
-                           stats=stats)
-
-THRESHOLD = 5
+                           order_stats=order_stats)
 
 def get_or_create_shortlist():
-    # Find an active shortlist (draft) order
-    order = SupplyOrder.query.filter_by(status='shortlist').first()
-    if not order:
-        order = SupplyOrder(status='shortlist')
-        db.session.add(order)
-        db.session.commit()
-    return order
+    return ReplenishmentService.get_or_create_shortlist()
 
-@bp.route('/supplier/shortlist', methods=['GET', 'POST'])
+@bp.route('/supplier/shortlist', methods=['GET'])
 @login_required
 def supplier_shortlist():
     if not current_user.is_staff():
         flash('Access denied: Staff only.', 'danger')
         return redirect(url_for('main.index'))
 
-    
-    order = get_or_create_shortlist()
-
-
-    # Find all low stock books
-    low_stock_books = Book.query.filter(Book.stock_available < THRESHOLD).all()
-    
-    # Get IDs of books already in ANY active order (shortlist, pending, placed)
-    active_orders = SupplyOrder.query.filter(SupplyOrder.status.in_(['shortlist', 'pending_review', 'placed'])).all()
-    existing_item_book_ids = set()
-    for o in active_orders:
-        for item in o.items:
-            existing_item_book_ids.add(item.book_id)
-    
-    items_added = 0
-    for book in low_stock_books:
-        # If book is low stock and not already in any floating/pending order
-        if book.id not in existing_item_book_ids:
-            new_item = SupplyOrderItem(order_id=order.id, book_id=book.id, mass=5) 
-            db.session.add(new_item)
-            items_added += 1
-    
-    if items_added > 0:
-        db.session.commit()
-        if items_added == 1:
-            flash(f'1 item floated up to the shortlist due to low stock.', 'info')
-        else:
-            flash(f'{items_added} items floated up to the shortlist due to low stock.', 'info')
+    # Low-stock items are floated up by the scheduler and stock-change hooks,
+    # so viewing the page is read-only
+    order = ReplenishmentService.get_shortlist()
+    if not order:
+        return render_template('admin/supplier/shortlist.html', order=None, items=[], total_mass=0)
 
-    items = order.items.all()
+    items = order.items.options(joinedload(SupplyOrderItem.book).joinedload(Book.forecast)).all()
     
     total_mass = sum(item.mass for item in items)
 
     return render_template('admin/supplier/shortlist.html', order=order, items=items, total_mass=total_mass)
 
+@bp.route('/supplier/float_up', methods=['POST'])
+@login_required
+def supplier_float_up():
+    if not current_user.is_staff():
+        return redirect(url_for('main.index'))
+
+    items_added = ReplenishmentService.float_up_low_stock()
+    if items_added == 0:
+        flash('No new low-stock books to float up.', 'info')
+    elif items_added == 1:
+        flash('1 item floated up to the shortlist due to low stock.', 'info')
+    else:
+        flash(f'{items_added} items floated up to the shortlist due to low stock.', 'info')
+    return redirect(url_for('main.supplier_shortlist'))
+
 @bp.route('/supplier/lift/<int:book_id>', methods=['POST'])
 @login_required
 def supplier_lift(book_id):
@@ -165,7 +155,9 @@ def supplier_lift(book_id):
     if existing:
         flash('This book is already in the shortlist.', 'warning')
     else:
-        new_item = SupplyOrderItem(order_id=order.id, book_id=book_id, mass=5)
+        book = Book.query.get_or_404(book_id)
+        new_item = SupplyOrderItem(order_id=order.id, book_id=book_id,
+                                   mass=ReplenishmentService.suggested_quantity(book))
         db.session.add(new_item)
         db.session.commit()
         flash('Manual Lift applied! Book added to shortlist.', 'success')
@@ -232,7 +224,7 @@ def supplier_review():
         return redirect(url_for('main.index'))
     
     # Find orders pending review
-    orders = SupplyOrder.query.filter_by(status='pending_review').all()
+    orders = SupplyOrder.load_line_items(SupplyOrder.query.filter_by(status='pending_review').all())
     suppliers = Supplier.query.all()
     return render_template('admin/supplier/review.html', orders=orders, suppliers=suppliers)
 
@@ -268,6 +260,7 @@ def supplier_launch(order_id):
         order.supplier_id = supplier_id
         order.status = 'placed'
         db.session.commit()
+        InvoiceService.prerender(order.id)
         flash('Order Authorized! & transmitted to supplier.', 'success')
         return redirect(url_for('main.supplier_confirmation', order_id=order.id))
     else:
@@ -283,6 +276,7 @@ def supplier_launch(order_id):
                 item.order_id = new_order.id
         
         db.session.commit()
+        InvoiceService.prerender(new_order.id)
         flash(f'Selective Order #{new_order.id} Authorized and split from Order #{order.id}.', 'success')
         return redirect(url_for('main.supplier_confirmation', order_id=new_order.id))
 
@@ -292,7 +286,7 @@ def supplier_confirmation(order_id):
     order = SupplyOrder.query.get_or_404(order_id)
     
     # WhatsApp Message
-    items = order.items.all()
+    items = order.line_items
     item_details = "\n".join([f"- {item.book.title} (Qty: {item.mass})" for item in items])
     whatsapp_text = f"Hello {order.supplier.name}, Here is supply order #{order.id}:\n\n{item_details}\n\nPlease check the attached invoice."
     
@@ -304,32 +298,22 @@ def preview_invoice(order_id):
     order = SupplyOrder.query.get_or_404(order_id)
     return render_template('admin/supplier/invoice.html', order=order)
 
-from io import BytesIO
-from xhtml2pdf import pisa
-from flask import make_response
-
 @bp.route('/supplier/download_invoice/<int:order_id>', methods=['GET'])
 @login_required
 def download_invoice(order_id):
     order = SupplyOrder.query.get_or_404(order_id)
     
-    # Render HTML template with data
-    html = render_template('admin/supplier/invoice.html', order=order)
-    
-    # Create PDF buffer
-    buffer = BytesIO()
-    pisa_status = pisa.CreatePDF(html, dest=buffer)
-    
-    if pisa_status.err:
-        return 'We had some errors <pre>' + html + '</pre>'
-        
-    buffer.seek(0)
-    
-    # Create response
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=Invoice_{order.id}.pdf'
+    # Served from the invoice store; only renders if the order changed
+    try:
+        path, digest = InvoiceService.get_invoice(order)
+    except RuntimeError:
+        return 'We had some errors <pre>' + render_template('admin/supplier/invoice.html', order=order) + '</pre>'
     
+    # conditional=True answers If-None-Match with 304 and honours Range requests
+    response = send_file(path, mimetype='application/pdf', as_attachment=True,
+                         download_name=f'Invoice_{order.id}.pdf', conditional=True, etag=digest)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
     return response
 
 @bp.route('/supplier/receive_list', methods=['GET'])
@@ -339,7 +323,7 @@ def supplier_receive_list():
          return redirect(url_for('main.index'))
          
     # List orders that are placed and waiting for delivery
-    orders = SupplyOrder.query.filter_by(status='placed').all()
+    orders = SupplyOrder.load_totals(SupplyOrder.query.filter_by(status='placed').all())
     return render_template('admin/supplier/receive_list.html', orders=orders)
 
 @bp.route('/supplier/receive/<int:order_id>', methods=['GET'])
@@ -378,25 +362,13 @@ def supplier_update_payload(item_id):
 @login_required
 def supplier_fusion(order_id):
     order = SupplyOrder.query.get_or_404(order_id)
-    if order.status != 'placed':
-        flash('Order not ready for fusion.', 'danger')
-        return redirect(url_for('main.supplier_receive_list'))
-        
-    # INVENTORY FUSION
-    for item in order.items:
-
-        qty_received = item.payload if item.payload is not None else item.mass
         
-        # Update Book Stock
-        item.book.stock_total += qty_received
-        item.book.stock_available += qty_received
-        
-        # Update payload field for record keeping if it was None
-        if item.payload is None:
-            item.payload = qty_received
-            
-    order.status = 'completed'
-    db.session.commit()
+    # INVENTORY FUSION (one bulk update, ledgered as receipts)
+    try:
+        StockService.receive_order(order, user_id=current_user.id)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('main.supplier_receive_list'))
     
     flash('Inventory Fusion Complete! Stock updated.', 'success')
     return redirect(url_for('main.supplier_receive_list'))
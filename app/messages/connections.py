@@ -0,0 +1,213 @@
+"""
+Registry of live Socket.IO connections per user.
+
+Every sid is recorded under its user with a heartbeat timestamp, so a
+user with several tabs stays online until the last one closes. Each
+process refreshes the heartbeats of its own sockets in the background;
+entries left behind by a crashed node expire after CONNECTION_TTL_SECONDS.
+Redis is used when the app runs on several processes, a dict otherwise.
+"""
+
+import threading
+import time
+from app.extensions import socketio
+
+
+class MemoryRegistry:
+    """Connections held in this process; enough for a single-node deployment."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._users = {} # user_id -> {sid: last heartbeat}
+        self._lock = threading.Lock()
+
+    def _prune(self, sids, now):
+        for sid in [sid for sid, beat in sids.items() if beat < now - self.ttl]:
+            del sids[sid]
+
+    def add(self, user_id, sid, now):
+        with self._lock:
+            sids = self._users.setdefault(user_id, {})
+            self._prune(sids, now)
+            sids[sid] = now
+            return len(sids)
+
+    def remove(self, user_id, sid, now):
+        with self._lock:
+            sids = self._users.get(user_id, {})
+            sids.pop(sid, None)
+            self._prune(sids, now)
+            if not sids:
+                self._users.pop(user_id, None)
+            return len(sids)
+
+    def heartbeat(self, pairs, now):
+        with self._lock:
+            for user_id, sid in pairs:
+                sids = self._users.get(user_id)
+                if sids is not None and sid in sids:
+                    sids[sid] = now
+
+    def online(self, user_ids, now):
+        with self._lock:
+            return {user_id for user_id in user_ids
+                    if any(beat >= now - self.ttl for beat in self._users.get(user_id, {}).values())}
+
+
+class RedisRegistry:
+    """
+    Connections shared by every process through Redis.
+
+    Each user is a hash of sid -> heartbeat time. Adds and removes run as
+    one Lua script that also drops expired sids, so the returned count is
+    consistent even when two tabs close on two nodes at the same moment.
+    """
+
+    KEY = 'connections:{}'
+    UPDATE_SCRIPT = """
+        local cutoff = tonumber(ARGV[3]) - tonumber(ARGV[4])
+        local entries = redis.call('HGETALL', KEYS[1])
+        for i = 1, #entries, 2 do
+            if tonumber(entries[i + 1]) < cutoff then
+                redis.call('HDEL', KEYS[1], entries[i])
+            end
+        end
+        if ARGV[1] == 'add' then
+            redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+        else
+            redis.call('HDEL', KEYS[1], ARGV[2])
+        end
+        local count = redis.call('HLEN', KEYS[1])
+        if count > 0 then
+            redis.call('EXPIRE', KEYS[1], ARGV[4])
+        end
+        return count
+    """
+    # Only refresh sids that are still registered, so a heartbeat racing a
+    # disconnect can't bring the closed socket back
+    BEAT_SCRIPT = """
+        if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+            redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+            redis.call('EXPIRE', KEYS[1], ARGV[3])
+        end
+    """
+
+    def __init__(self, url, ttl):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._update = self._redis.register_script(self.UPDATE_SCRIPT)
+        self._beat = self._redis.register_script(self.BEAT_SCRIPT)
+
+    def add(self, user_id, sid, now):
+        return int(self._update(keys=[self.KEY.format(user_id)], args=['add', sid, now, self.ttl]))
+
+    def remove(self, user_id, sid, now):
+        return int(self._update(keys=[self.KEY.format(user_id)], args=['remove', sid, now, self.ttl]))
+
+    def heartbeat(self, pairs, now):
+        pipe = self._redis.pipeline(transaction=False)
+        for user_id, sid in pairs:
+            self._beat(keys=[self.KEY.format(user_id)], args=[sid, now, self.ttl], client=pipe)
+        pipe.execute()
+
+    def online(self, user_ids, now):
+        user_ids = list(user_ids)
+        pipe = self._redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hvals(self.KEY.format(user_id))
+        return {user_id for user_id, beats in zip(user_ids, pipe.execute())
+                if any(float(beat) >= now - self.ttl for beat in beats)}
+
+
+class ConnectionRegistry:
+    """Configured registry plus the sockets this process is responsible for."""
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.heartbeat_interval = 30
+        self._local = {} # sid -> user_id, refreshed by this process's heartbeat task
+        self._lock = threading.Lock()
+        self._beater = None
+
+    def init_app(self, app):
+        self.app = app
+        ttl = app.config.get('CONNECTION_TTL_SECONDS', 90)
+        self.heartbeat_interval = app.config.get('CONNECTION_HEARTBEAT_SECONDS', 30)
+        kind = app.config.get('CONNECTION_REGISTRY') or \
+            ('redis' if app.config.get('SOCKETIO_MESSAGE_QUEUE') else 'memory')
+        if kind == 'redis':
+            self.backend = RedisRegistry(app.config.get('REDIS_URL'), ttl)
+        else:
+            self.backend = MemoryRegistry(ttl)
+
+    def connect(self, user_id, sid):
+        """
+        Record a new socket.
+
+        Returns:
+            int: The user's open connections, including this one; 1 means
+            the user just came online
+        """
+        with self._lock:
+            self._local[sid] = user_id
+            if self._beater is None:
+                self._beater = socketio.start_background_task(self._run)
+        try:
+            return self.backend.add(user_id, sid, time.time())
+        except Exception:
+            self.app.logger.warning('Connection registry unavailable', exc_info=True)
+            return 1
+
+    def disconnect(self, user_id, sid):
+        """
+        Forget a closed socket.
+
+        Returns:
+            int: The user's remaining connections; 0 means the user went
+            offline
+        """
+        with self._lock:
+            self._local.pop(sid, None)
+        try:
+            return self.backend.remove(user_id, sid, time.time())
+        except Exception:
+            self.app.logger.warning('Connection registry unavailable', exc_info=True)
+            return 0
+
+    def online_ids(self, user_ids):
+        """The subset of user_ids with at least one live connection."""
+        if not user_ids:
+            return set()
+        try:
+            return self.backend.online(user_ids, time.time())
+        except Exception:
+            self.app.logger.warning('Connection registry unavailable', exc_info=True)
+            return set()
+
+    def is_online(self, user_id):
+        return user_id in self.online_ids([user_id])
+
+    @property
+    def local_count(self):
+        """Sockets open on this process."""
+        return len(self._local)
+
+    def heartbeat(self):
+        """Refresh the timestamps of every socket open on this process."""
+        with self._lock:
+            pairs = [(user_id, sid) for sid, user_id in self._local.items()]
+        if pairs:
+            self.backend.heartbeat(pairs, time.time())
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.heartbeat_interval)
+            try:
+                self.heartbeat()
+            except Exception:
+                self.app.logger.warning('Connection heartbeat failed', exc_info=True)
+
+
+connections = ConnectionRegistry()
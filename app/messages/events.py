@@ -3,9 +3,15 @@ from flask_socketio import emit, join_room, leave_room
 from flask_login import current_user
 from app.extensions import socketio, db
 from app.models import Message, User
+from app.messages.presence import presence, presence_room, contact_ids
+from app.messages.connections import connections
+from app.messages import sync
+from app.messages.typing import typing
+from app.messages.handlers import db_event
 from datetime import datetime
 
 @socketio.on('connect')
+@db_event
 def handle_connect(auth=None):
     """Handle user connection to Socket.IO"""
     if current_user.is_authenticated:
@@ -13,43 +19,63 @@ def handle_connect(auth=None):
         room = f'user_{current_user.id}'
         join_room(room)
         
-        # Store socket ID for tracking active connections
-        current_user.socket_id = request.sid
-        db.session.commit()
+        # Follow the status of everyone this user has talked to
+        presence.subscribe(contact_ids(current_user.id))
+        
+        # Catch up on what happened while this client was away
+        batch = None
+        if auth and 'last_event_id' in auth:
+            batch = sync.batch(current_user.id, _event_cursor(auth.get('last_event_id')))
+        
+        # Register this socket only once the DB work is done: a refused
+        # connect gets no disconnect event, so it would never be forgotten.
+        # Only the user's first socket brings them online
+        if connections.connect(current_user.id, request.sid) == 1:
+            # Notify user's contacts that they're online
+            presence.changed(current_user.id, {
+                'user_id': current_user.id,
+                'status': 'online',
+                'username': current_user.username
+            })
         
-        # Notify user's contacts that they're online
-        emit('user_status', {
-            'user_id': current_user.id,
-            'status': 'online',
-            'username': current_user.username
-        }, broadcast=True)
+        if batch is not None:
+            emit('sync_batch', batch)
         
         print(f"User {current_user.username} connected with socket {request.sid}")
 
+def _event_cursor(value):
+    """A client's last_event_id as an int, or None if it has none yet"""
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
 @socketio.on('disconnect')
-def handle_disconnect():
+@db_event
+def handle_disconnect(reason=None):
     """Handle user disconnection from Socket.IO"""
     if current_user.is_authenticated:
         # Leave user's personal room
         room = f'user_{current_user.id}'
         leave_room(room)
         
-        # Clear socket ID
-        current_user.socket_id = None
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
-        
-        # Notify user's contacts that they're offline
-        emit('user_status', {
-            'user_id': current_user.id,
-            'status': 'offline',
-            'username': current_user.username,
-            'last_seen': current_user.last_seen.isoformat()
-        }, broadcast=True)
+        # Other tabs may still be open; the user goes offline with the last one
+        if connections.disconnect(current_user.id, request.sid) == 0:
+            current_user.last_seen = datetime.utcnow()
+            db.session.commit()
+            
+            # Notify user's contacts that they're offline
+            presence.changed(current_user.id, {
+                'user_id': current_user.id,
+                'status': 'offline',
+                'username': current_user.username,
+                'last_seen': current_user.last_seen.isoformat()
+            })
         
         print(f"User {current_user.username} disconnected")
 
 @socketio.on('send_message')
+@db_event
 def handle_send_message(data):
     """Handle sending a message in real-time"""
     if not current_user.is_authenticated:
@@ -69,6 +95,7 @@ def handle_send_message(data):
         timestamp=datetime.utcnow()
     )
     db.session.add(message)
+    events = sync.record('message', message)
     db.session.commit()
     
     # Prepare message data
@@ -85,31 +112,57 @@ def handle_send_message(data):
     
     # Emit to recipient's room
     recipient_room = f'user_{recipient_id}'
-    emit('receive_message', message_data, room=recipient_room)
+    emit('receive_message', dict(message_data, event_id=events[recipient_id].id), room=recipient_room)
+    
+    # The message itself ends the typing indicator, without the stop delay
+    typing.stop(current_user.id, int(recipient_id))
     
     # Also emit back to sender for confirmation
-    emit('message_sent', message_data)
+    emit('message_sent', dict(message_data, event_id=events[current_user.id].id))
+    
+    # A first message makes them contacts; the recipient side subscribes
+    # with presence_subscribe when the message arrives
+    join_room(presence_room(recipient_id))
     
     return {'success': True, 'message_id': message.id}
 
+@socketio.on('sync')
+@db_event
+def handle_sync(data):
+    """Send the next batch of missed events after the client's cursor"""
+    if not current_user.is_authenticated:
+        return {'error': 'Unauthorized'}, 401
+    
+    emit('sync_batch', sync.batch(current_user.id, _event_cursor((data or {}).get('after'))))
+
+@socketio.on('presence_subscribe')
+@db_event
+def handle_presence_subscribe(data):
+    """Follow the status of users that became contacts after connecting"""
+    if not current_user.is_authenticated:
+        return {'error': 'Unauthorized'}, 401
+    
+    requested = {uid for uid in (data or {}).get('user_ids', []) if isinstance(uid, int)}
+    allowed = requested & contact_ids(current_user.id) if requested else set()
+    presence.subscribe(allowed)
+    return {'subscribed': sorted(allowed)}
+
 @socketio.on('typing')
+@db_event
 def handle_typing(data):
-    """Handle typing indicator"""
+    """Handle typing indicator; only start/stop transitions reach the recipient"""
     if not current_user.is_authenticated:
         return
     
-    recipient_id = data.get('recipient_id')
-    is_typing = data.get('is_typing', False)
-    
-    if recipient_id:
-        recipient_room = f'user_{recipient_id}'
-        emit('typing_indicator', {
-            'user_id': current_user.id,
-            'username': current_user.username,
-            'is_typing': is_typing
-        }, room=recipient_room)
+    try:
+        recipient_id = int(data.get('recipient_id'))
+    except (TypeError, ValueError):
+        return
+    
+    typing.update(current_user.id, recipient_id, current_user.username, bool(data.get('is_typing', False)))
 
 @socketio.on('mark_read')
+@db_event
 def handle_mark_read(data):
     """Mark messages as read in real-time"""
     if not current_user.is_authenticated:
@@ -136,6 +189,7 @@ def handle_mark_read(data):
                 }, room=sender_room)
 
 @socketio.on('user_online')
+@db_event
 def handle_user_online():
     """Update user's last_seen timestamp"""
     if current_user.is_authenticated:
@@ -143,6 +197,7 @@ def handle_user_online():
         db.session.commit()
 
 @socketio.on('edit_message')
+@db_event
 def handle_edit_message(data):
     """Handle message editing in real-time"""
     if not current_user.is_authenticated:
@@ -161,6 +216,7 @@ def handle_edit_message(data):
     
     message.body = new_body
     message.edited_at = datetime.utcnow()
+    events = sync.record('edit', message)
     db.session.commit()
     
     # Notify recipient
@@ -168,12 +224,14 @@ def handle_edit_message(data):
     emit('message_edited', {
         'message_id': message.id,
         'new_body': message.body,
-        'edited_at': message.edited_at.isoformat()
+        'edited_at': message.edited_at.isoformat(),
+        'event_id': events[message.recipient_id].id
     }, room=recipient_room)
     
     return {'success': True}
 
 @socketio.on('delete_message')
+@db_event
 def handle_delete_message(data):
     """Handle message deletion in real-time"""
     if not current_user.is_authenticated:
@@ -191,13 +249,15 @@ def handle_delete_message(data):
     
     message.is_deleted = True
     message.deleted_at = datetime.utcnow()
+    events = sync.record('delete', message)
     db.session.commit()
     
     # Notify recipient
     recipient_room = f'user_{message.recipient_id}'
     emit('message_deleted', {
         'message_id': message.id,
-        'deleted_at': message.deleted_at.isoformat()
+        'deleted_at': message.deleted_at.isoformat(),
+        'event_id': events[message.recipient_id].id
     }, room=recipient_room)
     
     return {'success': True}
@@ -0,0 +1,86 @@
+"""
+Unit of work for Socket.IO event handlers.
+
+Each event wrapped with @db_event runs as its own unit of work: it is
+committed when the handler returns and rolled back when it raises, and
+the session is removed on the way out, so its connection goes back to
+the pool as soon as the event is handled instead of whenever the socket
+thread gets around to tearing its context down.
+
+SQL time is charged to the event. Once it passes
+SOCKETIO_EVENT_DB_BUDGET_MS, further statements raise DBBudgetExceeded;
+the event is rolled back and the client gets an error instead of the
+handler holding a connection while the database is struggling.
+"""
+
+import threading
+import time
+from functools import wraps
+from flask import current_app, request
+from app.extensions import db
+from app.db_monitor import begin_scope, DBBudgetExceeded
+
+
+class EventStats:
+    """Per-event counts and DB time, for sizing the pool and the budget."""
+
+    def __init__(self):
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, scope, seconds, outcome):
+        with self._lock:
+            stats = self._events.get(name)
+            if stats is None:
+                stats = self._events[name] = {'events': 0, 'queries': 0, 'db_ms': 0.0, 'max_db_ms': 0.0,
+                                              'total_ms': 0.0, 'rolled_back': 0, 'over_budget': 0}
+            stats['events'] += 1
+            stats['queries'] += scope.queries
+            stats['db_ms'] += scope.seconds * 1000
+            stats['max_db_ms'] = max(stats['max_db_ms'], scope.seconds * 1000)
+            stats['total_ms'] += seconds * 1000
+            if outcome != 'committed':
+                stats['rolled_back'] += 1
+            if outcome == 'over_budget':
+                stats['over_budget'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._events.items()}
+
+
+event_stats = EventStats()
+
+
+def db_event(f):
+    """Run a Socket.IO handler as one committed-or-rolled-back unit of work."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        # A fresh app context gives the event its own scoped session and g, even
+        # when the socket's thread (or a test) already has one pushed
+        with current_app.app_context():
+            budget = current_app.config.get('SOCKETIO_EVENT_DB_BUDGET_MS')
+            scope = begin_scope(budget / 1000 if budget else None)
+            name = request.event['message'] if hasattr(request, 'event') else f.__name__
+            start = time.perf_counter()
+            outcome = 'rolled_back'
+            try:
+                result = f(*args, **kwargs)
+                db.session.commit()
+                outcome = 'committed'
+                return result
+            except DBBudgetExceeded as e:
+                db.session.rollback()
+                outcome = 'over_budget'
+                current_app.logger.warning('Socket.IO event %s over its DB budget: %s', name, e)
+                if name == 'connect':
+                    raise ConnectionRefusedError('Server busy')
+                return {'error': 'Server busy, try again'}, 503
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                # Hand the connection back now rather than at context teardown
+                db.session.remove()
+                event_stats.record(name, scope, time.perf_counter() - start, outcome)
+    return wrapper
@@ -0,0 +1,116 @@
+"""
+Online/offline presence for the chat.
+
+A user's status goes only to the sockets of people they have exchanged
+messages with: every socket joins the presence room of each of its
+user's contacts, and a status change is emitted to the user's own
+presence room. Changes are queued and sent once per coalescing window,
+so a page reload (disconnect then connect) sends nothing at all.
+
+Coalescing only compares a window's last change with the status the
+user had when the window opened. Nothing is remembered between windows,
+so a process never suppresses a change because of what it sent long
+ago, while other nodes may have sent something since.
+"""
+
+import threading
+from flask_socketio import join_room
+from sqlalchemy import select, union
+from app.extensions import socketio, db
+from app.models import Message
+
+# Status changes are transitions: each one leaves the other status
+PREVIOUS_STATUS = {'online': 'offline', 'offline': 'online'}
+
+
+def presence_room(user_id):
+    """Room holding the sockets that follow a user's status."""
+    return f'presence_{user_id}'
+
+
+def contact_ids(user_id):
+    """IDs of everyone the user has sent a message to or received one from."""
+    sent = select(Message.recipient_id).where(Message.sender_id == user_id)
+    received = select(Message.sender_id).where(Message.recipient_id == user_id)
+    return {row[0] for row in db.session.execute(union(sent, received))}
+
+
+class Presence:
+    """Queues status changes and emits the latest one per user to their contacts."""
+
+    def __init__(self):
+        self.window = 2.0
+        self.app = None
+        self._pending = {} # user_id -> (status when the window opened, latest payload)
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.stats = {'changes': 0, 'emitted': 0, 'coalesced': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.window = app.config.get('PRESENCE_COALESCE_SECONDS', 2.0)
+
+    @property
+    def pending(self):
+        """Status changes waiting for the next flush."""
+        return len(self._pending)
+
+    def subscribe(self, user_ids):
+        """Join the current socket to the presence rooms of these users."""
+        for user_id in user_ids:
+            join_room(presence_room(user_id))
+
+    def changed(self, user_id, payload):
+        """
+        Queue a status change.
+
+        Args:
+            user_id: User whose status changed
+            payload: user_status event data; a later change in the same
+                window replaces it
+        """
+        with self._lock:
+            if user_id in self._pending:
+                before = self._pending[user_id][0]
+            else:
+                before = PREVIOUS_STATUS.get(payload['status'])
+            self._pending[user_id] = (before, payload)
+            self.stats['changes'] += 1
+            if self.window > 0 and self._flusher is None:
+                self._flusher = socketio.start_background_task(self._run)
+        if self.window <= 0:
+            self.flush()
+
+    def flush(self):
+        """
+        Emit every queued change that leaves the user in a different status
+        than when its window opened.
+
+        Returns:
+            int: Number of user_status events emitted
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            changes = []
+            for user_id, (before, payload) in pending.items():
+                if payload['status'] == before:
+                    self.stats['coalesced'] += 1
+                    continue
+                changes.append((user_id, payload))
+            self.stats['emitted'] += len(changes)
+
+        for user_id, payload in changes:
+            socketio.emit('user_status', payload, to=presence_room(user_id))
+        return len(changes)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.window)
+            try:
+                self.flush()
+            except Exception:
+                # Keep the flusher alive; the next window starts from fresh state
+                self.app.logger.exception('Presence flush failed')
+
+
+presence = Presence()
@@ -6,6 +6,8 @@ from app.models import User, Message
 from datetime import datetime
 from sqlalchemy import or_, and_, func
 from app.extensions import socketio
+from app.messages.connections import connections
+from app.messages import sync
 from flask_socketio import emit
 
 @bp.route('/send/<int:recipient_id>', methods=['POST'])
@@ -20,6 +22,8 @@ def send_message(recipient_id):
         
     msg = Message(sender_id=current_user.id, recipient_id=recipient.id, body=body)
     db.session.add(msg)
+    # The recipient picks it up on their next sync
+    sync.record('message', msg)
     db.session.commit()
     
     return jsonify({
@@ -138,6 +142,9 @@ def get_unread_list():
     
     # Group by conversation partner to get latest message from each
     conversations = {}
+    connected = connections.online_ids({
+        msg.recipient_id if msg.sender_id == current_user.id else msg.sender_id for msg in recent_messages
+    })
     for msg in recent_messages:
         other_id = msg.recipient_id if msg.sender_id == current_user.id else msg.sender_id
         
@@ -158,7 +165,7 @@ def get_unread_list():
                 'message_preview': msg.body[:50] + ('...' if len(msg.body) > 50 else ''),
                 'timestamp': msg.timestamp.strftime('%H:%M' if msg.timestamp.date() == datetime.today().date() else '%b %d'),
                 'unread_count': unread_count,
-                'is_online': other_user.is_online() if other_user else False,
+                'is_online': other_user.is_online(connected) if other_user else False,
                 'last_message_time': msg.timestamp
             }
     
@@ -198,6 +205,7 @@ def edit_message(message_id):
     # Update message
     msg.body = new_body.strip()
     msg.edited_at = datetime.utcnow()
+    events = sync.record('edit', msg)
     db.session.commit()
     
     # Emit Socket.IO event to recipient
@@ -205,7 +213,8 @@ def edit_message(message_id):
     socketio.emit('message_edited', {
         'message_id': msg.id,
         'new_body': msg.body,
-        'edited_at': msg.edited_at.isoformat()
+        'edited_at': msg.edited_at.isoformat(),
+        'event_id': events[msg.recipient_id].id
     }, room=recipient_room)
     
     return jsonify({
@@ -234,13 +243,15 @@ def delete_message(message_id):
     # Soft delete
     msg.is_deleted = True
     msg.deleted_at = datetime.utcnow()
+    events = sync.record('delete', msg)
     db.session.commit()
     
     # Emit Socket.IO event to recipient
     recipient_room = f'user_{msg.recipient_id}'
     socketio.emit('message_deleted', {
         'message_id': msg.id,
-        'deleted_at': msg.deleted_at.isoformat()
+        'deleted_at': msg.deleted_at.isoformat(),
+        'event_id': events[msg.recipient_id].id
     }, room=recipient_room)
     
     return jsonify({
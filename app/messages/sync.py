@@ -0,0 +1,124 @@
+"""
+Catch-up sync for reconnecting chat clients.
+
+Every new, edited or deleted message is logged once per participant in
+message_events. The ids only grow, so a client keeps the last id it has
+seen and, on reconnect, asks for what came after it. The reply comes in
+batches and costs a range scan on (user_id, id) instead of a reload of
+every conversation.
+
+Ids come from concurrent transactions, so a lower id can commit after a
+higher one has been read. The cursor handed back therefore stops short
+of events younger than MESSAGE_SYNC_SETTLE_SECONDS; those are sent again
+on the next sync and the client skips what it already has.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models import Message, MessageEvent
+
+
+def record(kind, message):
+    """
+    Log a change to a message for both participants, in the caller's transaction.
+
+    Args:
+        kind: 'message', 'edit' or 'delete'
+        message: The Message (may still be pending; ids are filled on flush)
+
+    Returns:
+        dict: user_id -> MessageEvent, so emits can carry the event id
+    """
+    events = {user_id: MessageEvent(user_id=user_id, message=message, kind=kind)
+              for user_id in {message.sender_id, message.recipient_id}}
+    db.session.add_all(events.values())
+    return events
+
+
+def head(user_id):
+    """The user's newest event id, 0 if there is none."""
+    return db.session.query(func.max(MessageEvent.id)).filter(MessageEvent.user_id == user_id).scalar() or 0
+
+
+def serialize(message):
+    return {
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'sender_username': message.sender.username if message.sender else None,
+        'sender_photo': message.sender.profile_photo if message.sender else None,
+        'recipient_id': message.recipient_id,
+        'body': None if message.is_deleted else message.body,
+        'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+        'is_read': bool(message.is_read),
+        'is_deleted': bool(message.is_deleted),
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+        'deleted_at': message.deleted_at.isoformat() if message.deleted_at else None
+    }
+
+
+def batch(user_id, after):
+    """
+    The next batch of a user's events after a cursor.
+
+    Args:
+        user_id: ID of the syncing user
+        after: Last event id the client has applied; None for a client
+            with no cursor yet, which only learns where the log ends
+
+    Returns:
+        dict: 'events' (id, kind and the message's current state),
+        'last_event_id' (the cursor to store; behind next_after when the
+        batch ends in unsettled events), 'next_after' (where the next batch
+        starts), 'more' (ask again) and 'reset' (events were pruned past
+        the cursor; reload histories)
+    """
+    if after is None:
+        last = head(user_id)
+        return {'events': [], 'last_event_id': last, 'next_after': last, 'more': False, 'reset': False}
+
+    if after > 0:
+        oldest = db.session.query(func.min(MessageEvent.id)).scalar()
+        if oldest is None or after < oldest - 1:
+            last = head(user_id)
+            return {'events': [], 'last_event_id': last, 'next_after': last, 'more': False, 'reset': True}
+
+    size = current_app.config.get('MESSAGE_SYNC_BATCH_SIZE', 200)
+    rows = MessageEvent.query.options(joinedload(MessageEvent.message).joinedload(Message.sender))\
+        .filter(MessageEvent.user_id == user_id, MessageEvent.id > after)\
+        .order_by(MessageEvent.id).limit(size + 1).all()
+    more = len(rows) > size
+    rows = rows[:size]
+
+    settled = datetime.utcnow() - timedelta(seconds=current_app.config.get('MESSAGE_SYNC_SETTLE_SECONDS', 5))
+    cursor = after
+    for event in rows:
+        if event.created_at and event.created_at >= settled:
+            break
+        cursor = event.id
+    return {
+        'events': [{'id': e.id, 'kind': e.kind, 'message': serialize(e.message)} for e in rows],
+        'last_event_id': cursor,
+        'next_after': rows[-1].id if rows else after,
+        'more': more,
+        'reset': False
+    }
+
+
+def prune(before):
+    """
+    Delete events older than a cutoff.
+
+    Clients whose cursor falls before what is left are told to reset.
+
+    Args:
+        before: datetime cutoff
+
+    Returns:
+        int: Number of events deleted
+    """
+    deleted = MessageEvent.query.filter(MessageEvent.created_at < before).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,141 @@
+"""
+Typing indicators, relayed as state changes only.
+
+Clients send `typing` on every keystroke. The aggregator keeps one state
+per (sender, recipient) pair and emits to the recipient only when that
+state changes:
+
+    - the first keystroke emits is_typing=True at once (leading edge),
+      later ones only push the expiry back;
+    - a stop is held for TYPING_STOP_DELAY seconds and dropped if typing
+      resumes within it, so short pauses don't flap the indicator;
+    - a pair that sends nothing for TYPING_EXPIRY_SECONDS is stopped, so
+      a closed tab doesn't leave "is typing..." on screen.
+"""
+
+import threading
+import time
+from app.extensions import socketio
+
+
+class TypingState:
+    __slots__ = ('username', 'expires_at', 'stop_at')
+
+    def __init__(self, username, expires_at):
+        self.username = username
+        self.expires_at = expires_at
+        self.stop_at = None # Set while a stop is being held
+
+
+class TypingAggregator:
+    """
+    Per-pair typing state with a background sweep for held stops and expiry.
+
+    Args:
+        emit: Called as emit(sender_id, recipient_id, username, is_typing)
+            for every state change; defaults to a typing_indicator emit
+        clock: Monotonic time source, replaceable for simulations
+    """
+
+    def __init__(self, emit=None, clock=time.monotonic):
+        self.stop_delay = 1.5
+        self.expiry = 8.0
+        self.sweep_interval = 0.5
+        self.app = None
+        self._emit = emit or self._emit_socketio
+        self._clock = clock
+        self._pairs = {} # (sender_id, recipient_id) -> TypingState
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.stats = {'received': 0, 'emitted': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.stop_delay = app.config.get('TYPING_STOP_DELAY', 1.5)
+        self.expiry = app.config.get('TYPING_EXPIRY_SECONDS', 8.0)
+
+    @property
+    def pending(self):
+        """Pairs showing an indicator, each owed a stop by update(), stop() or sweep()."""
+        return len(self._pairs)
+
+    @staticmethod
+    def _emit_socketio(sender_id, recipient_id, username, is_typing):
+        socketio.emit('typing_indicator', {
+            'user_id': sender_id,
+            'username': username,
+            'is_typing': is_typing
+        }, to=f'user_{recipient_id}')
+
+    def update(self, sender_id, recipient_id, username, is_typing):
+        """
+        Apply one typing event from a client.
+
+        Args:
+            sender_id: User who is typing
+            recipient_id: User whose chat window shows the indicator
+            username: Shown as "<username> is typing..."
+            is_typing: The client's flag
+        """
+        now = self._clock()
+        key = (sender_id, recipient_id)
+        emit = None
+        with self._lock:
+            self.stats['received'] += 1
+            state = self._pairs.get(key)
+            if is_typing:
+                if state is None:
+                    self._pairs[key] = TypingState(username, now + self.expiry)
+                    emit = True
+                else:
+                    state.expires_at = now + self.expiry
+                    state.stop_at = None
+            elif state is not None and state.stop_at is None:
+                state.stop_at = now + self.stop_delay
+            if emit is not None:
+                self.stats['emitted'] += 1
+            # Only the app-bound instance sweeps; standalone ones call sweep() themselves
+            if self._sweeper is None and self.app is not None:
+                self._sweeper = socketio.start_background_task(self._run)
+        if emit is not None:
+            self._emit(sender_id, recipient_id, username, emit)
+
+    def stop(self, sender_id, recipient_id):
+        """End a pair's typing now, e.g. because the message was sent."""
+        with self._lock:
+            state = self._pairs.pop((sender_id, recipient_id), None)
+            if state is not None:
+                self.stats['emitted'] += 1
+        if state is not None:
+            self._emit(sender_id, recipient_id, state.username, False)
+
+    def sweep(self):
+        """
+        Emit the stops that are due: held stops past their delay and
+        pairs past their expiry.
+
+        Returns:
+            int: Number of stops emitted
+        """
+        now = self._clock()
+        due = []
+        with self._lock:
+            for key, state in list(self._pairs.items()):
+                if (state.stop_at is not None and state.stop_at <= now) or state.expires_at <= now:
+                    del self._pairs[key]
+                    due.append((key, state.username))
+            self.stats['emitted'] += len(due)
+        for (sender_id, recipient_id), username in due:
+            self._emit(sender_id, recipient_id, username, False)
+        return len(due)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception:
+                self.app.logger.exception('Typing indicator sweep failed')
+
+
+typing = TypingAggregator()
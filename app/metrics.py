@@ -0,0 +1,313 @@
+"""
+Metrics registry and Prometheus text exposition, served at /metrics.
+
+Counters and histograms are updated in the code they measure. Each
+labelled series has its own lock, so updates never contend on a
+registry-wide lock, and creating a series is the only time the metric's
+lock is taken. Gauges that mirror state the app already keeps (pool,
+sockets, cache, queues) are read by callbacks at scrape time and cost
+nothing on the request path.
+
+Figures are per process, like /admin/perf; with several workers,
+Prometheus scrapes and sums each one.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from flask import current_app, g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    __slots__ = ('value', 'lock')
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """A named family of series, one per combination of label values."""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {} # label values -> value object
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} takes labels {self.labelnames}, got {values}')
+            with self._lock:
+                series = self._series.setdefault(values, self._new_value())
+        return series
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, series in list(self._series.items()):
+            yield self.name, _labels(self.labelnames, values), series.value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, series in list(self._series.items()):
+            with series.lock:
+                counts, total = list(series.counts), series.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', _labels(self.labelnames, values, f'le="{_number(bound)}"'), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, values), total
+            yield f'{self.name}_count', _labels(self.labelnames, values), cumulative
+
+
+class Collected:
+    """
+    A metric read from existing state when scraped.
+
+    Args:
+        fn: Returns a number, or a dict of label value tuples to numbers
+        kind: 'gauge', or 'counter' for totals kept elsewhere
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            value = {(): value}
+        for values, number in value.items():
+            yield self.name, _labels(self.labelnames, values), number
+
+
+class Registry:
+    """Metrics in registration order, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collected(self, name, help, fn, labelnames=(), kind='gauge'):
+        return self.register(Collected(name, help, fn, labelnames, kind))
+
+    def expose(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                current_app.logger.warning('Metric %s failed to collect', metric.name, exc_info=True)
+                continue
+            lines.append(f'# HELP {metric.name} {_escape(metric.help)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_number(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter('http_requests_total', 'HTTP requests by endpoint, method and status',
+                                 ['endpoint', 'method', 'status'])
+HTTP_LATENCY = registry.histogram('http_request_duration_seconds', 'HTTP request latency by endpoint',
+                                  ['endpoint', 'method'])
+
+CHATBOT_MESSAGES = registry.counter('chatbot_messages_total', 'Chatbot messages processed, by outcome', ['outcome'])
+CHATBOT_LATENCY = registry.histogram('chatbot_message_duration_seconds',
+                                     'Time to answer a chatbot message, tool calls included', buckets=LLM_BUCKETS)
+LLM_LATENCY = registry.histogram('chatbot_llm_request_duration_seconds', 'Latency of each call to the LLM',
+                                 buckets=LLM_BUCKETS)
+LLM_TOKENS = registry.counter('chatbot_llm_tokens_total', 'LLM tokens used, prompt or completion', ['kind'])
+
+CART_ITEMS_ADDED = registry.counter('cart_items_added_total', 'Items added to carts, by action', ['action'])
+CART_ITEMS_REMOVED = registry.counter('cart_items_removed_total', 'Items removed from carts')
+CHECKOUTS = registry.counter('checkouts_total', 'Checkout confirmations, by outcome', ['outcome'])
+CHECKOUT_ITEMS = registry.counter('checkout_items_total', 'Copies checked out, by action', ['action'])
+LOANS_CREATED = registry.counter('loans_created_total', 'Loans created, by source', ['source'])
+LOANS_RETURNED = registry.counter('loans_returned_total', 'Loans returned, by who returned them', ['by'])
+
+
+def observe(histogram, outcomes):
+    """Decorator timing a call into histogram and counting it as ok or error in outcomes."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = f(*args, **kwargs)
+            except Exception:
+                outcomes.labels('error').inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+            outcomes.labels('ok').inc()
+            return result
+        return wrapper
+    return decorator
+
+
+class Metrics:
+    """Request hooks and the scrape-time collectors for app state."""
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        self._register_collectors()
+
+    def _start(self):
+        g._metrics_start = time.perf_counter()
+
+    def _finish(self, response):
+        start = g.pop('_metrics_start', None)
+        if start is None or request.endpoint == 'static':
+            return response
+        # Unmatched URLs share one label so scanners can't create series
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+        HTTP_REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        return response
+
+    @staticmethod
+    def _register_collectors():
+        from app.cache import response_cache
+        from app.db_monitor import pool_monitor
+        from app.messages.connections import connections
+        from app.messages.handlers import event_stats
+        from app.messages.presence import presence
+        from app.messages.typing import typing
+
+        def pool(key):
+            return lambda: pool_monitor.snapshot().get(key)
+
+        registry.collected('db_pool_size', 'Connections the pool keeps open', pool('size'))
+        registry.collected('db_pool_checked_out', 'Connections currently checked out', pool('checked_out'))
+        registry.collected('db_pool_overflow', 'Connections open beyond pool_size', pool('overflow'))
+        registry.collected('db_pool_checkouts_total', 'Pool checkouts', pool('checkouts'), kind='counter')
+        registry.collected('db_pool_overflow_checkouts_total', 'Checkouts that went into overflow',
+                           pool('overflow_checkouts'), kind='counter')
+        registry.collected('db_pool_invalidated_total', 'Connections invalidated', pool('invalidated'), kind='counter')
+
+        registry.collected('socketio_connections', 'Sockets open on this process', lambda: connections.local_count)
+        registry.collected('socketio_events_total', 'Socket.IO events handled', lambda: {
+            (name,): stats['events'] for name, stats in event_stats.snapshot().items()}, ['event'], kind='counter')
+        registry.collected('socketio_events_over_budget_total', 'Socket.IO events stopped by their DB budget',
+                           lambda: {(name,): stats['over_budget'] for name, stats in event_stats.snapshot().items()},
+                           ['event'], kind='counter')
+
+        registry.collected('response_cache_requests_total', 'Response cache lookups, by result',
+                           lambda: {(key,): value for key, value in response_cache.stats.items()},
+                           ['result'], kind='counter')
+        registry.collected('response_cache_hit_ratio', 'Share of cache lookups served from the cache',
+                           lambda: _ratio(response_cache.stats))
+
+        registry.collected('background_queue_depth', 'Work waiting in background queues', lambda: {
+            ('presence',): presence.pending,
+            ('typing',): typing.pending,
+            **_job_queues()}, ['queue'])
+
+
+def _ratio(stats):
+    served = stats['hits'] + stats['not_modified']
+    total = served + stats['misses']
+    return served / total if total else 0.0
+
+
+def _job_queues():
+    from app.models import ImportJob, Notification
+    return {
+        ('catalog_import',): ImportJob.query.filter(ImportJob.status.in_(('queued', 'running'))).count(),
+        ('overdue_reminders',): Notification.query.filter(Notification.sent_at.is_(None)).count()
+    }
+
+
+metrics = Metrics()
@@ -1,5 +1,7 @@
 from app.extensions import db
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import validates
 
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin, AnonymousUserMixin
@@ -38,7 +40,6 @@ class User(UserMixin, db.Model):
     
     # Online/Offline Status Tracking
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
-    socket_id = db.Column(db.String(100), nullable=True)  # Track active Socket.IO session
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -52,10 +53,13 @@ class User(UserMixin, db.Model):
     def is_staff(self):
         return self.role in ['admin', 'librarian']
     
-    def is_online(self):
-        """Check if user is online (has active socket or active in last 5 minutes)"""
-        # User is online if they have an active socket connection
-        if self.socket_id:
+    def is_online(self, connected=None):
+        """Check if user is online (has an open socket or was active in the last 5 minutes)"""
+        # Listings pass connections.online_ids() for all their users to avoid a lookup each
+        if connected is None:
+            from app.messages.connections import connections
+            connected = connections.online_ids([self.id])
+        if self.id in connected:
             return True
         # Or if they were active in the last 5 minutes
         if not self.last_seen:
@@ -84,6 +88,11 @@ class User(UserMixin, db.Model):
 
 class Book(db.Model):
     __tablename__ = 'books'
+    __table_args__ = (
+        # Keyset pagination of the catalog's title and price sorts
+        db.Index('idx_book_title', 'title', 'id'),
+        db.Index('idx_book_price', 'price', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(140), nullable=False)
     author = db.Column(db.String(140), nullable=False)
@@ -103,15 +112,77 @@ class Book(db.Model):
     stock_borrowed = db.Column(db.Integer, default=0)
     stock_sold = db.Column(db.Integer, default=0)
 
+    # Trimmed, lower-cased title and author, kept by _update_dedupe_key; catalog imports match duplicates on it
+    dedupe_key = db.Column(db.Text, index=True)
+
     def __repr__(self):
         return f'<Book {self.title}>'
 
+    @staticmethod
+    def make_dedupe_key(title, author):
+        return f"{(title or '').strip().lower()}\n{(author or '').strip().lower()}"
+
+    @validates('title', 'author')
+    def _update_dedupe_key(self, name, value):
+        title = value if name == 'title' else self.title
+        author = value if name == 'author' else self.author
+        self.dedupe_key = Book.make_dedupe_key(title, author)
+        return value
+
     @property
     def sale_price(self):
         if self.discount_percentage and self.discount_percentage > 0:
             return self.price * (1 - self.discount_percentage / 100)
         return self.price
 
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    user = db.relationship('User')
+    filename = db.Column(db.String(255))
+    source = db.Column(db.String(20)) # csv, json, jsonl, openlibrary
+    dry_run = db.Column(db.Boolean, default=False)
+    enrich = db.Column(db.Boolean, default=False) # Fill missing covers from OpenLibrary
+    status = db.Column(db.String(20), default='queued') # queued, running, completed, failed
+
+    # Progress Counters
+    total_rows = db.Column(db.Integer, default=0)
+    processed_rows = db.Column(db.Integer, default=0)
+    created_count = db.Column(db.Integer, default=0)
+    updated_count = db.Column(db.Integer, default=0)
+    error_count = db.Column(db.Integer, default=0)
+    errors = db.Column(db.JSON, nullable=True) # First few validation errors: [{'row': n, 'error': msg}]
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    @property
+    def percent_complete(self):
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, int(self.processed_rows * 100 / self.total_rows))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'dry_run': self.dry_run,
+            'total_rows': self.total_rows,
+            'processed_rows': self.processed_rows,
+            'created': self.created_count,
+            'updated': self.updated_count,
+            'errors': self.error_count,
+            'error_samples': self.errors or [],
+            'percent': self.percent_complete,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.status}>'
+
 class Cart(db.Model):
     __tablename__ = 'carts'
     id = db.Column(db.Integer, primary_key=True)
@@ -130,6 +201,13 @@ class CartItem(db.Model):
 
 class Loan(db.Model):
     __tablename__ = 'loans'
+    __table_args__ = (
+        db.Index('idx_loan_status_due', 'status', 'due_date'),
+    )
+
+    # Statuses for loans where the copy is still out with the borrower
+    OPEN_STATUSES = ('active', 'overdue')
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     user = db.relationship('User', backref='loans')
@@ -140,6 +218,17 @@ class Loan(db.Model):
     return_date = db.Column(db.DateTime, nullable=True)
     status = db.Column(db.String(20), default='active') # active, returned, overdue
 
+    @property
+    def is_open(self):
+        return self.status in self.OPEN_STATUSES
+
+    @property
+    def days_remaining(self):
+        """Days until the due date (negative once overdue, 0 for closed loans)"""
+        if not self.is_open or not self.due_date:
+            return 0
+        return (self.due_date - datetime.utcnow()).days
+
 class Sale(db.Model):
     __tablename__ = 'sales'
     id = db.Column(db.Integer, primary_key=True)
@@ -153,6 +242,24 @@ class Sale(db.Model):
     book = db.relationship('Book', backref='sales')
     
 
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('idx_notification_pending', 'sent_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user = db.relationship('User')
+    loan_id = db.Column(db.Integer, db.ForeignKey('loans.id'), nullable=True)
+    loan = db.relationship('Loan')
+    kind = db.Column(db.String(30), nullable=False) # overdue_reminder
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True) # NULL while queued
+
+    def __repr__(self):
+        return f'<Notification {self.kind} user={self.user_id}>'
+
 class Discount(db.Model):
     __tablename__ = 'discounts'
     id = db.Column(db.Integer, primary_key=True)
@@ -186,19 +293,60 @@ class SupplyOrder(db.Model):
     
     items = db.relationship('SupplyOrderItem', backref='order', lazy='dynamic', cascade="all, delete-orphan")
 
+    @staticmethod
+    def totals_for(order_ids):
+        """Return {order_id: (total_items, total_amount)} from one grouped query."""
+        if not order_ids:
+            return {}
+        # Approximate amount from book retail price (supply price isn't defined)
+        rows = db.session.query(
+            SupplyOrderItem.order_id,
+            db.func.sum(SupplyOrderItem.mass),
+            db.func.sum(SupplyOrderItem.mass * Book.price)
+        ).outerjoin(Book, SupplyOrderItem.book_id == Book.id)\
+         .filter(SupplyOrderItem.order_id.in_(order_ids))\
+         .group_by(SupplyOrderItem.order_id).all()
+        return {order_id: (items or 0, amount or 0) for order_id, items, amount in rows}
+
+    @staticmethod
+    def load_totals(orders):
+        """Batch-load total_items/total_amount for a page of orders."""
+        totals = SupplyOrder.totals_for([order.id for order in orders])
+        for order in orders:
+            order._totals = totals.get(order.id, (0, 0))
+        return orders
+
+    @staticmethod
+    def load_line_items(orders):
+        """Batch-load line_items (with their books) for a page of orders."""
+        by_order = {order.id: [] for order in orders}
+        if by_order:
+            items = SupplyOrderItem.query.options(db.joinedload(SupplyOrderItem.book))\
+                .filter(SupplyOrderItem.order_id.in_(by_order.keys()))\
+                .order_by(SupplyOrderItem.id).all()
+            for item in items:
+                by_order[item.order_id].append(item)
+        for order in orders:
+            order._line_items = by_order[order.id]
+        return orders
+
+    @property
+    def line_items(self):
+        if getattr(self, '_line_items', None) is None:
+            SupplyOrder.load_line_items([self])
+        return self._line_items
+
     @property
     def total_items(self):
-        return self.items.with_entities(db.func.sum(SupplyOrderItem.mass)).scalar() or 0
+        if getattr(self, '_totals', None) is None:
+            SupplyOrder.load_totals([self])
+        return self._totals[0]
 
     @property
     def total_amount(self):
-        # Calculate approximate total amount based on book retail price (since supply price isn't defined)
-        # Using python iteration over items for simplicity as calculation involves join
-        total = 0
-        for item in self.items:
-             if item.book and item.book.price:
-                 total += item.mass * item.book.price
-        return total
+        if getattr(self, '_totals', None) is None:
+            SupplyOrder.load_totals([self])
+        return self._totals[1]
 
 class SupplyOrderItem(db.Model):
     __tablename__ = 'supply_order_items'
@@ -210,6 +358,71 @@ class SupplyOrderItem(db.Model):
     mass = db.Column(db.Integer, default=5) # Ordered Quantity
     payload = db.Column(db.Integer, nullable=True) # Received/Actual Quantity
 
+class StockMovement(db.Model):
+    """Append-only ledger row; a book's counters are the sum of its movements."""
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('idx_stock_movement_book', 'book_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Kept when the book is deleted: book_id goes NULL and book_title keeps the title it had
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='SET NULL'), nullable=True)
+    book = db.relationship('Book', backref=db.backref('stock_movements', lazy='dynamic', passive_deletes=True))
+    book_title = db.Column(db.String(140), nullable=True) # Set when the book is deleted
+    kind = db.Column(db.String(20), nullable=False) # opening, initial, receipt, restock, import, sale, loan, return, adjustment
+
+    # Signed deltas applied to the Book stock counters
+    total_delta = db.Column(db.Integer, default=0)
+    available_delta = db.Column(db.Integer, default=0)
+    borrowed_delta = db.Column(db.Integer, default=0)
+    sold_delta = db.Column(db.Integer, default=0)
+
+    ref_type = db.Column(db.String(20), nullable=True) # supply_order, loan, import_job
+    ref_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StockMovement {self.kind} book={self.book_id}>'
+
+@event.listens_for(Book, 'before_delete')
+def _keep_stock_ledger(mapper, connection, book):
+    """Unlink a deleted book's ledger rows instead of losing them, recording its title."""
+    movements = StockMovement.__table__
+    connection.execute(movements.update().where(movements.c.book_id == book.id)
+                       .values(book_id=None, book_title=book.title))
+
+class StockCheckpoint(db.Model):
+    """Ledger totals per book up to last_movement_id, so reconciliation only reads new movements."""
+    __tablename__ = 'stock_checkpoints'
+    # Only sums of the book's ledger rows, so it goes with the book; the rows themselves stay
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), primary_key=True)
+    book = db.relationship('Book', backref=db.backref('stock_checkpoint', uselist=False,
+                                                      cascade='all, delete-orphan'))
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+    stock_total = db.Column(db.Integer, default=0)
+    stock_available = db.Column(db.Integer, default=0)
+    stock_borrowed = db.Column(db.Integer, default=0)
+    stock_sold = db.Column(db.Integer, default=0)
+    checked_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DemandForecast(db.Model):
+    __tablename__ = 'demand_forecasts'
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), unique=True, nullable=False)
+    book = db.relationship('Book', backref=db.backref('forecast', uselist=False, cascade='all, delete-orphan'))
+
+    daily_demand = db.Column(db.Float, default=0.0) # Smoothed copies per day (sales + loans)
+    demand_std = db.Column(db.Float, default=0.0) # Std deviation of daily demand
+    reorder_point = db.Column(db.Integer, nullable=False) # Reorder when stock_available drops below this
+    order_up_to = db.Column(db.Integer, nullable=False) # Target stock after a restock arrives
+    order_quantity = db.Column(db.Integer, nullable=False) # Suggested order at computation time
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<DemandForecast book={self.book_id} rop={self.reorder_point}>'
+
 class EBook(db.Model):
     __tablename__ = 'ebooks'
     id = db.Column(db.Integer, primary_key=True)
@@ -221,9 +434,74 @@ class EBook(db.Model):
     audio_path = db.Column(db.String(500), nullable=True) # Path to audio file
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Filled in by the PDF processing pipeline
+    processing_status = db.Column(db.String(20), default='pending') # pending, processing, ready, failed
+    page_count = db.Column(db.Integer, nullable=True)
+    toc = db.Column(db.JSON, nullable=True) # [{'title': ..., 'page': 1-based, 'level': 0-based}]
+    chunk_pages = db.Column(db.Integer, nullable=True) # Pages per progressive-loading chunk, None if not split
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    pages = db.relationship('EBookPage', backref='ebook', lazy='dynamic', cascade='all, delete-orphan')
+
+    @property
+    def chunk_count(self):
+        if not self.chunk_pages or not self.page_count:
+            return 0
+        return -(-self.page_count // self.chunk_pages)
+
+    def chunk_for_page(self, page):
+        """0-based chunk index holding a 1-based page, and the page's position inside it."""
+        index = (page - 1) // self.chunk_pages
+        return index, page - index * self.chunk_pages
+
     def __repr__(self):
         return f'<EBook {self.title}>'
 
+class EBookPage(db.Model):
+    """Extracted text of one ebook page."""
+    __tablename__ = 'ebook_pages'
+    id = db.Column(db.Integer, primary_key=True)
+    ebook_id = db.Column(db.Integer, db.ForeignKey('ebooks.id'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False) # 1-based
+    text = db.Column(db.Text)
+
+    __table_args__ = (
+        db.UniqueConstraint('ebook_id', 'page_number', name='uq_ebook_page'),
+    )
+
+    def __repr__(self):
+        return f'<EBookPage {self.ebook_id}:{self.page_number}>'
+
+class UploadSession(db.Model):
+    """A resumable chunked upload of an ebook PDF or audio file."""
+    __tablename__ = 'upload_sessions'
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False) # ebook, audio
+    filename = db.Column(db.String(255), nullable=False) # Final name, relative to the kind's folder
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, default=0) # Bytes written so far (the resume offset)
+    status = db.Column(db.String(20), default='uploading') # uploading, complete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def is_complete(self):
+        return self.status == 'complete'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': self.received,
+            'complete': self.is_complete
+        }
+
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received}/{self.total_size}>'
+
 class Campaign(db.Model):
     __tablename__ = 'campaigns'
     id = db.Column(db.Integer, primary_key=True)
@@ -315,6 +593,25 @@ class Message(db.Model):
         return f'<Message {self.body}>'
 
 
+class MessageEvent(db.Model):
+    """Per-user log of message changes, read by reconnecting clients from their last id."""
+    __tablename__ = 'message_events'
+    __table_args__ = (
+        db.Index('idx_message_event_user', 'user_id', 'id'),
+        {'sqlite_autoincrement': True}, # Ids must never be reused, even after pruning
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # message, edit, delete
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    message = db.relationship('Message')
+
+    def __repr__(self):
+        return f'<MessageEvent {self.id} {self.kind} user={self.user_id}>'
+
+
 class ManagementMember(db.Model):
     __tablename__ = 'management_members'
     id = db.Column(db.Integer, primary_key=True)
@@ -327,3 +624,29 @@ class ManagementMember(db.Model):
         return f'<ManagementMember {self.designation}>'
 
 
+
+
+class CacheVersion(db.Model):
+    """A counter bumped whenever the data behind a group of cached pages changes."""
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True) # e.g. 'catalog'
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+class CatalogFacet(db.Model):
+    """Book counts per author and per category, kept current by FacetService."""
+    __tablename__ = 'catalog_facets'
+    __table_args__ = (
+        db.UniqueConstraint('facet', 'value', name='uq_catalog_facet'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    facet = db.Column(db.String(20), nullable=False) # author, category
+    value = db.Column(db.String(140), nullable=False)
+    book_count = db.Column(db.Integer, nullable=False, default=0)
+    available_count = db.Column(db.Integer, nullable=False, default=0) # Books with stock_available > 0
+
+    def __repr__(self):
+        return f'<CatalogFacet {self.facet}={self.value} ({self.book_count})>'
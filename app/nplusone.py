@@ -0,0 +1,143 @@
+"""
+N+1 query detection for development and tests.
+
+With NPLUSONE_DETECT on (the default under debug and testing), every
+statement a request runs is reduced to a fingerprint, its SQL with
+literals and IN lists collapsed, and counted. A fingerprint seen
+NPLUSONE_THRESHOLD times or more in one request is nearly always a
+relationship lazy-loaded in a loop, and is logged with the template line
+and Python frame that issued it:
+
+    N+1 in main.admin_loans: 20 x SELECT ... FROM books WHERE books.id = ?
+        at admin/loans.html:128
+
+app.testing builds the assert_max_queries pytest fixture on the same log.
+It needs pytest from requirements-dev.txt, so only conftest.py loads it.
+"""
+
+import os
+import re
+import sys
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from app.extensions import db
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(APP_DIR)
+# Our own hooks sit on the stack of every statement; skip them when looking for the caller
+HOOK_FILES = {os.path.join(APP_DIR, name) for name in ('nplusone.py', 'db_monitor.py', 'slow_queries.py', 'testing.py')}
+
+_SPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r'(?:\?|%\(\w+\)s|%s|:\w+|__\[POSTCOMPILE_\w+\])'
+_IN_LIST = re.compile(rf'\bIN \({_PLACEHOLDER}(?:, ?{_PLACEHOLDER})*\)', re.IGNORECASE)
+
+
+class NPlusOneError(AssertionError):
+    """Raised after a request with repeated statements when NPLUSONE_RAISE is set."""
+
+
+def fingerprint(statement):
+    """A statement's shape: whitespace, literals and IN lists normalised."""
+    sql = _SPACE.sub(' ', statement).strip()
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def origin():
+    """
+    Where the current statement came from.
+
+    Returns:
+        str: The innermost project frame ('app/models.py:120 in days_remaining',
+        or a test or script outside app/) and the innermost template line
+        ('admin/loans.html:128'), whichever are on the stack
+    """
+    frame = sys._getframe(1)
+    python_frame = template_line = None
+    while frame is not None and template_line is None:
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            template_line = f'{template.name or "<string>"}:{template.get_corresponding_lineno(frame.f_lineno)}'
+        elif python_frame is None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(PROJECT_DIR) and 'site-packages' not in filename and filename not in HOOK_FILES:
+                python_frame = f'{os.path.relpath(filename, PROJECT_DIR)}:{frame.f_lineno} ' \
+                               f'in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ' via '.join(part for part in (python_frame, template_line) if part) or 'unknown'
+
+
+class QueryLog:
+    """Statement counts per fingerprint, with the origin of the first repeat."""
+
+    def __init__(self):
+        self.total = 0
+        self.entries = {} # fingerprint -> [count, origin]
+
+    def add(self, statement):
+        self.total += 1
+        key = fingerprint(statement)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = [1, None]
+            return
+        entry[0] += 1
+        if entry[1] is None:
+            # The second run is the first sign of a loop; one stack walk per fingerprint
+            entry[1] = origin()
+
+    def repeated(self, threshold):
+        """(count, fingerprint, origin) for fingerprints run at least threshold times, most first."""
+        return sorted(((count, key, where) for key, (count, where) in self.entries.items() if count >= threshold),
+                      reverse=True)
+
+    def describe(self, threshold=2):
+        return '\n'.join(f'  {count} x {key[:200]}' + (f'\n      at {where}' if where else '')
+                         for count, key, where in self.repeated(threshold)) or '  (none)'
+
+
+class NPlusOneDetector:
+    """Per-request QueryLog plus the report at the end of the request."""
+
+    def init_app(self, app):
+        with app.app_context():
+            engine = db.engine
+        if event.contains(engine, 'before_cursor_execute', _log_statement):
+            return
+        event.listen(engine, 'before_cursor_execute', _log_statement)
+        app.before_request(self._start)
+        app.after_request(self._report)
+
+    @staticmethod
+    def enabled():
+        detect = current_app.config.get('NPLUSONE_DETECT')
+        if detect is None:
+            return current_app.debug or current_app.testing
+        return detect
+
+    def _start(self):
+        if self.enabled():
+            g._query_log = QueryLog()
+
+    def _report(self, response):
+        log = g.pop('_query_log', None)
+        if log is None:
+            return response
+        threshold = current_app.config.get('NPLUSONE_THRESHOLD', 5)
+        repeated = log.repeated(threshold)
+        if repeated:
+            current_app.logger.warning('N+1 in %s: %d statement(s), repeated:\n%s', request.endpoint, log.total,
+                                       log.describe(threshold))
+            if current_app.config.get('NPLUSONE_RAISE'):
+                raise NPlusOneError(f'{len(repeated)} repeated statement(s) in {request.endpoint}')
+        return response
+
+
+def _log_statement(conn, cursor, statement, parameters, context, executemany):
+    log = g.get('_query_log') if has_app_context() else None
+    if log is not None:
+        log.add(statement)
+
+
+nplusone = NPlusOneDetector()
@@ -0,0 +1,124 @@
+"""
+Per-request timing: SQL statements, SQL time, template time and total time.
+
+Each request is charged through a DBScope (see app.db_monitor) and
+Flask's template signals. The figures go out in a Server-Timing header,
+which browser dev tools show in the request's Timing tab, and into a
+fixed-size ring of recent samples per endpoint, from which /admin/perf
+reports percentiles.
+
+Streamed responses are timed up to the point the body starts streaming.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from flask import g, request, before_render_template, template_rendered
+from app.db_monitor import begin_scope, current_scope
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list; 0 when empty."""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class RequestStats:
+    """Rolling per-endpoint samples of (total, sql, template) ms and statement counts."""
+
+    def __init__(self):
+        self.size = 500
+        self.server_timing = True
+        self._samples = {} # endpoint -> deque of (total_ms, db_ms, template_ms, queries)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if not app.config.get('PERF_INSTRUMENTATION', True):
+            return
+        self.size = app.config.get('PERF_SAMPLES_PER_ENDPOINT', 500)
+        self.server_timing = app.config.get('PERF_SERVER_TIMING', True)
+        # Registered before the app's own hooks, so the total includes them
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+
+    def _start(self):
+        g._perf_start = time.perf_counter()
+        g._perf_template = [0.0, 0, None] # seconds, nesting depth, start of the outermost render
+        begin_scope()
+
+    def _render_started(self, sender, template, context, **extra):
+        timing = g.get('_perf_template')
+        if timing is None:
+            return
+        if timing[1] == 0:
+            timing[2] = time.perf_counter()
+        timing[1] += 1
+
+    def _render_finished(self, sender, template, context, **extra):
+        timing = g.get('_perf_template')
+        if timing is None or timing[1] == 0:
+            return
+        timing[1] -= 1
+        if timing[1] == 0:
+            timing[0] += time.perf_counter() - timing[2]
+
+    def _finish(self, response):
+        start = g.pop('_perf_start', None)
+        if start is None or request.endpoint in (None, 'static'):
+            return response
+        total_ms = (time.perf_counter() - start) * 1000
+        scope = current_scope()
+        db_ms = scope.seconds * 1000 if scope else 0.0
+        queries = scope.queries if scope else 0
+        template_ms = g._perf_template[0] * 1000
+        if self.server_timing:
+            response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{queries} queries", '
+                                                  f'tpl;dur={template_ms:.1f}, total;dur={total_ms:.1f}')
+        self.record(request.endpoint, total_ms, db_ms, template_ms, queries)
+        return response
+
+    def record(self, endpoint, total_ms, db_ms, template_ms, queries):
+        ring = self._samples.get(endpoint)
+        if ring is None:
+            with self._lock:
+                ring = self._samples.setdefault(endpoint, deque(maxlen=self.size))
+        ring.append((total_ms, db_ms, template_ms, queries))
+
+    def summary(self):
+        """
+        Percentiles over each endpoint's recent samples, slowest p95 first.
+
+        Returns:
+            list: dicts with endpoint, samples, total p50/p95/p99, db and
+            template p95, and average and max statement counts
+        """
+        rows = []
+        for endpoint, ring in list(self._samples.items()):
+            samples = list(ring)
+            if not samples:
+                continue
+            totals = sorted(s[0] for s in samples)
+            queries = [s[3] for s in samples]
+            rows.append({
+                'endpoint': endpoint,
+                'samples': len(samples),
+                'p50': percentile(totals, 50),
+                'p95': percentile(totals, 95),
+                'p99': percentile(totals, 99),
+                'db_p95': percentile(sorted(s[1] for s in samples), 95),
+                'template_p95': percentile(sorted(s[2] for s in samples), 95),
+                'queries_avg': sum(queries) / len(queries),
+                'queries_max': max(queries)
+            })
+        return sorted(rows, key=lambda row: row['p95'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+
+request_stats = RequestStats()
@@ -3,8 +3,22 @@ Services package for business logic layer.
 Separates business logic from route handlers for better testability and reusability.
 """
 
+from app.services.stock_service import StockService
 from app.services.loan_service import LoanService
 from app.services.cart_service import CartService
 from app.services.user_service import UserService
+from app.services.import_service import CatalogImportService
+from app.services.replenishment_service import ReplenishmentService
+from app.services.forecast_service import DemandForecastService
+from app.services.invoice_service import InvoiceService
+from app.services.media_service import MediaService
+from app.services.upload_service import UploadService
+from app.services.ebook_search_service import EBookSearchService
+from app.services.ebook_service import EBookService
+from app.services.facet_service import FacetService
 
-__all__ = ['LoanService', 'CartService', 'UserService']
+__all__ = ['LoanService', 'CartService', 'UserService', 'CatalogImportService',
+           'ReplenishmentService', 'DemandForecastService',
+           'StockService', 'InvoiceService', 'MediaService',
+           'UploadService', 'EBookService', 'EBookSearchService',
+           'FacetService']
@@ -5,6 +5,7 @@ Handles adding items, updating quantities, and cart operations.
 
 from app.models import Cart, CartItem, Book, db
 from flask import abort
+from app.metrics import CART_ITEMS_ADDED, CART_ITEMS_REMOVED
 
 
 class CartService:
@@ -79,6 +80,7 @@ class CartService:
             created = True
         
         db.session.commit()
+        CART_ITEMS_ADDED.labels(action).inc(quantity)
         return cart_item, created
     
     @staticmethod
@@ -138,8 +140,10 @@ class CartService:
         if item.cart.user != user:
             raise PermissionError('Unauthorized access to cart item.')
         
+        quantity = item.quantity
         db.session.delete(item)
         db.session.commit()
+        CART_ITEMS_REMOVED.inc(quantity)
     
     @staticmethod
     def get_cart_items(user):
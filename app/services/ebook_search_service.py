@@ -0,0 +1,353 @@
+"""
+EBook Search Service - Business logic for full-text search inside ebooks.
+Keeps an inverted index with positional postings over every page's text,
+plus each book's title and author, in flat files that are memory-mapped
+on open, so web workers share the OS page cache instead of loading it.
+"""
+
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import defaultdict
+import numpy as np
+from flask import current_app
+from markupsafe import Markup, escape
+from app.models import EBook, EBookPage, db
+
+
+class EBookIndex:
+    """
+    A read-only, memory-mapped index directory.
+
+    Files:
+        terms.bin / term_offsets.npy: sorted terms, UTF-8, back to back
+        term_postings.npy: for term t, its postings are [t, t+1) of the
+            posting arrays
+        posting_docs.npy / posting_positions.npy: doc of each posting and
+            where its positions start (positions.npy)
+        docs.npy: (ebook_id, page_number) per doc; page 0 is title/author
+    """
+
+    def __init__(self, path):
+        self.path = path
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode='r')
+        self.term_offsets = load('term_offsets.npy')
+        self.term_postings = load('term_postings.npy')
+        self.posting_docs = load('posting_docs.npy')
+        self.posting_positions = load('posting_positions.npy')
+        self.positions = load('positions.npy')
+        self.docs = load('docs.npy')
+        with open(os.path.join(path, 'terms.bin'), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self.terms = np.memmap(f, dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+        self.term_count = len(self.term_offsets) - 1
+
+    def _term(self, i):
+        return bytes(self.terms[self.term_offsets[i]:self.term_offsets[i + 1]])
+
+    def lookup(self, term):
+        """Binary search the term list; returns the term's index or None."""
+        key = term.encode('utf-8')
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.term_count and self._term(lo) == key:
+            return lo
+        return None
+
+    def postings(self, term_id):
+        """Doc ids (sorted) and, per doc, the slice of positions where the term occurs."""
+        start, end = self.term_postings[term_id], self.term_postings[term_id + 1]
+        docs = np.asarray(self.posting_docs[start:end])
+        bounds = np.asarray(self.posting_positions[start:end + 1])
+        return docs, bounds
+
+    @property
+    def doc_count(self):
+        return len(self.docs)
+
+
+class EBookSearchService:
+    """Service class for the ebook content index."""
+
+    TOKEN_RE = re.compile(r'[\w\u0980-\u09FF]+') # Word characters, plus Bengali vowel signs
+    SNIPPET_CHARS = 90
+    RESULTS_PER_PAGE = 20
+    MAX_QUERY_TERMS = 10
+
+    _index = None
+    _index_key = None
+    _open_lock = threading.Lock()
+    _build_lock = threading.Lock()
+
+    @staticmethod
+    def index_root():
+        root = current_app.config.get('EBOOK_INDEX_FOLDER') or \
+            os.path.join(current_app.instance_path, 'ebook_index')
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    @staticmethod
+    def tokenize(text):
+        return EBookSearchService.TOKEN_RE.findall((text or '').lower())
+
+    @staticmethod
+    def build():
+        """
+        Rebuild the whole index from ebook_pages and ebook titles.
+
+        The new index is written to a staging folder, renamed to
+        index-<start time> and then published by replacing the CURRENT
+        pointer file, so searches never see a partial index. A build that
+        finishes after a newer one has been published is discarded. Only
+        builds older than the one CURRENT named before are removed, so a
+        build running in another process is never deleted from under it;
+        workers that still have an old index mapped keep reading until they
+        notice the new pointer.
+
+        Returns:
+            dict: docs and terms in the new index
+        """
+        cls = EBookSearchService
+        with cls._build_lock:
+            # Taken before reading, so names order builds by the data they saw
+            stamp = time.time_ns()
+            docs = []
+            postings = defaultdict(dict) # term -> {doc: [positions]}
+
+            def add(doc_id, text):
+                for position, token in enumerate(cls.tokenize(text)):
+                    postings[token].setdefault(doc_id, []).append(position)
+
+            for ebook_id, title, author in db.session.query(EBook.id, EBook.title, EBook.author).order_by(EBook.id):
+                add(len(docs), f'{title} {author}')
+                docs.append((ebook_id, 0))
+
+            pages = db.session.query(EBookPage.ebook_id, EBookPage.page_number, EBookPage.text)\
+                .order_by(EBookPage.ebook_id, EBookPage.page_number).yield_per(500)
+            for ebook_id, page_number, text in pages:
+                add(len(docs), text)
+                docs.append((ebook_id, page_number))
+
+            terms = sorted(postings)
+            encoded = [term.encode('utf-8') for term in terms]
+            term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+            term_offsets[1:] = np.cumsum([len(e) for e in encoded], dtype=np.uint64)
+
+            term_postings = np.zeros(len(terms) + 1, dtype=np.uint64)
+            posting_docs, posting_positions, positions = [], [0], []
+            for i, term in enumerate(terms):
+                # Doc ids were assigned in order, so each term's docs are already sorted
+                for doc_id, doc_positions in postings[term].items():
+                    posting_docs.append(doc_id)
+                    positions.extend(doc_positions)
+                    posting_positions.append(len(positions))
+                term_postings[i + 1] = len(posting_docs)
+
+            root = cls.index_root()
+            staging = tempfile.mkdtemp(prefix='.building-', dir=root)
+            try:
+                with open(os.path.join(staging, 'terms.bin'), 'wb') as f:
+                    f.write(b''.join(encoded))
+                np.save(os.path.join(staging, 'term_offsets.npy'), term_offsets)
+                np.save(os.path.join(staging, 'term_postings.npy'), term_postings)
+                np.save(os.path.join(staging, 'posting_docs.npy'), np.array(posting_docs, dtype=np.uint32))
+                np.save(os.path.join(staging, 'posting_positions.npy'), np.array(posting_positions, dtype=np.uint64))
+                np.save(os.path.join(staging, 'positions.npy'), np.array(positions, dtype=np.uint32))
+                np.save(os.path.join(staging, 'docs.npy'), np.array(docs, dtype=np.int32).reshape(-1, 2))
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+            name = f'index-{stamp}'
+            path = os.path.join(root, name)
+            previous = cls._current_name(root)
+            if previous and cls._build_stamp(previous) > stamp:
+                # Another process published a build that read the data after we did
+                shutil.rmtree(staging, ignore_errors=True)
+                return {'docs': len(docs), 'terms': len(terms)}
+            os.replace(staging, path)
+
+            pointer = os.path.join(root, 'CURRENT')
+            with open(f'{pointer}.{stamp}.tmp', 'w') as f:
+                f.write(name)
+            os.replace(f'{pointer}.{stamp}.tmp', pointer)
+
+            if previous:
+                cutoff = cls._build_stamp(previous)
+                for stale in os.listdir(root):
+                    if stale.startswith('index-') and cls._build_stamp(stale) < cutoff:
+                        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+
+            return {'docs': len(docs), 'terms': len(terms)}
+
+    @staticmethod
+    def _current_name(root):
+        """Folder name the CURRENT pointer names, or None before the first build."""
+        try:
+            with open(os.path.join(root, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _build_stamp(name):
+        """Start time of the build in an index-<ns> folder (-1 if not one)."""
+        try:
+            return int(name[len('index-'):])
+        except ValueError:
+            return -1
+
+    @staticmethod
+    def build_async():
+        """Rebuild the index in a background thread, e.g. after an ebook changes."""
+        app = current_app._get_current_object()
+
+        def worker():
+            with app.app_context():
+                try:
+                    EBookSearchService.build()
+                except Exception:
+                    app.logger.exception('Rebuilding the ebook search index failed')
+
+        threading.Thread(target=worker, name='ebook-index', daemon=True).start()
+
+    @staticmethod
+    def get_index():
+        """The current index, reopened when another process has published a new one."""
+        cls = EBookSearchService
+        name = cls._current_name(cls.index_root())
+        if name is None:
+            return None
+        with cls._open_lock:
+            if cls._index_key != name:
+                try:
+                    cls._index = EBookIndex(os.path.join(cls.index_root(), name))
+                except FileNotFoundError:
+                    # Replaced again while we were opening it; keep the old one
+                    return cls._index
+                cls._index_key = name
+            return cls._index
+
+    @staticmethod
+    def _phrase_docs(index, term_ids):
+        """Docs where the terms appear consecutively, with the first term's match count."""
+        first_docs, first_bounds = index.postings(term_ids[0])
+        candidates = dict.fromkeys(first_docs.tolist())
+        postings = []
+        for term_id in term_ids:
+            docs, bounds = index.postings(term_id)
+            postings.append({int(d): (int(bounds[i]), int(bounds[i + 1])) for i, d in enumerate(docs)})
+            candidates = {d: None for d in candidates if d in postings[-1]}
+
+        matches = {}
+        for doc in candidates:
+            starts = None
+            for offset, term_postings in enumerate(postings):
+                lo, hi = term_postings[doc]
+                found = set((np.asarray(index.positions[lo:hi]) - offset).tolist())
+                starts = found if starts is None else starts & found
+                if not starts:
+                    break
+            if starts:
+                matches[doc] = len(starts)
+        return matches
+
+    @staticmethod
+    def search(query, page=1):
+        """
+        Search ebook text and titles.
+
+        All words must appear on a page; a query in double quotes must
+        appear as a phrase. Pages are ranked by tf-idf, and book title or
+        author matches come first.
+
+        Args:
+            query: Search string
+            page: 1-based results page
+
+        Returns:
+            dict: 'hits' (list of dicts with ebook, page, snippet), 'total'
+            and 'page'
+        """
+        cls = EBookSearchService
+        result = {'hits': [], 'total': 0, 'page': page}
+        index = cls.get_index()
+        phrase = query.strip().startswith('"') and query.strip().endswith('"')
+        tokens = list(dict.fromkeys(cls.tokenize(query)))[:cls.MAX_QUERY_TERMS] if not phrase \
+            else cls.tokenize(query)[:cls.MAX_QUERY_TERMS]
+        if not index or not tokens:
+            return result
+
+        term_ids = [index.lookup(token) for token in tokens]
+        if any(term_id is None for term_id in term_ids):
+            return result
+
+        n = index.doc_count
+        if phrase and len(term_ids) > 1:
+            matches = cls._phrase_docs(index, term_ids)
+            df = len(matches)
+            scores = {doc: count * math.log(1 + n / df) for doc, count in matches.items()}
+        else:
+            scores = None
+            for term_id in term_ids:
+                docs, bounds = index.postings(term_id)
+                tf = np.diff(bounds)
+                weight = math.log(1 + n / len(docs))
+                term_scores = dict(zip(docs.tolist(), (tf * weight).tolist()))
+                scores = term_scores if scores is None else \
+                    {doc: score + term_scores[doc] for doc, score in scores.items() if doc in term_scores}
+
+        # Title/author docs (page 0) rank above page hits
+        ranked = sorted(scores, key=lambda doc: (index.docs[doc][1] != 0, -scores[doc], doc))
+        result['total'] = len(ranked)
+        start = (page - 1) * cls.RESULTS_PER_PAGE
+        selected = [(int(index.docs[doc][0]), int(index.docs[doc][1]))
+                    for doc in ranked[start:start + cls.RESULTS_PER_PAGE]]
+        if not selected:
+            return result
+
+        ebooks = {e.id: e for e in EBook.query.filter(EBook.id.in_({e for e, _ in selected}))}
+        texts = {}
+        page_keys = [(e, p) for e, p in selected if p]
+        if page_keys:
+            rows = db.session.query(EBookPage.ebook_id, EBookPage.page_number, EBookPage.text).filter(
+                db.tuple_(EBookPage.ebook_id, EBookPage.page_number).in_(page_keys)
+            )
+            texts = {(e, p): text for e, p, text in rows}
+
+        for ebook_id, page_number in selected:
+            ebook = ebooks.get(ebook_id)
+            if not ebook:
+                continue # Deleted since the last build
+            text = texts.get((ebook_id, page_number)) if page_number else ebook.description
+            result['hits'].append({
+                'ebook': ebook,
+                'page': page_number or None,
+                'snippet': cls.snippet(text, tokens)
+            })
+        return result
+
+    @staticmethod
+    def snippet(text, tokens):
+        """A short excerpt around the first match, with matched words in <mark>."""
+        text = text or ''
+        pattern = re.compile(r'(?<![\w\u0980-\u09FF])(' + '|'.join(re.escape(t) for t in tokens) +
+                             r')(?![\w\u0980-\u09FF])', re.IGNORECASE)
+        match = pattern.search(text)
+        width = EBookSearchService.SNIPPET_CHARS
+        start = max(0, match.start() - width // 2) if match else 0
+        excerpt = text[start:start + width]
+        highlighted = pattern.sub(lambda m: f'\x00{m.group(0)}\x01', excerpt)
+        html = str(escape(highlighted)).replace('\x00', '<mark>').replace('\x01', '</mark>')
+        prefix = '&hellip;' if start > 0 else ''
+        suffix = '&hellip;' if start + width < len(text) else ''
+        return Markup(prefix + html + suffix)
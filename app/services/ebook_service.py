@@ -0,0 +1,231 @@
+"""
+EBook Service - Business logic for processing uploaded PDF ebooks.
+After upload, each PDF is read once in a worker process: page text goes to
+ebook_pages for search, the file is split into small chunks the reader can
+load progressively, and the page count and outline are stored on EBook.
+"""
+
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, delete
+from pypdf import PdfReader, PdfWriter
+from app.models import EBook, EBookPage, db
+from app.services.ebook_search_service import EBookSearchService
+
+
+class EBookService:
+    """Service class for the ebook processing pipeline."""
+
+    MAX_TOC_ENTRIES = 500
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def chunk_folder(ebook_id):
+        root = current_app.config.get('EBOOK_CHUNK_FOLDER') or \
+            os.path.join(current_app.instance_path, 'ebook_chunks')
+        return os.path.join(root, str(ebook_id))
+
+    @staticmethod
+    def chunk_path(ebook_id, index):
+        return os.path.join(EBookService.chunk_folder(ebook_id), f'{index}.pdf')
+
+    @staticmethod
+    def _pool():
+        with EBookService._executor_lock:
+            if EBookService._executor is None:
+                # Forking a threaded web server can deadlock, so workers come
+                # from a forkserver (spawn where that isn't available)
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                else:
+                    context = multiprocessing.get_context('spawn')
+                EBookService._executor = ProcessPoolExecutor(
+                    max_workers=current_app.config.get('EBOOK_PROCESS_WORKERS', 1),
+                    mp_context=context
+                )
+            return EBookService._executor
+
+    @staticmethod
+    def extract(pdf_path, chunk_dir, chunk_pages):
+        """
+        Read a PDF and write its progressive-loading chunks.
+
+        Runs in a worker process, so it touches only files: no app, no
+        database. Chunks are written under a temporary folder and swapped in
+        whole.
+
+        Args:
+            pdf_path: Path of the uploaded PDF
+            chunk_dir: Folder to hold 0.pdf, 1.pdf, ...
+            chunk_pages: Pages per chunk
+
+        Returns:
+            dict: page_count, toc and texts (one string per page)
+        """
+        reader = PdfReader(pdf_path)
+        page_count = len(reader.pages)
+
+        texts = []
+        for page in reader.pages:
+            try:
+                text = page.extract_text() or ''
+            except Exception:
+                # One unreadable page shouldn't fail the whole book
+                text = ''
+            texts.append(re.sub(r'\s+', ' ', text).strip())
+
+        toc = []
+
+        def walk(items, level):
+            for item in items:
+                if len(toc) >= EBookService.MAX_TOC_ENTRIES:
+                    return
+                if isinstance(item, list):
+                    walk(item, level + 1)
+                    continue
+                try:
+                    page = reader.get_destination_page_number(item)
+                except Exception:
+                    continue
+                if page is not None and page >= 0:
+                    toc.append({'title': str(item.title or '').strip(), 'page': page + 1, 'level': level})
+
+        try:
+            walk(reader.outline, 0)
+        except Exception:
+            toc = []
+
+        # A staging folder of our own: two jobs reprocessing the same book
+        # must not write into, or delete, each other's chunks
+        parent = os.path.dirname(chunk_dir)
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f'.{os.path.basename(chunk_dir)}-', dir=parent)
+        try:
+            for index, start in enumerate(range(0, page_count, chunk_pages)):
+                writer = PdfWriter()
+                for number in range(start, min(start + chunk_pages, page_count)):
+                    writer.add_page(reader.pages[number])
+                with open(os.path.join(tmp_dir, f'{index}.pdf'), 'wb') as f:
+                    writer.write(f)
+            EBookService._swap_in(tmp_dir, chunk_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return {'page_count': page_count, 'toc': toc, 'texts': texts}
+
+    @staticmethod
+    def _swap_in(staging, target):
+        """
+        Move a finished folder to target, replacing whatever is there.
+
+        os.replace only renames a folder over a missing or empty one, so the
+        current target is first renamed onto an empty folder of our own and
+        deleted from there. Readers see the old chunks or the new ones,
+        never a mix, and a concurrent job's folders are never touched.
+        """
+        parent = os.path.dirname(target)
+        for _ in range(5):
+            try:
+                os.replace(staging, target)
+                return
+            except OSError:
+                if not os.path.isdir(target):
+                    raise
+            retired = tempfile.mkdtemp(prefix=f'.{os.path.basename(target)}-old-', dir=parent)
+            try:
+                os.replace(target, retired)
+            except FileNotFoundError:
+                # Another job retired it first; try again
+                pass
+            shutil.rmtree(retired, ignore_errors=True)
+        os.replace(staging, target)
+
+    @staticmethod
+    def save_result(ebook, result, chunk_pages):
+        """Replace an ebook's pages and metadata with a processing result."""
+        db.session.execute(delete(EBookPage).where(EBookPage.ebook_id == ebook.id))
+        if result['texts']:
+            db.session.execute(insert(EBookPage), [
+                {'ebook_id': ebook.id, 'page_number': number, 'text': text}
+                for number, text in enumerate(result['texts'], start=1)
+            ])
+        ebook.page_count = result['page_count']
+        ebook.toc = result['toc']
+        ebook.chunk_pages = chunk_pages
+        ebook.processing_status = 'ready'
+        ebook.processed_at = datetime.utcnow()
+        db.session.commit()
+
+    @staticmethod
+    def process(ebook_id, reindex=True):
+        """
+        Process one ebook now, in a worker process, and store the result.
+
+        Args:
+            ebook_id: ID of the EBook
+            reindex: Rebuild the search index afterwards (batch callers
+                rebuild once at the end instead)
+
+        Returns:
+            bool: True if the ebook was processed
+        """
+        ebook = db.session.get(EBook, ebook_id)
+        if not ebook or not ebook.file_path:
+            return False
+
+        pdf_path = os.path.join(current_app.root_path, 'static', 'ebooks', ebook.file_path)
+        chunk_pages = current_app.config.get('EBOOK_CHUNK_PAGES', 10)
+        ebook.processing_status = 'processing'
+        db.session.commit()
+
+        future = EBookService._pool().submit(
+            EBookService.extract, pdf_path, EBookService.chunk_folder(ebook_id), chunk_pages
+        )
+        try:
+            result = future.result()
+        except Exception:
+            current_app.logger.exception(f'Processing ebook {ebook_id} failed')
+            ebook.processing_status = 'failed'
+            db.session.commit()
+            return False
+
+        EBookService.save_result(ebook, result, chunk_pages)
+        if reindex:
+            EBookSearchService.build()
+        return True
+
+    @staticmethod
+    def process_async(ebook_id):
+        """
+        Process an ebook in the background after upload or file replacement.
+
+        A thread waits on the process pool and stores the result, so the
+        request returns immediately and the web worker never parses the PDF.
+
+        Args:
+            ebook_id: ID of the EBook
+        """
+        app = current_app._get_current_object()
+
+        def worker():
+            with app.app_context():
+                try:
+                    EBookService.process(ebook_id)
+                except Exception:
+                    app.logger.exception(f'Processing ebook {ebook_id} failed')
+
+        threading.Thread(target=worker, name=f'ebook-{ebook_id}', daemon=True).start()
+
+    @staticmethod
+    def remove_artifacts(ebook_id):
+        """Delete an ebook's chunk files."""
+        shutil.rmtree(EBookService.chunk_folder(ebook_id), ignore_errors=True)
@@ -0,0 +1,204 @@
+"""
+Facet Service - Business logic for the catalog's author and category facets.
+Book counts per author and category, and how many of those books are in
+stock, live in the catalog_facets summary table. Session hooks apply the
+change of every flushed Book as a delta in the same transaction, so the
+catalog never has to group the books table on a page view.
+"""
+
+from collections import Counter
+from sqlalchemy import event, inspect, select, insert, update, delete, func, case, literal
+from app.models import Book, CatalogFacet, db
+
+
+class FacetService:
+    """Service class for precomputed catalog facet counts."""
+
+    FACETS = ('author', 'category')
+    AUTHOR_LIMIT = 50 # Authors listed in the catalog, most books first
+    _WATCHED = ('author', 'category', 'stock_available')
+
+    @staticmethod
+    def init_app(app):
+        """Keep catalog_facets in step with every session that writes books."""
+        if not event.contains(db.session, 'after_flush', _apply_flush):
+            event.listen(db.session, 'after_flush', _apply_flush)
+            event.listen(db.session, 'do_orm_execute', _track_execute)
+            event.listen(db.session, 'before_commit', _rebuild_before_commit)
+            event.listen(db.session, 'after_rollback', _forget_after_rollback)
+
+    @staticmethod
+    def rebuild(connection=None):
+        """
+        Recount every facet from the books table.
+
+        Used after bulk statements that bypass the ORM, and by
+        `flask catalog facets` to repair drift.
+
+        Args:
+            connection: Connection to run on (defaults to the session's,
+                inside its transaction)
+
+        Returns:
+            int: Number of facet rows written
+        """
+        conn = connection or db.session.connection()
+        table = CatalogFacet.__table__
+        conn.execute(delete(table))
+        written = 0
+        for facet in FacetService.FACETS:
+            column = getattr(Book, facet)
+            result = conn.execute(insert(table).from_select(
+                ['facet', 'value', 'book_count', 'available_count'],
+                select(
+                    literal(facet), column, func.count(Book.id),
+                    func.sum(case((Book.stock_available > 0, 1), else_=0))
+                ).where(column.isnot(None)).group_by(column)
+            ))
+            written += result.rowcount
+        return written
+
+    @staticmethod
+    def apply_deltas(connection, deltas):
+        """
+        Add per-facet count changes, creating rows for new values.
+
+        Args:
+            connection: Connection inside the writing transaction
+            deltas: Counter of (facet, value, field) -> change
+        """
+        table = CatalogFacet.__table__
+        changes = {}
+        for (facet, value, field), change in deltas.items():
+            if change:
+                changes.setdefault((facet, value), {})[field] = change
+
+        for (facet, value), fields in changes.items():
+            result = connection.execute(
+                update(table).where(table.c.facet == facet, table.c.value == value)
+                .values({field: table.c[field] + change for field, change in fields.items()})
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(
+                    facet=facet, value=value,
+                    book_count=fields.get('book_count', 0),
+                    available_count=fields.get('available_count', 0)
+                ))
+
+    @staticmethod
+    def facets(selected_authors=()):
+        """
+        Facet counts for the catalog filters.
+
+        Args:
+            selected_authors: Authors to list even if they fall outside the
+                top AUTHOR_LIMIT
+
+        Returns:
+            dict: 'category' and 'author' lists of dicts with value,
+            book_count and available_count
+        """
+        def rows(query):
+            return [{'value': f.value, 'book_count': f.book_count, 'available_count': f.available_count}
+                    for f in query]
+
+        base = CatalogFacet.query.filter(CatalogFacet.book_count > 0)
+        categories = rows(base.filter(CatalogFacet.facet == 'category').order_by(CatalogFacet.value))
+
+        top = base.filter(CatalogFacet.facet == 'author')\
+            .order_by(CatalogFacet.book_count.desc(), CatalogFacet.value)\
+            .limit(FacetService.AUTHOR_LIMIT).all()
+        listed = {f.value for f in top}
+        missing = [a for a in selected_authors if a not in listed]
+        if missing:
+            top += base.filter(CatalogFacet.facet == 'author', CatalogFacet.value.in_(missing)).all()
+        authors = sorted(rows(top), key=lambda f: f['value'].lower())
+
+        return {'category': categories, 'author': authors}
+
+
+def _book_values(state):
+    """(author, category, in stock) of a loaded Book, or None if any is unloaded."""
+    values = state.dict
+    if any(name not in values for name in FacetService._WATCHED):
+        return None
+    return values['author'], values['category'], (values['stock_available'] or 0) > 0
+
+
+def _count(deltas, values, sign):
+    author, category, available = values
+    for facet, value in (('author', author), ('category', category)):
+        if value is None:
+            continue
+        deltas[(facet, value, 'book_count')] += sign
+        if available:
+            deltas[(facet, value, 'available_count')] += sign
+
+
+def _apply_flush(sess, flush_context):
+    deltas = Counter()
+    unknown = False
+    for obj in sess.new:
+        if isinstance(obj, Book):
+            values = _book_values(inspect(obj))
+            if values is None:
+                unknown = True
+            else:
+                _count(deltas, values, 1)
+
+    for obj in sess.deleted:
+        if isinstance(obj, Book):
+            values = _book_values(inspect(obj))
+            if values is None:
+                unknown = True
+            else:
+                _count(deltas, values, -1)
+
+    for obj in sess.dirty:
+        if not isinstance(obj, Book):
+            continue
+        state = inspect(obj)
+        old, new, changed, complete = [], [], False, True
+        for name in FacetService._WATCHED:
+            history = state.attrs[name].history
+            if history.added:
+                changed = True
+                new.append(history.added[0])
+                # Empty if the attribute was assigned without being loaded first
+                old.append(history.deleted[0] if history.deleted else None)
+                complete = complete and bool(history.deleted)
+            elif history.unchanged:
+                old.append(history.unchanged[0])
+                new.append(history.unchanged[0])
+            else:
+                old.append(None)
+                new.append(None)
+                complete = False
+        if changed and not complete:
+            unknown = True
+        elif changed:
+            _count(deltas, (old[0], old[1], (old[2] or 0) > 0), -1)
+            _count(deltas, (new[0], new[1], (new[2] or 0) > 0), 1)
+
+    if unknown:
+        FacetService.rebuild(sess.connection())
+        sess.info.pop('facets_stale', None)
+    elif deltas:
+        FacetService.apply_deltas(sess.connection(), deltas)
+
+
+def _track_execute(state):
+    # Bulk INSERT/UPDATE/DELETE on books bypass the flush; recount at commit
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, 'table', None)
+        if getattr(table, 'name', None) == Book.__tablename__:
+            state.session.info['facets_stale'] = True
+
+
+def _rebuild_before_commit(sess):
+    if sess.info.pop('facets_stale', False):
+        FacetService.rebuild(sess.connection())
+
+
+def _forget_after_rollback(sess):
+    sess.info.pop('facets_stale', None)
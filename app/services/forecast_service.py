@@ -0,0 +1,150 @@
+"""
+Demand Forecast Service - Business logic for reorder planning.
+Turns sales and loan history into per-book reorder points and order
+quantities for the replenishment shortlist.
+"""
+
+import math
+from datetime import datetime, date, timedelta
+import numpy as np
+from sqlalchemy import func, insert, delete
+from app.models import Book, Sale, Loan, DemandForecast, db
+
+
+class DemandForecastService:
+    """Service class for per-book demand forecasting."""
+
+    HISTORY_DAYS = 180
+    SMOOTHING_ALPHA = 0.1
+    LEAD_TIME_DAYS = 7 # Supplier delivery time
+    REVIEW_PERIOD_DAYS = 14 # Stock bought per order should last this long after arrival
+    SERVICE_LEVEL_Z = 1.65 # ~95% chance of not running out during lead time
+    MIN_REORDER_POINT = 1 # Out-of-stock books are always reordered
+    MIN_ORDER_QUANTITY = 1
+    BOOK_CHUNK_SIZE = 2000
+
+    @staticmethod
+    def _smoothing_weights(days, alpha):
+        """
+        Weights that give simple exponential smoothing as one dot product.
+
+        The level after the final day is sum(w[t] * x[t]) plus the initial
+        level times (1 - alpha) ** days. Starting from zero, that second term
+        is dropped, so a whole chunk of books is smoothed with one matmul.
+        """
+        ages = np.arange(days - 1, -1, -1)
+        return alpha * (1 - alpha) ** ages
+
+    @staticmethod
+    def _daily_counts(column, book_column, start, first_id, last_id, index, days):
+        """Accumulate per-book, per-day counts of one event table into a matrix."""
+        day = func.date(column)
+        rows = db.session.query(book_column, day, func.count()).filter(
+            column >= start,
+            book_column.between(first_id, last_id)
+        ).group_by(book_column, day).all()
+
+        matrix = np.zeros((len(index), days), dtype=np.float32)
+        if not rows:
+            return matrix
+
+        book_idx = np.fromiter((index[book_id] for book_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        # SQLite returns dates as strings, PostgreSQL as date objects
+        day_idx = np.fromiter(
+            ((date.fromisoformat(str(d)[:10]) - start.date()).days for _, d, _ in rows),
+            dtype=np.int64, count=len(rows)
+        )
+        counts = np.fromiter((c for _, _, c in rows), dtype=np.float32, count=len(rows))
+
+        valid = (day_idx >= 0) & (day_idx < days)
+        np.add.at(matrix, (book_idx[valid], day_idx[valid]), counts[valid])
+        return matrix
+
+    @staticmethod
+    def forecast_chunk(demand, stock):
+        """
+        Compute reorder parameters for a chunk of books.
+
+        Args:
+            demand: (books, days) array of daily demand
+            stock: (books,) array of current stock_available
+
+        Returns:
+            dict: Arrays keyed by daily_demand, demand_std, reorder_point,
+            order_up_to and order_quantity
+        """
+        cls = DemandForecastService
+        days = demand.shape[1]
+
+        weights = cls._smoothing_weights(days, cls.SMOOTHING_ALPHA)
+        level = demand @ weights
+        std = demand.std(axis=1)
+
+        lead = cls.LEAD_TIME_DAYS
+        cover = cls.LEAD_TIME_DAYS + cls.REVIEW_PERIOD_DAYS
+        z = cls.SERVICE_LEVEL_Z
+
+        reorder_point = np.ceil(level * lead + z * std * math.sqrt(lead))
+        reorder_point = np.maximum(reorder_point, cls.MIN_REORDER_POINT)
+
+        order_up_to = np.ceil(level * cover + z * std * math.sqrt(cover))
+        order_up_to = np.maximum(order_up_to, reorder_point + cls.MIN_ORDER_QUANTITY - 1)
+
+        order_quantity = np.maximum(order_up_to - stock, cls.MIN_ORDER_QUANTITY)
+
+        return {
+            'daily_demand': level,
+            'demand_std': std,
+            'reorder_point': reorder_point.astype(np.int64),
+            'order_up_to': order_up_to.astype(np.int64),
+            'order_quantity': order_quantity.astype(np.int64)
+        }
+
+    @staticmethod
+    def run_forecast(now=None):
+        """
+        Recompute the forecast table for every book.
+
+        Demand is bucketed per day from sales and loan checkouts over the last
+        HISTORY_DAYS, a chunk of books at a time, and the table is replaced in
+        a single transaction.
+
+        Args:
+            now: Reference time (defaults to utcnow)
+
+        Returns:
+            int: Number of books forecast
+        """
+        cls = DemandForecastService
+        now = now or datetime.utcnow()
+        days = cls.HISTORY_DAYS
+        start = datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time())
+
+        books = db.session.query(Book.id, Book.stock_available).order_by(Book.id).all()
+        rows = []
+        for offset in range(0, len(books), cls.BOOK_CHUNK_SIZE):
+            chunk = books[offset:offset + cls.BOOK_CHUNK_SIZE]
+            ids = [book_id for book_id, _ in chunk]
+            index = {book_id: i for i, book_id in enumerate(ids)}
+            stock = np.array([available or 0 for _, available in chunk], dtype=np.float64)
+
+            demand = cls._daily_counts(Sale.sale_date, Sale.book_id, start, ids[0], ids[-1], index, days)
+            demand += cls._daily_counts(Loan.checkout_date, Loan.book_id, start, ids[0], ids[-1], index, days)
+
+            result = cls.forecast_chunk(demand.astype(np.float64), stock)
+            for i, book_id in enumerate(ids):
+                rows.append({
+                    'book_id': book_id,
+                    'daily_demand': round(float(result['daily_demand'][i]), 4),
+                    'demand_std': round(float(result['demand_std'][i]), 4),
+                    'reorder_point': int(result['reorder_point'][i]),
+                    'order_up_to': int(result['order_up_to'][i]),
+                    'order_quantity': int(result['order_quantity'][i]),
+                    'computed_at': now
+                })
+
+        db.session.execute(delete(DemandForecast))
+        if rows:
+            db.session.execute(insert(DemandForecast), rows)
+        db.session.commit()
+        return len(rows)
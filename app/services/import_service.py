@@ -0,0 +1,435 @@
+"""
+Catalog Import Service - Business logic for bulk book imports.
+Validates CSV/JSON uploads in a streaming pass, deduplicates against the
+existing catalog and upserts books in batches.
+"""
+
+import csv
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, insert, update, bindparam
+from app.models import Book, ImportJob, db
+from app.services.stock_service import StockService
+
+
+JSON_READ_SIZE = 64 * 1024
+
+
+class CatalogImportService:
+    """Service class for bulk catalog imports."""
+
+    BATCH_SIZE = 500
+    ENRICH_WORKERS = 4
+    MAX_STORED_ERRORS = 50
+    SUPPORTED_FORMATS = ('csv', 'json', 'jsonl')
+    ITEM_TYPES = ('circulation', 'sale', 'hybrid')
+    # Column lengths from the Book model
+    FIELD_LIMITS = {'title': 140, 'author': 140, 'category': 50, 'location': 100, 'image_url': 500}
+
+    @staticmethod
+    def start_upload_import(user_id, file, dry_run=False, enrich=False):
+        """
+        Save an uploaded CSV/JSON file and import it in a background thread.
+
+        Args:
+            user_id: ID of the staff member running the import
+            file: Uploaded FileStorage
+            dry_run: Validate and count only, without writing books
+            enrich: Fill missing covers from OpenLibrary
+
+        Returns:
+            ImportJob: The queued job
+
+        Raises:
+            ValueError: If the file type is not supported
+        """
+        fmt = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+        if fmt not in CatalogImportService.SUPPORTED_FORMATS:
+            raise ValueError('Unsupported file type. Upload a .csv, .json or .jsonl file.')
+
+        path = CatalogImportService._spool_path(fmt)
+        file.save(path)
+
+        job = ImportJob(user_id=user_id, filename=file.filename, source=fmt,
+                        dry_run=dry_run, enrich=enrich)
+        db.session.add(job)
+        db.session.commit()
+
+        CatalogImportService._launch(job.id, path)
+        return job
+
+    @staticmethod
+    def start_record_import(user_id, records, enrich=False):
+        """
+        Import a list of book dicts (e.g. selected OpenLibrary search results).
+
+        Args:
+            user_id: ID of the staff member running the import
+            records: List of dicts with at least 'title' and 'author'
+            enrich: Fill missing covers from OpenLibrary
+
+        Returns:
+            ImportJob: The queued job
+        """
+        path = CatalogImportService._spool_path('jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        job = ImportJob(user_id=user_id, filename='OpenLibrary selection', source='openlibrary',
+                        enrich=enrich)
+        db.session.add(job)
+        db.session.commit()
+
+        CatalogImportService._launch(job.id, path)
+        return job
+
+    @staticmethod
+    def import_file(path, dry_run=False, enrich=False):
+        """
+        Import a file from disk synchronously (used by the CLI).
+
+        Args:
+            path: Path of a CSV/JSON/JSONL file; it is copied, not consumed
+            dry_run: Validate and count only, without writing books
+            enrich: Fill missing covers from OpenLibrary
+
+        Returns:
+            ImportJob: The finished job
+
+        Raises:
+            ValueError: If the file type is not supported
+        """
+        fmt = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+        if fmt not in CatalogImportService.SUPPORTED_FORMATS:
+            raise ValueError('Unsupported file type. Use a .csv, .json or .jsonl file.')
+
+        spooled = CatalogImportService._spool_path(fmt)
+        shutil.copyfile(path, spooled)
+
+        job = ImportJob(filename=os.path.basename(path), source=fmt, dry_run=dry_run, enrich=enrich)
+        db.session.add(job)
+        db.session.commit()
+
+        CatalogImportService.run_job(job.id, spooled)
+        return db.session.get(ImportJob, job.id)
+
+    @staticmethod
+    def _spool_path(fmt):
+        folder = os.path.join(current_app.instance_path, 'imports')
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f'{uuid.uuid4().hex}.{fmt}')
+
+    @staticmethod
+    def _launch(job_id, path):
+        app = current_app._get_current_object()
+
+        def worker():
+            with app.app_context():
+                CatalogImportService.run_job(job_id, path)
+
+        threading.Thread(target=worker, name=f'catalog-import-{job_id}', daemon=True).start()
+
+    @staticmethod
+    def run_job(job_id, path):
+        """
+        Run an import job to completion. Safe to call directly (e.g. from the CLI).
+
+        Args:
+            job_id: ID of the ImportJob
+            path: Path of the spooled file; removed when the job finishes
+        """
+        job = db.session.get(ImportJob, job_id)
+        fmt = 'jsonl' if job.source == 'openlibrary' else job.source
+        job.status = 'running'
+        errors = []
+
+        try:
+            job.total_rows = sum(1 for _ in CatalogImportService._iter_raw(path, fmt))
+            db.session.commit()
+
+            # Keys already seen in this job, so repeats across batches become updates
+            seen = {}
+            batch = []
+            for row_number, raw in enumerate(CatalogImportService._iter_raw(path, fmt), start=1):
+                record, error = CatalogImportService.validate_row(raw)
+                if error:
+                    job.error_count += 1
+                    if len(errors) < CatalogImportService.MAX_STORED_ERRORS:
+                        errors.append({'row': row_number, 'error': error})
+                else:
+                    batch.append(record)
+
+                if len(batch) >= CatalogImportService.BATCH_SIZE:
+                    CatalogImportService._apply_batch(job, batch, seen)
+                    batch = []
+                    job.processed_rows = row_number
+                    job.errors = list(errors)
+                    db.session.commit()
+
+            if batch:
+                CatalogImportService._apply_batch(job, batch, seen)
+            job.processed_rows = job.total_rows
+            job.errors = errors
+            job.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(ImportJob, job_id)
+            job.status = 'failed'
+            job.errors = errors + [{'row': None, 'error': f'Import aborted: {e}'}]
+            current_app.logger.exception(f'Catalog import {job_id} failed')
+        finally:
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _iter_raw(path, fmt):
+        """Yield raw row dicts from a spooled file without loading it all at once."""
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            if fmt == 'csv':
+                for row in csv.DictReader(f):
+                    yield {(k or '').strip().lower(): v for k, v in row.items()}
+            elif fmt == 'jsonl':
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                yield from _iter_json_rows(f)
+
+    @staticmethod
+    def validate_row(raw):
+        """
+        Normalize and validate one import row.
+
+        Args:
+            raw: Dict of column -> value
+
+        Returns:
+            tuple: (record, error) - exactly one of them is None
+        """
+        if not isinstance(raw, dict):
+            return None, 'Row is not an object.'
+
+        def text(key):
+            value = raw.get(key)
+            return str(value).strip() if value is not None else ''
+
+        record = {
+            'title': text('title'),
+            'author': text('author'),
+            'item_type': text('item_type').lower() or 'hybrid',
+            'category': text('category') or 'General',
+            'location': text('location') or None,
+            'image_url': text('image_url') or text('cover') or None
+        }
+
+        if not record['title'] or not record['author']:
+            return None, 'Title and author are required.'
+        for key, limit in CatalogImportService.FIELD_LIMITS.items():
+            if record[key] and len(record[key]) > limit:
+                return None, f'{key} is longer than {limit} characters.'
+        if record['item_type'] not in CatalogImportService.ITEM_TYPES:
+            return None, f'Unknown item_type "{record["item_type"]}".'
+        if record['image_url'] and not record['image_url'].startswith(('http://', 'https://')):
+            return None, 'image_url must be an http(s) URL.'
+
+        price = text('price')
+        quantity = text('quantity') or text('stock_total')
+        try:
+            record['price'] = float(price) if price else 0.0
+            record['quantity'] = int(quantity) if quantity else 1
+        except ValueError:
+            return None, 'Price and quantity must be numbers.'
+
+        if record['price'] < 0:
+            return None, 'Price cannot be negative.'
+        if record['quantity'] < 1:
+            return None, 'Quantity must be at least 1.'
+
+        return record, None
+
+    @staticmethod
+    def _apply_batch(job, batch, seen):
+        """Deduplicate one batch against the catalog and upsert it."""
+        # Collapse repeats within the batch, summing their copies
+        merged = {}
+        for record in batch:
+            key = Book.make_dedupe_key(record['title'], record['author'])
+            if key in merged:
+                merged[key]['quantity'] += record['quantity']
+            else:
+                merged[key] = dict(record)
+
+        # One lookup for every key in the batch that this job hasn't resolved yet
+        lookup = [key for key in merged if key not in seen]
+        if lookup:
+            existing = db.session.query(Book.id, Book.dedupe_key).filter(Book.dedupe_key.in_(lookup))
+            for book_id, key in existing:
+                seen.setdefault(key, book_id)
+
+        new_records = [r for key, r in merged.items() if key not in seen]
+        updates = [(seen[key], r) for key, r in merged.items() if key in seen]
+
+        if job.dry_run:
+            # Later duplicates of would-be books count as updates
+            for key in merged:
+                seen.setdefault(key, None)
+        else:
+            if job.enrich:
+                CatalogImportService._enrich(new_records)
+
+            if new_records:
+                keys = [key for key, r in merged.items() if key not in seen]
+                db.session.execute(insert(Book), [{
+                    'title': r['title'],
+                    'author': r['author'],
+                    'price': r['price'],
+                    'item_type': r['item_type'],
+                    'category': r['category'],
+                    'location': r['location'],
+                    'image_url': r['image_url'],
+                    'discount_percentage': 0.0,
+                    'stock_total': r['quantity'],
+                    'stock_available': r['quantity'],
+                    'stock_borrowed': 0,
+                    'stock_sold': 0,
+                    'dedupe_key': key
+                } for key, r in zip(keys, new_records)])
+
+                created = db.session.query(Book.id, Book.dedupe_key).filter(Book.dedupe_key.in_(keys))
+                for book_id, key in created:
+                    seen.setdefault(key, book_id)
+
+                StockService.record_bulk([{
+                    'book_id': seen[key], 'kind': 'import', 'ref_type': 'import_job', 'ref_id': job.id,
+                    'user_id': job.user_id, 'total_delta': r['quantity'], 'available_delta': r['quantity']
+                } for key, r in zip(keys, new_records)])
+
+            existing_updates = [(book_id, r) for book_id, r in updates if book_id is not None]
+            if existing_updates:
+                books = Book.__table__
+                # Add the donated copies and only fill metadata the catalog is missing
+                stmt = update(books).where(books.c.id == bindparam('b_id')).values(
+                    stock_total=books.c.stock_total + bindparam('qty'),
+                    stock_available=books.c.stock_available + bindparam('qty'),
+                    image_url=func.coalesce(books.c.image_url, bindparam('img')),
+                    location=func.coalesce(books.c.location, bindparam('loc'))
+                )
+                db.session.execute(stmt, [
+                    {'b_id': book_id, 'qty': r['quantity'], 'img': r['image_url'], 'loc': r['location']}
+                    for book_id, r in existing_updates
+                ])
+                StockService.record_bulk([{
+                    'book_id': book_id, 'kind': 'import', 'ref_type': 'import_job', 'ref_id': job.id,
+                    'user_id': job.user_id, 'total_delta': r['quantity'], 'available_delta': r['quantity']
+                } for book_id, r in existing_updates])
+
+        job.created_count += len(new_records)
+        job.updated_count += len(updates)
+
+    @staticmethod
+    def _enrich(records):
+        """Fill missing covers from OpenLibrary using a bounded thread pool."""
+        from app.main.search_utils import lookup_openlibrary
+
+        missing = [r for r in records if not r['image_url']]
+        if not missing:
+            return
+
+        workers = current_app.config.get('IMPORT_ENRICH_WORKERS', CatalogImportService.ENRICH_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda r: lookup_openlibrary(r['title'], r['author']), missing)
+            for record, found in zip(missing, results):
+                if found:
+                    record['image_url'] = found['cover']
+
+
+class _JSONReader:
+    """Decodes one JSON value at a time from a file read in JSON_READ_SIZE chunks."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(JSON_READ_SIZE)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Invalid JSON: expected "{char}" near character {self.pos}')
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer
+                if not self._fill():
+                    raise
+                continue
+            # A number ending the buffer may continue in the next chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def array(self):
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ',':
+                self.pos += 1
+            else:
+                self.expect(']')
+                return
+
+
+def _iter_json_rows(f):
+    """Yield the rows of a JSON array, or of the "books" array of an object, one at a time."""
+    reader = _JSONReader(f)
+    if reader.peek() == '[':
+        yield from reader.array()
+        return
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == 'books' and reader.peek() == '[':
+            yield from reader.array()
+        else:
+            reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+        else:
+            reader.expect('}')
+            return
@@ -0,0 +1,133 @@
+"""
+Invoice Service - Business logic for supplier invoice PDFs.
+Renders each order's invoice once and keeps it on disk, keyed by order id
+and a hash of everything the invoice shows, so downloads are file sends.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+from flask import current_app, render_template
+from xhtml2pdf import pisa
+from app.models import SupplyOrder, db
+
+
+class InvoiceService:
+    """Service class for the rendered invoice artifact store."""
+
+    TEMPLATE = 'admin/supplier/invoice.html'
+
+    @staticmethod
+    def invoice_folder():
+        folder = current_app.config.get('INVOICE_FOLDER') or os.path.join(current_app.instance_path, 'invoices')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def content_hash(order):
+        """
+        Hash everything that appears on the invoice, plus the template source.
+
+        Any change to the order, its items, its supplier or the invoice
+        template yields a new hash and therefore a fresh render.
+
+        Args:
+            order: SupplyOrder instance
+
+        Returns:
+            str: Hex digest
+        """
+        supplier = order.supplier
+        content = {
+            'id': order.id,
+            'created_at': order.created_at.isoformat() if order.created_at else None,
+            'supplier': [supplier.name, supplier.email, supplier.phone, supplier.contact_person] if supplier else None,
+            'items': [[item.id, item.book.title if item.book else None,
+                       item.book.author if item.book else None, item.mass]
+                      for item in order.line_items]
+        }
+        source = current_app.jinja_env.loader.get_source(current_app.jinja_env, InvoiceService.TEMPLATE)[0]
+        digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def render_pdf(order):
+        """
+        Render an order's invoice to PDF bytes.
+
+        Raises:
+            RuntimeError: If xhtml2pdf reports an error
+        """
+        html = render_template(InvoiceService.TEMPLATE, order=order)
+        buffer = BytesIO()
+        pisa_status = pisa.CreatePDF(html, dest=buffer)
+        if pisa_status.err:
+            raise RuntimeError(f'Could not render invoice for order #{order.id}')
+        return buffer.getvalue()
+
+    @staticmethod
+    def get_invoice(order):
+        """
+        Return the cached invoice for an order, rendering it if needed.
+
+        Args:
+            order: SupplyOrder instance
+
+        Returns:
+            tuple: (path to the PDF, content hash usable as an ETag)
+
+        Raises:
+            RuntimeError: If rendering fails
+        """
+        digest = InvoiceService.content_hash(order)
+        folder = InvoiceService.invoice_folder()
+        path = os.path.join(folder, f'{order.id}-{digest[:32]}.pdf')
+        if os.path.exists(path):
+            return path, digest
+
+        pdf = InvoiceService.render_pdf(order)
+
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+
+        # Drop renders of older versions of this order
+        for stale in glob.glob(os.path.join(folder, f'{order.id}-*.pdf')):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+        return path, digest
+
+    @staticmethod
+    def prerender(order_id):
+        """
+        Render an order's invoice in a background thread.
+
+        Called when an order is placed, so the first download is already a
+        cache hit. Failures are logged; the download path renders lazily.
+
+        Args:
+            order_id: ID of the SupplyOrder
+        """
+        app = current_app._get_current_object()
+
+        def worker():
+            # Template context processors expect a request, so fake one
+            with app.test_request_context():
+                try:
+                    order = db.session.get(SupplyOrder, order_id)
+                    if order:
+                        InvoiceService.get_invoice(order)
+                except Exception:
+                    app.logger.exception(f'Pre-rendering invoice for order {order_id} failed')
+
+        threading.Thread(target=worker, name=f'invoice-{order_id}', daemon=True).start()
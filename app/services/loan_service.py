@@ -4,8 +4,14 @@ Handles loan creation, returns, and status management.
 """
 
 from datetime import datetime, timedelta
-from app.models import Loan, Book, db
-from flask import abort
+from app.models import Loan, Book, Notification, User, db
+from flask import abort, current_app
+from flask_mail import Message
+from app.extensions import mail
+from sqlalchemy import select, literal
+from app.services.replenishment_service import ReplenishmentService
+from app.services.stock_service import StockService
+from app.metrics import LOANS_CREATED, LOANS_RETURNED
 
 
 class LoanService:
@@ -36,7 +42,7 @@ class LoanService:
             raise PermissionError("You are not allowed to return this book.")
         
         # Validate loan status
-        if loan.status != 'active':
+        if not loan.is_open:
             raise ValueError("This loan has already been returned or closed.")
         
         # Update loan
@@ -45,10 +51,12 @@ class LoanService:
         
         # Update book stock
         if loan.book:
-            loan.book.stock_available += 1
-            loan.book.stock_borrowed = max(0, loan.book.stock_borrowed - 1)
+            StockService.record(loan.book, 'return', available=1,
+                                borrowed=-1 if loan.book.stock_borrowed > 0 else 0,
+                                ref_type='loan', ref_id=loan.id, user_id=user_id)
         
         db.session.commit()
+        LOANS_RETURNED.labels('member').inc()
         return loan
     
     @staticmethod
@@ -68,7 +76,7 @@ class LoanService:
         loan = Loan.query.get_or_404(loan_id)
         
         # Validate loan status
-        if loan.status != 'active':
+        if not loan.is_open:
             raise ValueError("Loan is already returned or invalid.")
         
         # Update loan
@@ -77,10 +85,12 @@ class LoanService:
         
         # Update book stock
         if loan.book:
-            loan.book.stock_available += 1
-            loan.book.stock_borrowed = max(0, loan.book.stock_borrowed - 1)
+            StockService.record(loan.book, 'return', available=1,
+                                borrowed=-1 if loan.book.stock_borrowed > 0 else 0,
+                                ref_type='loan', ref_id=loan.id)
         
         db.session.commit()
+        LOANS_RETURNED.labels('staff').inc()
         return loan
     
     @staticmethod
@@ -118,29 +128,32 @@ class LoanService:
             status='active'
         )
         
-        # Update book stock
-        book.stock_available -= 1
-        book.stock_borrowed += 1
-        
         db.session.add(loan)
+        db.session.flush()
+        
+        # Update book stock
+        StockService.record(book, 'loan', available=-1, borrowed=1,
+                            ref_type='loan', ref_id=loan.id, user_id=user_id)
         db.session.commit()
+        LOANS_CREATED.labels('direct').inc()
         
+        ReplenishmentService.on_stock_change([book_id])
         return loan
     
     @staticmethod
     def get_active_loans(user_id):
         """
-        Get all active loans for a user.
+        Get all open (active or overdue) loans for a user.
         
         Args:
             user_id: ID of the user
             
         Returns:
-            list: List of active Loan objects
+            list: List of open Loan objects
         """
-        return Loan.query.filter_by(
-            user_id=user_id,
-            status='active'
+        return Loan.query.filter(
+            Loan.user_id == user_id,
+            Loan.status.in_(Loan.OPEN_STATUSES)
         ).order_by(Loan.due_date.asc()).all()
     
     @staticmethod
@@ -148,22 +161,107 @@ class LoanService:
         """
         Get overdue loans, optionally filtered by user.
         
+        Relies on the overdue sweep having flagged the loans, so the lookup
+        is a plain status filter served by the (status, due_date) index.
+        
         Args:
             user_id: Optional user ID to filter by
             
         Returns:
             list: List of overdue Loan objects
         """
-        query = Loan.query.filter(
-            Loan.status == 'active',
-            Loan.due_date < datetime.utcnow()
-        )
+        query = Loan.query.filter(Loan.status == 'overdue')
         
         if user_id:
             query = query.filter_by(user_id=user_id)
         
         return query.order_by(Loan.due_date.asc()).all()
     
+    @staticmethod
+    def sweep_overdue(now=None):
+        """
+        Move every active loan past its due date to 'overdue'.
+        
+        Queues one overdue reminder per transitioned loan and flips the
+        statuses with a single bulk UPDATE. Both statements use the same
+        cut-off so the reminders match the loans that were updated.
+        
+        Args:
+            now: Cut-off timestamp (default: current UTC time)
+            
+        Returns:
+            int: Number of loans marked overdue
+        """
+        if now is None:
+            now = datetime.utcnow()
+        
+        due = (Loan.status == 'active', Loan.due_date < now)
+        
+        # Queue reminders for the loans about to transition
+        reminders = select(
+            Loan.user_id,
+            Loan.id,
+            literal('overdue_reminder'),
+            literal(now)
+        ).where(*due)
+        db.session.execute(
+            Notification.__table__.insert().from_select(
+                ['user_id', 'loan_id', 'kind', 'created_at'], reminders
+            )
+        )
+        
+        count = Loan.query.filter(*due).update(
+            {Loan.status: 'overdue'}, synchronize_session=False
+        )
+        
+        db.session.commit()
+        return count
+    
+    @staticmethod
+    def send_overdue_reminders(batch_size=100):
+        """
+        Email queued overdue reminders and mark them as sent.
+        
+        Args:
+            batch_size: Maximum number of reminders to send in one run
+            
+        Returns:
+            int: Number of reminders sent
+        """
+        pending = db.session.query(Notification, Loan, Book, User)\
+            .join(Loan, Notification.loan_id == Loan.id)\
+            .join(Book, Loan.book_id == Book.id)\
+            .join(User, Notification.user_id == User.id)\
+            .filter(Notification.kind == 'overdue_reminder',
+                    Notification.sent_at.is_(None))\
+            .order_by(Notification.created_at)\
+            .limit(batch_size).all()
+        
+        sent = 0
+        for notification, loan, book, user in pending:
+            # Skip the email if the book came back before we got to it
+            if loan.is_open:
+                msg = Message('Overdue Book Reminder - ChupChap Pathshala',
+                              sender=("ChupChap Support", current_app.config['ADMINS'][0]),
+                              recipients=[user.email])
+                msg.body = f'''Hello {user.username},
+
+"{book.title}" was due on {loan.due_date.strftime('%b %d, %Y')}. Please return it as soon as possible.
+
+Best regards,
+ChupChap Pathshala Team
+'''
+                try:
+                    mail.send(msg)
+                except Exception as e:
+                    current_app.logger.warning(f"Failed to send overdue reminder {notification.id}: {e}")
+                    continue
+                sent += 1
+            notification.sent_at = datetime.utcnow()
+        
+        db.session.commit()
+        return sent
+    
     @staticmethod
     def calculate_days_remaining(loan):
         """
@@ -175,11 +273,7 @@ class LoanService:
         Returns:
             int: Days remaining (negative if overdue)
         """
-        if loan.status != 'active':
-            return 0
-        
-        delta = loan.due_date - datetime.utcnow()
-        return delta.days
+        return loan.days_remaining
     
     @staticmethod
     def get_loan_history(user_id, status=None, page=1, per_page=10):
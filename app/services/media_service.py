@@ -0,0 +1,259 @@
+"""
+Media Service - Business logic for uploaded images.
+Stores uploads under content-addressed paths, so the same image uploaded
+twice is kept once, and builds WebP thumbnails in a background pool.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from flask import current_app, url_for
+from PIL import Image, UnidentifiedImageError
+
+
+class MediaService:
+    """Service class for the deduplicated media store."""
+
+    # Thumbnail widths in pixels, by where the image is shown
+    SIZES = {'catalog': 200, 'card': 400, 'detail': 800}
+    FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+    STATIC_SUBDIR = 'media'
+    THUMBNAIL_QUALITY = 80
+    CHUNK_SIZE = 64 * 1024
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    RENDITION_CACHE_SIZE = 10000
+    _rendition_cache = {} # original's file path -> complete {size: (thumbnail, width)}
+    _rendition_lock = threading.Lock()
+
+    @staticmethod
+    def media_root():
+        root = current_app.config.get('MEDIA_FOLDER') or \
+            os.path.join(current_app.static_folder, MediaService.STATIC_SUBDIR)
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    @staticmethod
+    def _pool():
+        with MediaService._executor_lock:
+            if MediaService._executor is None:
+                workers = current_app.config.get('MEDIA_THUMBNAIL_WORKERS', 2)
+                MediaService._executor = ThreadPoolExecutor(max_workers=workers,
+                                                            thread_name_prefix='thumbnails')
+            return MediaService._executor
+
+    @staticmethod
+    def save(file):
+        """
+        Store an uploaded image, deduplicating by content.
+
+        The upload is hashed while it is copied to a temp file, then moved to
+        media/<aa>/<bb>/<sha256>.<ext>. If that path already exists the copy
+        is discarded. Thumbnails are generated in the background.
+
+        Args:
+            file: Uploaded FileStorage
+
+        Returns:
+            str: Path relative to the static folder, e.g. for
+            url_for('static', filename=...)
+
+        Raises:
+            ValueError: If the upload isn't a supported image
+        """
+        root = MediaService.media_root()
+        tmp_path = os.path.join(root, f'.upload-{uuid.uuid4().hex}')
+        digest = hashlib.sha256()
+        with open(tmp_path, 'wb') as out:
+            for chunk in iter(lambda: file.stream.read(MediaService.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+
+        try:
+            with Image.open(tmp_path) as image:
+                ext = MediaService.FORMATS.get(image.format)
+                image.verify()
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            ext = None
+        if not ext:
+            os.remove(tmp_path)
+            raise ValueError('File is not a supported image (PNG, JPEG, GIF or WebP).')
+
+        name = digest.hexdigest()
+        folder = os.path.join(root, name[:2], name[2:4])
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'{name}.{ext}')
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+
+        MediaService._pool().submit(MediaService.generate_thumbnails, path)
+        return f'{MediaService.STATIC_SUBDIR}/{name[:2]}/{name[2:4]}/{name}.{ext}'
+
+    @staticmethod
+    def save_url(file):
+        """Store an uploaded image and return its static URL."""
+        return url_for('static', filename=MediaService.save(file))
+
+    @staticmethod
+    def thumbnail_path(path, size):
+        return f'{os.path.splitext(path)[0]}_{size}.webp'
+
+    @staticmethod
+    def generate_thumbnails(path):
+        """
+        Write missing WebP thumbnails for one stored original.
+
+        Runs in the thumbnail pool and needs no app context. Originals
+        narrower than a size are re-encoded at their own width.
+
+        Args:
+            path: Filesystem path of the original image
+
+        Returns:
+            int: Number of thumbnails written
+        """
+        written = 0
+        try:
+            with Image.open(path) as image:
+                image.seek(0)
+                source = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            for size, width in MediaService.SIZES.items():
+                target = MediaService.thumbnail_path(path, size)
+                if os.path.exists(target):
+                    continue
+                thumb = source.copy()
+                thumb.thumbnail((width, width * 4))
+                tmp_path = f'{target}.tmp'
+                thumb.save(tmp_path, 'WEBP', quality=MediaService.THUMBNAIL_QUALITY, method=4)
+                os.replace(tmp_path, target)
+                written += 1
+        except (OSError, ValueError):
+            # A broken original just keeps being served full-size
+            return written
+        return written
+
+    @staticmethod
+    def _relative(url):
+        """Map a stored media URL or static-relative path to its path under static/, else None."""
+        if not url:
+            return None
+        prefix = url_for('static', filename=f'{MediaService.STATIC_SUBDIR}/')
+        if url.startswith(prefix):
+            return f'{MediaService.STATIC_SUBDIR}/{url[len(prefix):]}'
+        if url.startswith(f'{MediaService.STATIC_SUBDIR}/'):
+            return url
+        return None
+
+    @staticmethod
+    def _static_file(relative):
+        root = current_app.config.get('MEDIA_FOLDER')
+        if root:
+            return os.path.join(root, relative[len(MediaService.STATIC_SUBDIR) + 1:])
+        return os.path.join(current_app.static_folder, relative)
+
+    @staticmethod
+    def _renditions(relative):
+        """
+        Thumbnails that exist for a stored original, as {size: (path, real width)}.
+
+        Pages list dozens of images, so lookups are memoised. Only complete
+        sets are kept: thumbnails never change once written, while a set
+        still being generated (possibly by another process's pool) is
+        looked up again on the next render.
+        """
+        key = MediaService._static_file(relative)
+        found = MediaService._rendition_cache.get(key)
+        if found is not None:
+            return found
+        found = {}
+        for size in MediaService.SIZES:
+            thumb = MediaService.thumbnail_path(relative, size)
+            filename = MediaService._static_file(thumb)
+            if os.path.exists(filename):
+                found[size] = (thumb, _image_width(filename))
+        if len(found) == len(MediaService.SIZES):
+            with MediaService._rendition_lock:
+                if len(MediaService._rendition_cache) >= MediaService.RENDITION_CACHE_SIZE:
+                    MediaService._rendition_cache.clear()
+                MediaService._rendition_cache[key] = found
+        return found
+
+    @staticmethod
+    def src(url, size='card'):
+        """
+        URL of the best available rendition of an image for a display size.
+
+        External URLs and images without thumbnails yet are returned as-is.
+        """
+        relative = MediaService._relative(url)
+        if not relative:
+            return url if not url or '://' in url or url.startswith('/') else url_for('static', filename=url)
+        rendition = MediaService._renditions(relative).get(size)
+        return url_for('static', filename=rendition[0] if rendition else relative)
+
+    @staticmethod
+    def srcset(url):
+        """
+        srcset value listing every thumbnail that exists for an image (empty otherwise).
+
+        Each candidate carries the thumbnail's real width. An original
+        narrower than a size gives a thumbnail at its own width, and
+        advertising the nominal width would have the browser pick it for
+        slots it can't fill; thumbnails that came out the same width are
+        listed once.
+        """
+        relative = MediaService._relative(url)
+        if not relative:
+            return ''
+        candidates = {}
+        for thumb, width in MediaService._renditions(relative).values():
+            if width and width not in candidates:
+                candidates[width] = f"{url_for('static', filename=thumb)} {width}w"
+        return ', '.join(candidates.values())
+
+    @staticmethod
+    def backfill_thumbnails():
+        """
+        Generate missing thumbnails for every original in the store.
+
+        Returns:
+            int: Number of thumbnails written
+        """
+        written = 0
+        for dirpath, _, filenames in os.walk(MediaService.media_root()):
+            for filename in filenames:
+                name, ext = os.path.splitext(filename)
+                if filename.startswith('.') or ext.lstrip('.') not in MediaService.FORMATS.values():
+                    continue
+                if name.rsplit('_', 1)[-1] in MediaService.SIZES:
+                    continue
+                written += MediaService.generate_thumbnails(os.path.join(dirpath, filename))
+        return written
+
+    @staticmethod
+    def init_app(app):
+        """Expose media_src() and media_srcset() to templates."""
+        app.add_template_global(MediaService.src, 'media_src')
+        app.add_template_global(MediaService.srcset, 'media_srcset')
+
+
+@lru_cache(maxsize=4096)
+def _image_width(filename):
+    """
+    Pixel width of an image file, read from its header; None if unreadable.
+
+    Cached: thumbnails sit at content-addressed paths and never change once
+    written, and _renditions() only asks for files that exist.
+    """
+    try:
+        with Image.open(filename) as image:
+            return image.width
+    except (UnidentifiedImageError, OSError):
+        return None
@@ -0,0 +1,143 @@
+"""
+Replenishment Service - Business logic for restocking.
+Floats low-stock books up to the supplier shortlist. Runs from the
+scheduler and after stock-changing events, never on page views.
+"""
+
+from flask import current_app
+from sqlalchemy import insert, exists, and_, func
+from app.models import Book, SupplyOrder, SupplyOrderItem, DemandForecast, db
+
+
+class ReplenishmentService:
+    """Service class for keeping the supplier shortlist topped up."""
+
+    # Fallbacks for books the forecaster hasn't scored yet
+    LOW_STOCK_THRESHOLD = 5
+    DEFAULT_ORDER_QUANTITY = 5
+    # Orders whose items count as "already on order"
+    ACTIVE_ORDER_STATUSES = ('shortlist', 'pending_review', 'placed')
+
+    @staticmethod
+    def get_shortlist():
+        """Return the open shortlist order, or None if there isn't one."""
+        return SupplyOrder.query.filter_by(status='shortlist').first()
+
+    @staticmethod
+    def get_or_create_shortlist():
+        """
+        Return the open shortlist order, creating it if needed.
+
+        Returns:
+            SupplyOrder: The shortlist (draft) order
+        """
+        order = ReplenishmentService.get_shortlist()
+        if not order:
+            order = SupplyOrder(status='shortlist')
+            db.session.add(order)
+            db.session.commit()
+        return order
+
+    @staticmethod
+    def books_needing_reorder(book_ids=None):
+        """
+        Build the query for low-stock books not already on an active order.
+
+        A single anti-join: books below their forecast reorder point (or the
+        fixed threshold when there is no forecast) with no item on any
+        shortlist, pending or placed order.
+
+        Args:
+            book_ids: Optionally restrict the check to these books
+
+        Returns:
+            Query: (book id, stock_available, order_up_to) rows; order_up_to
+            is None for books without a forecast
+        """
+        on_order = exists().where(and_(
+            SupplyOrderItem.book_id == Book.id,
+            SupplyOrderItem.order_id == SupplyOrder.id,
+            SupplyOrder.status.in_(ReplenishmentService.ACTIVE_ORDER_STATUSES)
+        ))
+        reorder_point = func.coalesce(DemandForecast.reorder_point,
+                                      ReplenishmentService.LOW_STOCK_THRESHOLD)
+        query = db.session.query(Book.id, Book.stock_available, DemandForecast.order_up_to)\
+            .outerjoin(DemandForecast, DemandForecast.book_id == Book.id)\
+            .filter(Book.stock_available < reorder_point, ~on_order)
+        if book_ids is not None:
+            query = query.filter(Book.id.in_(book_ids))
+        return query
+
+    @staticmethod
+    def order_quantity(stock_available, order_up_to):
+        """Quantity to order so stock reaches the forecast target."""
+        if order_up_to is None:
+            return ReplenishmentService.DEFAULT_ORDER_QUANTITY
+        return max(1, order_up_to - (stock_available or 0))
+
+    @staticmethod
+    def suggested_quantity(book):
+        """
+        Order quantity for a single book, e.g. for a manual lift.
+
+        Args:
+            book: Book instance
+
+        Returns:
+            int: Copies to order
+        """
+        forecast = book.forecast
+        return ReplenishmentService.order_quantity(
+            book.stock_available, forecast.order_up_to if forecast else None
+        )
+
+    @staticmethod
+    def float_up_low_stock(book_ids=None):
+        """
+        Add every low-stock book that isn't on order to the shortlist.
+
+        Order quantities come from the demand forecast where one exists.
+
+        Args:
+            book_ids: Optionally restrict the check to these books, e.g. the
+                ones touched by a checkout
+
+        Returns:
+            int: Number of items added to the shortlist
+        """
+        candidates = ReplenishmentService.books_needing_reorder(book_ids).all()
+        if not candidates:
+            return 0
+
+        order = ReplenishmentService.get_or_create_shortlist()
+        db.session.execute(insert(SupplyOrderItem), [
+            {'order_id': order.id, 'book_id': book_id,
+             'mass': ReplenishmentService.order_quantity(stock_available, order_up_to)}
+            for book_id, stock_available, order_up_to in candidates
+        ])
+        db.session.commit()
+        return len(candidates)
+
+    @staticmethod
+    def on_stock_change(book_ids):
+        """
+        Re-check the given books after their stock changed.
+
+        Failures are logged rather than raised so a replenishment hiccup
+        never breaks the checkout or loan that triggered it.
+
+        Args:
+            book_ids: IDs of books whose stock was just updated
+
+        Returns:
+            int: Number of items added to the shortlist
+        """
+        book_ids = list(set(book_ids))
+        if not book_ids:
+            return 0
+        try:
+            return ReplenishmentService.float_up_low_stock(book_ids)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception('Low-stock float-up failed')
+            return 0
@@ -0,0 +1,256 @@
+"""
+Stock Service - Business logic for inventory counters.
+Every change to a book's stock counters goes through here and is recorded
+in the append-only stock_movements ledger, which the reconciliation job
+checks the counters against. Deleting a book keeps its ledger rows, unlinked
+and labelled with its title.
+"""
+
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, insert, update, select, literal, bindparam, exists, Integer, DateTime
+from app.models import Book, StockMovement, StockCheckpoint, SupplyOrderItem, db
+
+
+class StockService:
+    """Service class for ledgered stock changes and reconciliation."""
+
+    COUNTERS = ('stock_total', 'stock_available', 'stock_borrowed', 'stock_sold')
+    # Movements younger than this may belong to transactions still in flight
+    RECONCILE_LAG_SECONDS = 60
+
+    @staticmethod
+    def record(book, kind, total=0, available=0, borrowed=0, sold=0,
+               ref_type=None, ref_id=None, user_id=None):
+        """
+        Apply stock deltas to a book and append the matching ledger row.
+
+        Nothing is committed; the movement lands in the caller's transaction
+        together with the counter change.
+
+        Args:
+            book: Book instance to update
+            kind: Movement kind (receipt, restock, sale, loan, return, ...)
+            total, available, borrowed, sold: Signed deltas per counter
+            ref_type, ref_id: Optional reference to the originating record
+            user_id: Optional ID of the user who caused the change
+
+        Returns:
+            StockMovement: The pending ledger row
+        """
+        book.stock_total = (book.stock_total or 0) + total
+        book.stock_available = (book.stock_available or 0) + available
+        book.stock_borrowed = (book.stock_borrowed or 0) + borrowed
+        book.stock_sold = (book.stock_sold or 0) + sold
+
+        movement = StockMovement(
+            book=book, kind=kind,
+            total_delta=total, available_delta=available,
+            borrowed_delta=borrowed, sold_delta=sold,
+            ref_type=ref_type, ref_id=ref_id, user_id=user_id
+        )
+        db.session.add(movement)
+        return movement
+
+    @staticmethod
+    def record_new_book(book, user_id=None):
+        """Ledger the opening counters of a book that was just created."""
+        movement = StockMovement(
+            book=book, kind='initial',
+            total_delta=book.stock_total or 0, available_delta=book.stock_available or 0,
+            borrowed_delta=book.stock_borrowed or 0, sold_delta=book.stock_sold or 0,
+            user_id=user_id
+        )
+        db.session.add(movement)
+        return movement
+
+    @staticmethod
+    def set_counters(book, user_id=None, **counters):
+        """
+        Overwrite counters from a manual edit, ledgering the difference.
+
+        Args:
+            book: Book instance to update
+            user_id: ID of the staff member making the edit
+            **counters: New values keyed by counter name
+
+        Returns:
+            StockMovement: The adjustment row, or None if nothing changed
+        """
+        deltas = {name: int(counters[name] or 0) - (getattr(book, name) or 0)
+                  for name in StockService.COUNTERS if name in counters}
+        if not any(deltas.values()):
+            return None
+        return StockService.record(
+            book, 'adjustment',
+            total=deltas.get('stock_total', 0), available=deltas.get('stock_available', 0),
+            borrowed=deltas.get('stock_borrowed', 0), sold=deltas.get('stock_sold', 0),
+            user_id=user_id
+        )
+
+    @staticmethod
+    def receive_order(order, user_id=None):
+        """
+        Fuse a delivered supply order into inventory in one transaction.
+
+        Received quantities (payload, or the ordered mass if never counted)
+        are summed per book in SQL: one INSERT...SELECT writes the ledger,
+        one UPDATE adds them to the books and one UPDATE fills missing
+        payloads. The cost doesn't grow with the number of items.
+
+        Args:
+            order: SupplyOrder with status 'placed'
+            user_id: ID of the staff member receiving it
+
+        Raises:
+            ValueError: If the order isn't waiting for delivery
+        """
+        if order.status != 'placed':
+            raise ValueError('Order not ready for fusion.')
+
+        items = SupplyOrderItem.__table__
+        books = Book.__table__
+        received = func.coalesce(items.c.payload, items.c.mass)
+
+        db.session.execute(insert(StockMovement).from_select(
+            ['book_id', 'kind', 'total_delta', 'available_delta', 'borrowed_delta',
+             'sold_delta', 'ref_type', 'ref_id', 'user_id', 'created_at'],
+            select(
+                items.c.book_id, literal('receipt'), func.sum(received), func.sum(received),
+                literal(0), literal(0), literal('supply_order'), literal(order.id),
+                literal(user_id, Integer), literal(datetime.utcnow(), DateTime)
+            ).where(items.c.order_id == order.id, items.c.book_id.isnot(None))
+             .group_by(items.c.book_id)
+        ))
+
+        per_book = select(func.sum(received)).where(
+            items.c.order_id == order.id, items.c.book_id == books.c.id
+        ).scalar_subquery()
+        db.session.execute(
+            update(books)
+            .where(books.c.id.in_(select(items.c.book_id).where(items.c.order_id == order.id)))
+            .values(stock_total=books.c.stock_total + per_book,
+                    stock_available=books.c.stock_available + per_book)
+        )
+
+        # Record what was received on lines that were never counted
+        db.session.execute(
+            update(items)
+            .where(items.c.order_id == order.id, items.c.payload.is_(None))
+            .values(payload=items.c.mass)
+        )
+
+        order.status = 'completed'
+        db.session.commit()
+        # Loaded books now hold stale counters
+        db.session.expire_all()
+
+    @staticmethod
+    def record_bulk(rows):
+        """
+        Append many ledger rows in one statement, for bulk writers like imports.
+
+        Args:
+            rows: List of dicts with book_id, kind and any of the delta,
+                ref and user columns
+        """
+        if not rows:
+            return
+        defaults = {'total_delta': 0, 'available_delta': 0, 'borrowed_delta': 0, 'sold_delta': 0,
+                    'ref_type': None, 'ref_id': None, 'user_id': None, 'created_at': datetime.utcnow()}
+        db.session.execute(insert(StockMovement), [{**defaults, **row} for row in rows])
+
+    @staticmethod
+    def reconcile(now=None):
+        """
+        Check every book's counters against the ledger, incrementally.
+
+        Each book's checkpoint holds its ledger sums up to a movement id, so
+        a run only aggregates movements added since the previous run. The
+        counters are then compared to the checkpoints in a single query.
+
+        Args:
+            now: Reference time (defaults to utcnow)
+
+        Returns:
+            dict: 'advanced' (books whose checkpoint moved), 'movements'
+            (ledger rows consumed) and 'drift' (list of mismatched books
+            with counter and ledger values)
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(seconds=StockService.RECONCILE_LAG_SECONDS)
+        high_water = db.session.query(func.max(StockMovement.id))\
+            .filter(StockMovement.created_at <= cutoff).scalar() or 0
+
+        checkpoint = StockCheckpoint.__table__
+        start_after = func.coalesce(checkpoint.c.last_movement_id, 0)
+        deltas = db.session.query(
+            StockMovement.book_id,
+            func.max(StockMovement.id),
+            func.count(StockMovement.id),
+            func.sum(StockMovement.total_delta),
+            func.sum(StockMovement.available_delta),
+            func.sum(StockMovement.borrowed_delta),
+            func.sum(StockMovement.sold_delta)
+        ).outerjoin(checkpoint, checkpoint.c.book_id == StockMovement.book_id)\
+         .filter(StockMovement.book_id.isnot(None),
+                 StockMovement.id > start_after, StockMovement.id <= high_water)\
+         .group_by(StockMovement.book_id).all()
+
+        existing = {row.book_id for row in db.session.query(StockCheckpoint.book_id).filter(
+            StockCheckpoint.book_id.in_([d[0] for d in deltas])
+        )} if deltas else set()
+
+        updates, inserts, consumed = [], [], 0
+        for book_id, last_id, count, total, available, borrowed, sold in deltas:
+            consumed += count
+            row = {'b_id': book_id, 'last_id': last_id, 'total': total or 0, 'available': available or 0,
+                   'borrowed': borrowed or 0, 'sold': sold or 0}
+            (updates if book_id in existing else inserts).append(row)
+
+        if updates:
+            db.session.execute(
+                update(checkpoint).where(checkpoint.c.book_id == bindparam('b_id')).values(
+                    last_movement_id=bindparam('last_id'),
+                    stock_total=checkpoint.c.stock_total + bindparam('total'),
+                    stock_available=checkpoint.c.stock_available + bindparam('available'),
+                    stock_borrowed=checkpoint.c.stock_borrowed + bindparam('borrowed'),
+                    stock_sold=checkpoint.c.stock_sold + bindparam('sold'),
+                    checked_at=now
+                ), updates
+            )
+        if inserts:
+            db.session.execute(insert(StockCheckpoint), [{
+                'book_id': r['b_id'], 'last_movement_id': r['last_id'],
+                'stock_total': r['total'], 'stock_available': r['available'],
+                'stock_borrowed': r['borrowed'], 'stock_sold': r['sold'], 'checked_at': now
+            } for r in inserts])
+        db.session.commit()
+
+        # Books with no ledger at all compare against zero; books with
+        # movements past the high-water mark are checked on the next run
+        in_flight = exists().where(StockMovement.book_id == Book.id, StockMovement.id > high_water)
+        ledger = {name: func.coalesce(getattr(StockCheckpoint, name), 0) for name in StockService.COUNTERS}
+        counters = {name: func.coalesce(getattr(Book, name), 0) for name in StockService.COUNTERS}
+        mismatched = db.session.query(
+            Book.id, Book.title,
+            *[counters[name] for name in StockService.COUNTERS],
+            *[ledger[name] for name in StockService.COUNTERS]
+        ).outerjoin(StockCheckpoint, StockCheckpoint.book_id == Book.id)\
+         .filter(~in_flight, db.or_(*[counters[name] != ledger[name] for name in StockService.COUNTERS]))\
+         .order_by(Book.id).all()
+
+        drift = []
+        for row in mismatched:
+            book_id, title, values = row[0], row[1], row[2:]
+            n = len(StockService.COUNTERS)
+            drift.append({
+                'book_id': book_id,
+                'title': title,
+                'counters': dict(zip(StockService.COUNTERS, values[:n])),
+                'ledger': dict(zip(StockService.COUNTERS, values[n:]))
+            })
+        if drift:
+            current_app.logger.warning(f'Stock reconciliation found drift on {len(drift)} book(s)')
+
+        return {'advanced': len(deltas), 'movements': consumed, 'drift': drift}
@@ -0,0 +1,212 @@
+"""
+Upload Service - Business logic for resumable ebook and audio uploads.
+Files arrive in chunks that are written straight into their final folder,
+so large audiobooks never pass through request.files or a temp copy.
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update
+from werkzeug.utils import secure_filename
+from app.models import UploadSession, db
+
+
+class UploadService:
+    """Service class for chunked, resumable file uploads."""
+
+    EXTENSIONS = {'ebook': {'pdf'}, 'audio': {'mp3', 'wav'}}
+    STREAM_BUFFER = 256 * 1024
+    STALE_AFTER_HOURS = 24
+
+    @staticmethod
+    def folder(kind):
+        """Final folder for a kind of upload, matching where the ebook routes look."""
+        ebooks = os.path.join(current_app.root_path, 'static', 'ebooks')
+        folder = os.path.join(ebooks, 'audio') if kind == 'audio' else ebooks
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def path_for(upload):
+        return os.path.join(UploadService.folder(upload.kind), upload.filename)
+
+    @staticmethod
+    def _reserve(folder, filename):
+        """Create an empty file under a free name, suffixing -1, -2, ... on clashes."""
+        stem, ext = os.path.splitext(filename)
+        candidate, n = filename, 0
+        while True:
+            try:
+                with open(os.path.join(folder, candidate), 'xb'):
+                    return candidate
+            except FileExistsError:
+                n += 1
+                candidate = f'{stem}-{n}{ext}'
+
+    @staticmethod
+    def start(user_id, kind, filename, size):
+        """
+        Open an upload session and reserve its final file.
+
+        Args:
+            user_id: ID of the uploading user
+            kind: 'ebook' or 'audio'
+            filename: Client-side file name
+            size: Total size in bytes
+
+        Returns:
+            UploadSession: The new session
+
+        Raises:
+            ValueError: If the kind, extension or size is not accepted
+        """
+        if kind not in UploadService.EXTENSIONS:
+            raise ValueError('Unknown upload kind.')
+        filename = secure_filename(filename or '')
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if ext not in UploadService.EXTENSIONS[kind]:
+            allowed = ', '.join(sorted(UploadService.EXTENSIONS[kind])).upper()
+            raise ValueError(f'Invalid file type. Allowed: {allowed}.')
+        max_size = current_app.config.get('EBOOK_UPLOAD_MAX_SIZE')
+        if not isinstance(size, int) or size <= 0 or (max_size and size > max_size):
+            raise ValueError('Invalid file size.')
+
+        upload = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            kind=kind,
+            filename=UploadService._reserve(UploadService.folder(kind), filename),
+            total_size=size,
+            received=0
+        )
+        db.session.add(upload)
+        db.session.commit()
+        return upload
+
+    @staticmethod
+    def write_chunk(upload, offset, stream, length):
+        """
+        Write one chunk at its offset in the final file.
+
+        The body is copied from the request stream in small buffers. The
+        offset only advances when it still matches, so a retried or
+        duplicated chunk can't move it twice.
+
+        Args:
+            upload: UploadSession being written
+            offset: Byte offset the client says the chunk starts at
+            stream: Readable request body
+            length: Declared chunk length (Content-Length)
+
+        Returns:
+            bool: False if the offset didn't match (the client should ask
+            for the current one and resume from there)
+
+        Raises:
+            ValueError: If the chunk would run past the declared size, or the
+                finished file doesn't look like its kind
+        """
+        if upload.is_complete or offset != upload.received:
+            return False
+        if length is None or length <= 0 or offset + length > upload.total_size:
+            raise ValueError('Chunk does not fit the upload.')
+
+        written = 0
+        with open(UploadService.path_for(upload), 'r+b') as f:
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(UploadService.STREAM_BUFFER, length - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+
+        # A short body (client went away) leaves the offset where it was
+        if written != length:
+            return False
+
+        new_offset = offset + written
+        complete = new_offset == upload.total_size
+        result = db.session.execute(
+            update(UploadSession)
+            .where(UploadSession.id == upload.id, UploadSession.received == offset)
+            .values(received=new_offset, updated_at=datetime.utcnow(),
+                    status='complete' if complete else 'uploading')
+        )
+        db.session.commit()
+        db.session.refresh(upload)
+        if result.rowcount != 1:
+            return False
+
+        if complete and not UploadService._looks_valid(upload):
+            UploadService.discard(upload)
+            raise ValueError('Uploaded file is not a valid PDF or audio file.')
+        return True
+
+    @staticmethod
+    def _looks_valid(upload):
+        """Check the magic bytes of a finished upload."""
+        with open(UploadService.path_for(upload), 'rb') as f:
+            head = f.read(12)
+        if upload.kind == 'ebook':
+            return head.startswith(b'%PDF-')
+        if upload.filename.lower().endswith('.wav'):
+            return head[:4] == b'RIFF' and head[8:12] == b'WAVE'
+        return head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0)
+
+    @staticmethod
+    def claim(upload_id, kind, user_id):
+        """
+        Hand a finished upload over to an ebook.
+
+        The session row is dropped; the file stays where it was written.
+
+        Args:
+            upload_id: Session ID from the form
+            kind: Expected kind
+            user_id: ID of the user submitting the form
+
+        Returns:
+            str: File name relative to the kind's folder
+
+        Raises:
+            ValueError: If there is no finished upload of that kind for the user
+        """
+        upload = db.session.get(UploadSession, upload_id or '')
+        if not upload or upload.user_id != user_id or upload.kind != kind:
+            raise ValueError('Upload not found.')
+        if not upload.is_complete:
+            raise ValueError('Upload is not finished yet.')
+        filename = upload.filename
+        db.session.delete(upload)
+        return filename
+
+    @staticmethod
+    def discard(upload):
+        """Delete an upload session and whatever was written for it."""
+        try:
+            os.remove(UploadService.path_for(upload))
+        except OSError:
+            pass
+        db.session.delete(upload)
+        db.session.commit()
+
+    @staticmethod
+    def purge_stale(now=None):
+        """
+        Remove uploads that were abandoned or never attached to an ebook.
+
+        Args:
+            now: Reference time (defaults to utcnow)
+
+        Returns:
+            int: Number of sessions removed
+        """
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(hours=UploadService.STALE_AFTER_HOURS)
+        stale = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+        for upload in stale:
+            UploadService.discard(upload)
+        return len(stale)
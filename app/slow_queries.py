@@ -0,0 +1,184 @@
+"""
+Slow-query log with the plan of each captured statement.
+
+A statement that takes SLOW_QUERY_MS or longer is, with probability
+SLOW_QUERY_SAMPLE_RATE, handed to a background task with its call site and
+parameters. The request pays for one stack walk and a deque append; the
+EXPLAIN (EXPLAIN QUERY PLAN on SQLite) runs later on a raw pool
+connection, outside the engine events, so it is neither timed nor logged
+itself. Neither form of EXPLAIN executes the statement.
+
+The newest SLOW_QUERY_LOG_SIZE entries are kept per process and shown at
+/admin/perf/slow-queries. Parameters are kept only until the EXPLAIN has
+run; the log stores them redacted, with string characters other than
+LIKE's % masked, so a leading-wildcard search stays recognisable.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from flask import has_request_context, request
+from sqlalchemy import event
+from app.extensions import db, socketio
+from app.nplusone import fingerprint, origin
+
+QUEUE_LIMIT = 50
+EXPLAINABLE = re.compile(r'^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b', re.IGNORECASE)
+
+
+def redact(parameters):
+    """Parameters with string contents masked; numbers, booleans, None and dates kept."""
+    if isinstance(parameters, dict):
+        return {key: _redact_value(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_redact_value(value) for value in parameters]
+    return _redact_value(parameters)
+
+
+def _redact_value(value):
+    if value is None or isinstance(value, (bool, int, float, date)):
+        return value
+    if isinstance(value, str):
+        return re.sub(r'[^%]', '*', value) if len(value) <= 40 else f'<{len(value)} chars>'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    return f'<{type(value).__name__}>'
+
+
+class SlowQuery:
+    """One captured statement; plan is None until the background task has run EXPLAIN."""
+
+    __slots__ = ('at', 'ms', 'statement', 'fingerprint', 'parameters', 'call_site', 'endpoint', 'plan')
+
+    def __init__(self, ms, statement, parameters, call_site, endpoint):
+        self.at = datetime.utcnow()
+        self.ms = ms
+        self.statement = statement
+        self.fingerprint = fingerprint(statement)
+        self.parameters = redact(parameters)
+        self.call_site = call_site
+        self.endpoint = endpoint
+        self.plan = None
+
+
+class SlowQueryLog:
+    """Engine hooks, the EXPLAIN queue and the bounded store."""
+
+    def __init__(self):
+        self.threshold = 0.2
+        self.sample_rate = 1.0
+        self.explain = True
+        self.app = None
+        self.engine = None
+        self.entries = deque(maxlen=200)
+        self._queue = [] # (SlowQuery, raw parameters) awaiting EXPLAIN, at most QUEUE_LIMIT
+        self._lock = threading.Lock()
+        self._worker = None
+        self.stats = {'captured': 0, 'skipped': 0, 'explained': 0, 'explain_failed': 0}
+
+    def init_app(self, app):
+        self.app = app
+        self.threshold = app.config.get('SLOW_QUERY_MS', 200) / 1000
+        self.sample_rate = app.config.get('SLOW_QUERY_SAMPLE_RATE', 1.0)
+        self.explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+        self.entries = deque(self.entries, maxlen=app.config.get('SLOW_QUERY_LOG_SIZE', 200))
+        if not app.config.get('SLOW_QUERY_LOG', True):
+            return
+        with app.app_context():
+            self.engine = db.engine
+        if event.contains(self.engine, 'before_cursor_execute', self._before_cursor_execute):
+            return
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(self.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_slow_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed < self.threshold:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.stats['skipped'] += 1
+            return
+        entry = SlowQuery(round(elapsed * 1000, 1), statement, parameters, origin(),
+                          request.endpoint if has_request_context() else None)
+        with self._lock:
+            self.stats['captured'] += 1
+            self.entries.appendleft(entry)
+            if not self.explain or executemany or not EXPLAINABLE.match(statement):
+                return
+            if len(self._queue) >= QUEUE_LIMIT:
+                entry.plan = 'Not explained: the EXPLAIN queue was full'
+            else:
+                self._queue.append((entry, parameters))
+                if self._worker is None and self.app is not None:
+                    self._worker = socketio.start_background_task(self._run)
+
+    def explain_pending(self):
+        """
+        Run EXPLAIN for every queued statement.
+
+        Returns:
+            int: Number of plans captured
+        """
+        with self._lock:
+            pending, self._queue = self._queue, []
+        if not pending:
+            return 0
+        sqlite = self.engine.dialect.name == 'sqlite'
+        explained = 0
+        raw = self.engine.raw_connection()
+        try:
+            for entry, parameters in pending:
+                cursor = raw.cursor()
+                try:
+                    cursor.execute(('EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN ') + entry.statement, parameters)
+                    rows = cursor.fetchall()
+                    entry.plan = _sqlite_plan(rows) if sqlite else '\n'.join(row[0] for row in rows)
+                    explained += 1
+                except Exception as e:
+                    entry.plan = f'EXPLAIN failed: {e}'
+                    # A failed statement aborts the transaction on Postgres
+                    raw.rollback()
+                finally:
+                    cursor.close()
+            raw.rollback()
+        finally:
+            raw.close()
+        with self._lock:
+            self.stats['explained'] += explained
+            self.stats['explain_failed'] += len(pending) - explained
+        return explained
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def _run(self):
+        while True:
+            socketio.sleep(1.0)
+            try:
+                self.explain_pending()
+            except Exception:
+                self.app.logger.warning('Slow query EXPLAIN failed', exc_info=True)
+
+
+def _sqlite_plan(rows):
+    """Indent EXPLAIN QUERY PLAN rows (id, parent, notused, detail) into a tree."""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return '\n'.join(lines)
+
+
+slow_queries = SlowQueryLog()
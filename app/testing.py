@@ -0,0 +1,46 @@
+"""
+pytest plugin for query budgets. Load it from a conftest.py:
+
+    pytest_plugins = ['app.testing']
+
+and lock in what a route may cost:
+
+    def test_catalog_queries(client, assert_max_queries):
+        with assert_max_queries(8):
+            client.get('/catalog')
+
+Going over the budget fails the test with each repeated statement, its
+count and the template line or frame it came from (see app.nplusone).
+"""
+
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.nplusone import QueryLog
+
+
+@pytest.fixture
+def assert_max_queries():
+    """
+    Context manager factory failing the test if the block runs more than n statements.
+
+    Counts on every engine, so it needs no app context; the QueryLog is
+    yielded for tests that want to check log.total or log.entries themselves.
+    """
+    @contextmanager
+    def check(n):
+        log = QueryLog()
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            log.add(statement)
+
+        event.listen(Engine, 'before_cursor_execute', count)
+        try:
+            yield log
+        finally:
+            event.remove(Engine, 'before_cursor_execute', count)
+        if log.total > n:
+            pytest.fail(f'{log.total} statements, expected at most {n}:\n{log.describe(1)}', pytrace=False)
+
+    return check
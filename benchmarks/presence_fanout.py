@@ -0,0 +1,147 @@
+"""
+Presence fan-out benchmark.
+
+Connects a few thousand in-process Socket.IO test clients, each logged in
+as a different user with a handful of chat contacts, and counts the
+user_status packets delivered for:
+
+    1. a login wave (every user connects),
+    2. a reload wave (a share of users disconnect and reconnect within
+       one coalescing window),
+    3. a logout wave (a share of users disconnect).
+
+Each phase is compared with what the old broadcast=True handlers would
+have sent: one packet per connected socket per connect or disconnect.
+
+Usage (from the project root):
+    python benchmarks/presence_fanout.py --users 3000 --contacts 8
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore')
+
+from config import Config
+from app import create_app, db
+from app.extensions import socketio
+from app.models import User, Message
+from app.messages.presence import presence
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SOCKETIO_MESSAGE_QUEUE = None
+    SOCKETIO_LOGGER = False
+    SOCKETIO_ENGINEIO_LOGGER = False
+    RESPONSE_CACHE_BACKEND = None
+    PRESENCE_COALESCE_SECONDS = 3600 # Windows are closed by hand with presence.flush()
+    TESTING = True
+
+
+def seed(users, contacts, rng):
+    db.session.execute(db.insert(User), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'role': 'customer'}
+        for i in range(users)
+    ])
+    ids = [row[0] for row in db.session.query(User.id).order_by(User.id)]
+    messages = []
+    for sender in ids:
+        for recipient in rng.sample(ids, contacts // 2 + 1):
+            if recipient != sender:
+                messages.append({'sender_id': sender, 'recipient_id': recipient, 'body': 'hi'})
+    db.session.execute(db.insert(Message), messages)
+    db.session.commit()
+    return ids
+
+
+def connect(app, user_id):
+    http = app.test_client()
+    with http.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return socketio.test_client(app, flask_test_client=http)
+
+
+def quiet():
+    """Silence the handlers' connect/disconnect prints while a phase runs."""
+    return contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+
+def delivered(clients):
+    return sum(1 for client in clients.values() if client.is_connected()
+               for packet in client.get_received() if packet['name'] == 'user_status')
+
+
+def report(name, seconds, changes, packets, baseline):
+    saved = 100 * (1 - packets / baseline) if baseline else 0
+    print(f'{name:<14} {seconds:8.2f}s {changes:9d} {packets:12d} {baseline:14d} {saved:8.1f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--contacts', type=int, default=8, help='Approximate chat contacts per user')
+    parser.add_argument('--reload', type=float, default=0.3, help='Share of users reloading the page')
+    parser.add_argument('--logout', type=float, default=0.2, help='Share of users logging out')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        ids = seed(args.users, args.contacts, rng)
+        app.before_request_funcs.setdefault(None, []).clear() # Skip last_seen writes on the HTTP side
+    print(f'{args.users} users, ~{args.contacts} contacts each\n')
+    print(f"{'phase':<14} {'time':>9} {'changes':>9} {'delivered':>12} {'broadcast':>14} {'saved':>9}")
+
+    # 1. Login wave: the n-th connect would have been broadcast to n sockets
+    clients = {}
+    start = time.perf_counter()
+    with quiet():
+        for user_id in ids:
+            clients[user_id] = connect(app, user_id)
+        presence.flush()
+    elapsed = time.perf_counter() - start
+    report('login wave', elapsed, len(ids), delivered(clients), len(ids) * (len(ids) + 1) // 2)
+
+    # 2. Reload wave: disconnect + connect inside one window
+    reloading = rng.sample(ids, int(len(ids) * args.reload))
+    online = len(ids)
+    baseline = 0
+    start = time.perf_counter()
+    with quiet():
+        for user_id in reloading:
+            clients[user_id].disconnect()
+            baseline += online - 1
+            clients[user_id] = connect(app, user_id)
+            baseline += online
+        presence.flush()
+    elapsed = time.perf_counter() - start
+    report('reload wave', elapsed, 2 * len(reloading), delivered(clients), baseline)
+
+    # 3. Logout wave
+    leaving = rng.sample(ids, int(len(ids) * args.logout))
+    baseline = 0
+    start = time.perf_counter()
+    with quiet():
+        for user_id in leaving:
+            clients[user_id].disconnect()
+            online -= 1
+            baseline += online
+        presence.flush()
+    elapsed = time.perf_counter() - start
+    report('logout wave', elapsed, len(leaving), delivered(clients), baseline)
+
+    print(f"\npresence stats: {presence.stats}")
+
+
+if __name__ == '__main__':
+    main()
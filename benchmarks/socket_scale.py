@@ -0,0 +1,298 @@
+"""
+Idle Socket.IO connection scale benchmark.
+
+Starts the app in a server process for each async mode, opens 1k, 5k and
+10k idle WebSocket connections to it (each logged in as its own user,
+answering heartbeats like a browser tab would) and reports, per step:
+
+    - how many connections were accepted and how long the wave took,
+    - the server's resident memory and OS thread count,
+    - the round-trip time of acknowledged events sent by one more
+      client while the idle sockets stay open.
+
+The clients are raw asyncio WebSockets speaking just enough Engine.IO v4
+to connect and stay alive, so one client process can hold 10k sockets.
+The server needs about two open files per socket, so raise the hard
+open-file limit (ulimit -Hn) to at least twice the largest step first.
+
+Usage (from the project root):
+    python benchmarks/socket_scale.py --modes threading eventlet gevent --steps 1000 5000 10000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def raise_file_limit(sockets):
+    """Lift the soft open-file limit to the hard one; warn if that can't fit the sockets."""
+    import resource
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    # simple-websocket (threading, gevent) holds two descriptors per socket
+    if hard != resource.RLIM_INFINITY and hard < 2 * sockets + 1000:
+        print(f'warning: open-file limit {hard} is too low for {sockets} sockets (ulimit -n)', file=sys.stderr)
+
+
+def serve(args):
+    """Server process: patch for the async mode first, then import and run the app."""
+    if args.mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif args.mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    import warnings
+    warnings.filterwarnings('ignore')
+    from config import Config
+    from app import create_app, db
+    from app.extensions import socketio
+    from app.models import User
+
+    raise_file_limit(args.users)
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + args.db
+        SOCKETIO_ASYNC_MODE = args.mode
+        SOCKETIO_MESSAGE_QUEUE = None
+        SOCKETIO_LOGGER = False
+        SOCKETIO_ENGINEIO_LOGGER = False
+        RESPONSE_CACHE_BACKEND = None
+        CONNECTION_REGISTRY = 'memory'
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        db.create_all()
+        if not User.query.first():
+            db.session.execute(db.insert(User), [
+                {'username': f'user{i}', 'email': f'user{i}@example.com', 'role': 'customer'}
+                for i in range(args.users)
+            ])
+            db.session.commit()
+    options = {'allow_unsafe_werkzeug': True}
+    if args.mode == 'eventlet':
+        options['max_size'] = app.config['SOCKETIO_MAX_CONNECTIONS']
+    socketio.run(app, host='127.0.0.1', port=args.port, log_output=False, **options)
+
+
+def session_cookie(user_id):
+    """A signed Flask session cookie logging in user_id, as the browser would send it."""
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+    from config import Config
+    app = Flask(__name__)
+    app.secret_key = Config.SECRET_KEY
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+class Client:
+    """A WebSocket speaking Engine.IO v4 / Socket.IO v5 on the default namespace."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, port, cookie):
+        import asyncio
+        import base64
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            'GET /socket.io/?EIO=4&transport=websocket HTTP/1.1\r\n'
+            f'Host: 127.0.0.1:{port}\r\n'
+            'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n'
+            f'Cookie: session={cookie}\r\n\r\n').encode())
+        head = await reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in head.split(b'\r\n', 1)[0]:
+            raise ConnectionError(head.split(b'\r\n', 1)[0].decode())
+        client = cls(reader, writer)
+        if not (await client.recv()).startswith('0'): # Engine.IO open
+            raise ConnectionError('no open packet')
+        client.send('40')
+        while True:
+            packet = await client.recv()
+            if packet.startswith('40'):
+                return client
+            if packet.startswith('44'):
+                raise ConnectionError(packet)
+
+    def send(self, text):
+        payload = text.encode()
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x81, 0x80 | length])
+        elif length < 65536:
+            header = bytes([0x81, 0x80 | 126]) + length.to_bytes(2, 'big')
+        else:
+            header = bytes([0x81, 0x80 | 127]) + length.to_bytes(8, 'big')
+        self.writer.write(header + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+
+    async def recv(self):
+        """Next text packet; answers heartbeats and WebSocket pings on the way."""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            length = second & 0x7f
+            if length == 126:
+                length = int.from_bytes(await self.reader.readexactly(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(await self.reader.readexactly(8), 'big')
+            payload = await self.reader.readexactly(length)
+            opcode = first & 0x0f
+            if opcode == 0x8:
+                raise ConnectionError('closed by server')
+            if opcode == 0x9:
+                self.writer.write(bytes([0x8a, 0x80]) + os.urandom(4))
+                continue
+            text = payload.decode()
+            if text == '2': # Engine.IO ping
+                self.send('3')
+                continue
+            return text
+
+    async def idle(self):
+        try:
+            while True:
+                await self.recv()
+        except Exception:
+            pass
+
+    async def call(self, ack_id, event, data):
+        """Emit an event with an ack id and wait for the ack."""
+        self.send(f'42{ack_id}' + json.dumps([event, data]))
+        while True:
+            packet = await self.recv()
+            if packet.startswith(f'43{ack_id}['):
+                return
+
+    def close(self):
+        self.writer.close()
+
+
+def process_stats(pid):
+    stats = {}
+    with open(f'/proc/{pid}/status') as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'Threads'):
+                stats[key] = int(value.split()[0])
+    return stats['VmRSS'] / 1024, stats['Threads']
+
+
+def report(mode, step, alive, failed, elapsed, rss, threads, p50, p99):
+    print(f'{mode:<10} {step:8d} {alive:7d} {failed:7d} {elapsed:8.2f}s {rss:7.0f}MB '
+          f'{threads:8d} {p50:7.2f}ms {p99:7.2f}ms', flush=True)
+
+
+async def run_steps(mode, pid, port, steps, cookies, concurrency, pings):
+    import asyncio
+    clients, tasks, failed = [], [], 0
+    gate = asyncio.Semaphore(concurrency)
+
+    async def open_one(cookie):
+        async with gate:
+            return await asyncio.wait_for(Client.open(port, cookie), 30)
+
+    async def hold(cookie):
+        client = await open_one(cookie)
+        clients.append(client)
+        tasks.append(asyncio.ensure_future(client.idle())) # Answer heartbeats while the wave goes on
+
+    for step in steps:
+        start = time.perf_counter()
+        opened = await asyncio.gather(*(hold(cookies[i]) for i in range(len(clients) + failed, step)),
+                                      return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        failed += sum(1 for result in opened if isinstance(result, Exception))
+        await asyncio.sleep(2) # Let presence flushes and connect-time queries settle
+
+        rss, threads = process_stats(pid)
+        probe = await open_one(cookies[-1])
+        rtts = []
+        for ack_id in range(pings):
+            sent = time.perf_counter()
+            await asyncio.wait_for(probe.call(ack_id, 'presence_subscribe', {'user_ids': []}), 30)
+            rtts.append((time.perf_counter() - sent) * 1000)
+        probe.close()
+        rtts.sort()
+        alive = sum(1 for task in tasks if not task.done())
+        report(mode, step, alive, failed, elapsed, rss, threads,
+               rtts[len(rtts) // 2], rtts[int(len(rtts) * 0.99) - 1])
+
+    for client in clients:
+        client.close()
+    for task in tasks:
+        task.cancel()
+
+
+def wait_for_port(port, proc, timeout=60):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', default=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--steps', nargs='+', type=int, default=[1000, 5000, 10000])
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--concurrency', type=int, default=200, help='Handshakes in flight at once')
+    parser.add_argument('--pings', type=int, default=200, help='Round trips timed per step')
+    # Internal: run as the server process
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--users', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args)
+
+    import asyncio
+    users = max(args.steps) + 1
+    raise_file_limit(users)
+    cookies = [session_cookie(user_id) for user_id in range(1, users + 1)]
+
+    print(f"{'mode':<10} {'sockets':>8} {'open':>7} {'failed':>7} {'connect':>9} {'rss':>9} "
+          f"{'threads':>8} {'rtt p50':>9} {'rtt p99':>9}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as tmp, open(os.path.join(tmp, 'server.log'), 'w+') as log:
+            proc = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--serve', '--mode', mode, '--port', str(args.port),
+                 '--db', os.path.join(tmp, 'bench.db'), '--users', str(users)],
+                cwd=ROOT, stdout=subprocess.DEVNULL, stderr=log)
+            try:
+                wait_for_port(args.port, proc)
+                asyncio.run(run_steps(mode, proc.pid, args.port, args.steps, cookies,
+                                      args.concurrency, args.pings))
+            except Exception as exc:
+                print(f'{mode:<10} failed: {exc!r}', flush=True)
+                log.seek(0)
+                print(''.join(log.readlines()[-20:]))
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == '__main__':
+    main()
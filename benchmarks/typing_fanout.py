@@ -0,0 +1,159 @@
+"""
+Typing indicator benchmark.
+
+Simulates conversations in which one side types messages the way the
+chat widget reports them: `typing` true on every keystroke, false after
+a second without one and false again when the message is sent. Senders
+pause mid-message, and some leave without sending.
+
+Every client event is fed to a TypingAggregator running on simulated
+time and the typing_indicator events it emits are counted against the
+old handler, which relayed each client event to the recipient's room
+(one pub/sub publish through the message queue per event). The time the
+recipient's indicator was wrong, compared with the sender's actual
+typing, is reported for both.
+
+Usage (from the project root):
+    python benchmarks/typing_fanout.py --pairs 2000 --messages 5
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from app.messages.typing import TypingAggregator
+
+
+CLIENT_IDLE = 1.0 # chat_widget.html sends is_typing=false after this long without input
+SWEEP = 0.5 # Interval of the aggregator's background sweep
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def session(rng, messages, pause_chance, abandon_chance):
+    """
+    One sender's client events.
+
+    Returns:
+        tuple: (time, kind) events, kind being 'key', 'idle' (the widget's
+        debounced false) or 'send', and the (start, end) spans of actual typing
+    """
+    events, spans = [], []
+    t = rng.uniform(0, 30)
+    for _ in range(messages):
+        start = t
+        for _ in range(rng.randint(10, 80)):
+            events.append((t, 'key'))
+            if rng.random() < pause_chance:
+                gap = rng.uniform(0.5, 4.0) # Thinking mid-message
+            else:
+                gap = rng.uniform(0.08, 0.35)
+            if gap > CLIENT_IDLE:
+                events.append((t + CLIENT_IDLE, 'idle'))
+            t += gap
+        spans.append((start, t))
+        if rng.random() < abandon_chance:
+            events.append((t + CLIENT_IDLE, 'idle'))
+        else:
+            events.append((t, 'send'))
+            events.append((t + CLIENT_IDLE, 'idle')) # The widget's pending debounce still fires
+        t += rng.uniform(2, 20)
+    return events, spans
+
+
+def wrong_time(transitions, spans, end):
+    """Seconds the recipient's indicator disagreed with the sender actually typing."""
+    points = sorted([(t, 'shown', shown) for t, shown in transitions] +
+                    [(a, 'typing', True) for a, b in spans] + [(b, 'typing', False) for a, b in spans])
+    shown = typing = False
+    last = 0.0
+    wrong = 0.0
+    for t, kind, value in points:
+        if shown != typing:
+            wrong += t - last
+        last = t
+        if kind == 'shown':
+            shown = value
+        else:
+            typing = value
+    if shown != typing:
+        wrong += end - last
+    return wrong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pairs', type=int, default=2000, help='Conversations with someone typing')
+    parser.add_argument('--messages', type=int, default=5, help='Messages typed per conversation')
+    parser.add_argument('--pause', type=float, default=0.04, help='Chance of a pause after a keystroke')
+    parser.add_argument('--abandon', type=float, default=0.1, help='Chance a message is never sent')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    queue, spans = [], {}
+    for pair in range(args.pairs):
+        events, spans[pair] = session(rng, args.messages, args.pause, args.abandon)
+        queue.extend((t, pair, kind) for t, kind in events)
+    heapq.heapify(queue)
+
+    clock = Clock()
+    relayed = {pair: [] for pair in spans}
+    aggregated = {pair: [] for pair in spans}
+
+    def emit(sender_id, recipient_id, username, is_typing):
+        aggregated[sender_id].append((clock.now, is_typing))
+
+    aggregator = TypingAggregator(emit=emit, clock=clock)
+    aggregator.stop_delay = Config.TYPING_STOP_DELAY
+    aggregator.expiry = Config.TYPING_EXPIRY_SECONDS
+
+    start = time.perf_counter()
+    next_sweep = SWEEP
+    end = 0.0
+    while queue:
+        t, pair, kind = heapq.heappop(queue)
+        while next_sweep <= t:
+            clock.now = next_sweep
+            aggregator.sweep()
+            next_sweep += SWEEP
+        clock.now = end = t
+        if kind == 'send':
+            aggregator.stop(pair, -pair) # send_message, followed by the widget's is_typing=false
+        relayed[pair].append((t, kind == 'key'))
+        aggregator.update(pair, -pair, f'user{pair}', kind == 'key')
+    while aggregator._pairs:
+        clock.now = end = next_sweep
+        aggregator.sweep()
+        next_sweep += SWEEP
+    elapsed = time.perf_counter() - start
+
+    typing_old = aggregator.stats['received']
+    typing_new = aggregator.stats['emitted']
+    wrong_old = sum(wrong_time(relayed[pair], spans[pair], end) for pair in spans)
+    wrong_new = sum(wrong_time(aggregated[pair], spans[pair], end) for pair in spans)
+    typed = sum(b - a for pair in spans for a, b in spans[pair])
+
+    print(f'{args.pairs} conversations, {args.messages} messages each, {typed:.0f}s of typing\n')
+    print(f"{'handler':<12} {'emits':>10} {'per msg':>9} {'wrong state':>12}")
+    print(f"{'relay all':<12} {typing_old:10d} {typing_old / (args.pairs * args.messages):9.1f} "
+          f"{100 * wrong_old / typed:11.2f}%")
+    print(f"{'aggregator':<12} {typing_new:10d} {typing_new / (args.pairs * args.messages):9.1f} "
+          f"{100 * wrong_new / typed:11.2f}%")
+    print(f'\nreduction: {100 * (1 - typing_new / typing_old):.1f}%  '
+          f'({typing_old} client events handled in {elapsed:.2f}s)')
+
+
+if __name__ == '__main__':
+    main()
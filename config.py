@@ -20,6 +20,18 @@ class Config:
     # Upload Configuration
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app/static/uploads/covers')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB Limit
+    # Content-addressed image store and its background thumbnail pool
+    MEDIA_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app/static/media')
+    MEDIA_THUMBNAIL_WORKERS = int(os.environ.get('MEDIA_THUMBNAIL_WORKERS') or 2)
+    # Ebooks and audiobooks are uploaded in chunks, each under MAX_CONTENT_LENGTH
+    EBOOK_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+    EBOOK_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+    EBOOK_FILE_MAX_AGE = 3600
+    # PDF processing: page text, outline and progressive-loading chunks
+    EBOOK_PROCESS_WORKERS = int(os.environ.get('EBOOK_PROCESS_WORKERS') or 1)
+    EBOOK_CHUNK_PAGES = 10
+    # Let nginx/Apache send files (X-Sendfile) instead of the app process
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE') is not None
 
     # Email Config
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'localhost'
@@ -33,11 +45,53 @@ class Config:
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
     GEMINI_MODEL = os.environ.get('GEMINI_MODEL') or 'gemini-flash-latest'
     
+    # Response cache for anonymous catalog pages: 'simple' (per process), 'redis' or 'none'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND') or 'simple'
+    RESPONSE_CACHE_MAX_ENTRIES = 512
+    RESPONSE_CACHE_TTLS = {'main.index': 60, 'main.catalog': 120, 'main.ebook_list': 300}
+
+    # Request timing: Server-Timing headers and per-endpoint percentiles at /admin/perf
+    PERF_INSTRUMENTATION = True
+    PERF_SERVER_TIMING = True
+    PERF_SAMPLES_PER_ENDPOINT = 500  # Ring of recent requests kept per endpoint
+
+    # Prometheus text metrics at /metrics, served only once METRICS_TOKEN is set; scrapers send
+    # it as a bearer token. Without one the route is a 404
+    METRICS_ENABLED = True
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Slow-query log at /admin/perf/slow-queries: statements over SLOW_QUERY_MS are sampled,
+    # EXPLAINed in the background and kept in a ring of SLOW_QUERY_LOG_SIZE per process
+    SLOW_QUERY_LOG = True
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS') or 200)
+    SLOW_QUERY_SAMPLE_RATE = 1.0
+    SLOW_QUERY_EXPLAIN = True
+    SLOW_QUERY_LOG_SIZE = 200
+
+    # N+1 detection: log statements repeated this often in one request, with their template line.
+    # None means on under debug and testing only; NPLUSONE_RAISE turns the log into an error
+    NPLUSONE_DETECT = None
+    NPLUSONE_THRESHOLD = 5
+    NPLUSONE_RAISE = False
+
     # Redis and Socket.IO Config
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     SOCKETIO_MESSAGE_QUEUE = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
-    SOCKETIO_ASYNC_MODE = 'threading'  # Changed from 'eventlet' for Python 3.13 compatibility
+    # 'threading' (one OS thread per socket, fine for development), or 'eventlet' / 'gevent'
+    # for thousands of sockets per node; the latter two need wsgi.py or a matching gunicorn worker
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE') or 'threading'
+    SOCKETIO_MAX_CONNECTIONS = int(os.environ.get('SOCKETIO_MAX_CONNECTIONS') or 10000)  # Per process, eventlet only
     SOCKETIO_CORS_ALLOWED_ORIGINS = '*'  # Configure appropriately for production
     SOCKETIO_LOGGER = True  # Enable logging for debugging
     SOCKETIO_ENGINEIO_LOGGER = True  # Enable engine.io logging
+    PRESENCE_COALESCE_SECONDS = 2  # Status changes within this window collapse to the last one
+    CONNECTION_REGISTRY = os.environ.get('CONNECTION_REGISTRY')  # 'redis' or 'memory'; unset: redis when SOCKETIO_MESSAGE_QUEUE is set
+    CONNECTION_HEARTBEAT_SECONDS = 30  # Each process refreshes its sockets this often
+    CONNECTION_TTL_SECONDS = 90  # Sockets not refreshed for this long (crashed node) count as gone
+    MESSAGE_SYNC_BATCH_SIZE = 200  # Missed chat events sent per sync_batch
+    MESSAGE_SYNC_SETTLE_SECONDS = 5  # Newer events are resent next time in case a lower id commits late
+    MESSAGE_EVENT_RETENTION_DAYS = 30  # `flask messages prune-events` drops older sync events
+    TYPING_STOP_DELAY = 1.5  # Seconds a typing stop is held in case typing resumes
+    TYPING_EXPIRY_SECONDS = 8  # Typing indicator is cleared after this long without keystrokes
+    SOCKETIO_EVENT_DB_BUDGET_MS = 500  # SQL time one socket event may use before it is rolled back; None for no limit
 
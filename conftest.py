@@ -0,0 +1,79 @@
+"""
+Shared pytest fixtures: an app on in-memory SQLite with a small catalog,
+a member and an admin, and test clients logged in as either.
+
+app.testing is loaded as a plugin for the assert_max_queries fixture.
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import Book, Loan, Sale, User
+
+pytest_plugins = ['app.testing']
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SOCKETIO_MESSAGE_QUEUE = None
+    RESPONSE_CACHE_BACKEND = 'none'
+    WTF_CSRF_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        _seed()
+    # Not left pushed: requests would share its g, and Flask-Login caches the user there
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+def _seed():
+    admin = User(username='admin', email='admin@example.com', role='admin')
+    admin.set_password('password')
+    member = User(username='member', email='member@example.com')
+    member.set_password('password')
+    books = [Book(title=f'Book {i}', author=f'Author {i % 3}', price=100 + i,
+                  category=('Fiction', 'Islamic', 'Academic')[i % 3],
+                  stock_total=10, stock_available=8, stock_borrowed=2)
+             for i in range(20)]
+    db.session.add_all([admin, member, *books])
+    db.session.flush()
+    now = datetime.utcnow()
+    for i, book in enumerate(books):
+        db.session.add(Loan(user_id=member.id, book_id=book.id, checkout_date=now - timedelta(days=10),
+                            due_date=now + timedelta(days=i - 5), status='active'))
+        db.session.add(Sale(user_id=member.id, book_id=book.id, price_at_sale=book.price))
+    db.session.commit()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _login(app, username):
+    client = app.test_client()
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def member_client(app):
+    return _login(app, 'member')
+
+
+@pytest.fixture
+def admin_client(app):
+    return _login(app, 'admin')
@@ -0,0 +1,47 @@
+"""Keep stock_movements when a book is deleted; cascade its stock_checkpoints row
+
+Revision ID: d4a9e2c6f8b1
+Revises: c8f2a6d4e0b7
+Create Date: 2026-01-24 10:14:36.502817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9e2c6f8b1'
+down_revision = 'c8f2a6d4e0b7'
+branch_labels = None
+depends_on = None
+
+# The book_id foreign keys were created unnamed; this gives SQLite's batch mode the names
+# Postgres generated for them
+NAMING = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def _replace_book_fk(batch_op, table, ondelete):
+    batch_op.drop_constraint(f'{table}_book_id_fkey', type_='foreignkey')
+    batch_op.create_foreign_key(f'{table}_book_id_fkey', 'books', ['book_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    with op.batch_alter_table('stock_movements', schema=None, naming_convention=NAMING) as batch_op:
+        batch_op.add_column(sa.Column('book_title', sa.String(length=140), nullable=True))
+        batch_op.alter_column('book_id', existing_type=sa.Integer(), nullable=True)
+        _replace_book_fk(batch_op, 'stock_movements', 'SET NULL')
+
+    with op.batch_alter_table('stock_checkpoints', schema=None, naming_convention=NAMING) as batch_op:
+        _replace_book_fk(batch_op, 'stock_checkpoints', 'CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('stock_checkpoints', schema=None, naming_convention=NAMING) as batch_op:
+        _replace_book_fk(batch_op, 'stock_checkpoints', None)
+
+    # Rows of deleted books can't point at a book again
+    op.execute('DELETE FROM stock_movements WHERE book_id IS NULL')
+    with op.batch_alter_table('stock_movements', schema=None, naming_convention=NAMING) as batch_op:
+        _replace_book_fk(batch_op, 'stock_movements', None)
+        batch_op.alter_column('book_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('book_title')
@@ -0,0 +1,51 @@
+"""Add books.dedupe_key for catalog import duplicate matching
+
+Revision ID: e7b3c1a9d5f2
+Revises: d4a9e2c6f8b1
+Create Date: 2026-01-27 09:41:12.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3c1a9d5f2'
+down_revision = 'd4a9e2c6f8b1'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _dedupe_key(title, author):
+    # Book.make_dedupe_key as of this revision
+    return f"{(title or '').strip().lower()}\n{(author or '').strip().lower()}"
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('dedupe_key', sa.Text(), nullable=True))
+
+    books = sa.table('books', sa.column('id', sa.Integer), sa.column('title', sa.String),
+                     sa.column('author', sa.String), sa.column('dedupe_key', sa.Text))
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(sa.select(books.c.id, books.c.title, books.c.author)
+                            .where(books.c.id > last_id).order_by(books.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            break
+        conn.execute(books.update().where(books.c.id == sa.bindparam('b_id'))
+                     .values(dedupe_key=sa.bindparam('key')),
+                     [{'b_id': row.id, 'key': _dedupe_key(row.title, row.author)} for row in rows])
+        last_id = rows[-1].id
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_books_dedupe_key'), ['dedupe_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_books_dedupe_key'))
+        batch_op.drop_column('dedupe_key')
@@ -0,0 +1,94 @@
+"""Ebook search: publishing index builds and querying them."""
+
+import os
+from app.services.ebook_search_service import EBookSearchService
+
+
+def _index_folder(app, tmp_path, current, folders):
+    app.config['EBOOK_INDEX_FOLDER'] = str(tmp_path)
+    for folder in folders:
+        (tmp_path / folder).mkdir()
+    (tmp_path / 'CURRENT').write_text(current)
+
+
+def test_build_removes_only_builds_older_than_the_published_one(app, tmp_path):
+    _index_folder(app, tmp_path, 'index-100', ['index-50', 'index-100', '.building-other'])
+    with app.app_context():
+        EBookSearchService.build()
+    current = (tmp_path / 'CURRENT').read_text()
+    assert current.startswith('index-') and current != 'index-100'
+    assert sorted(os.listdir(tmp_path)) == sorted(['.building-other', 'CURRENT', 'index-100', current])
+
+
+def test_build_overtaken_by_a_newer_one_is_discarded(app, tmp_path):
+    newer = f'index-{10 ** 20}'
+    _index_folder(app, tmp_path, newer, [newer])
+    with app.app_context():
+        EBookSearchService.build()
+    assert (tmp_path / 'CURRENT').read_text() == newer
+    assert sorted(os.listdir(tmp_path)) == ['CURRENT', newer]
+
+
+def _library(app, tmp_path):
+    """Three ebooks, indexed; returns their ids by title."""
+    from app import db
+    from app.models import EBook, EBookPage
+    app.config['EBOOK_INDEX_FOLDER'] = str(tmp_path)
+    books = {
+        'Gardens of the Sea': ('Amina Rahman', ['tides and coral reefs', 'the coral garden grows slowly']),
+        'Desert Notes': ('Omar Said', ['sand and wind', 'a garden in the desert needs water',
+                                       'coral is not found here, only sand']),
+        'City Lights': ('Lena Ortiz', ['night trains and neon', 'water towers over the city']),
+    }
+    ids = {}
+    for title, (author, pages) in books.items():
+        ebook = EBook(title=title, author=author, file_path=f'ebooks/{title}.pdf', description=f'About {title}')
+        db.session.add(ebook)
+        db.session.flush()
+        db.session.add_all(EBookPage(ebook_id=ebook.id, page_number=number, text=text)
+                           for number, text in enumerate(pages, start=1))
+        ids[title] = ebook.id
+    db.session.commit()
+    EBookSearchService.build()
+    return ids
+
+
+def _hits(query):
+    return [(hit['ebook'].title, hit['page']) for hit in EBookSearchService.search(query)['hits']]
+
+
+def test_search_requires_every_term(app, tmp_path):
+    with app.app_context():
+        _library(app, tmp_path)
+        assert sorted(_hits('garden water')) == [('Desert Notes', 2)]
+        assert sorted(_hits('coral sand')) == [('Desert Notes', 3)]
+
+
+def test_search_quoted_phrase(app, tmp_path):
+    with app.app_context():
+        _library(app, tmp_path)
+        assert _hits('"coral garden"') == [('Gardens of the Sea', 2)]
+        assert _hits('"garden coral"') == []
+
+
+def test_search_missing_term_finds_nothing(app, tmp_path):
+    with app.app_context():
+        _library(app, tmp_path)
+        assert EBookSearchService.search('coral unicorn') == {'hits': [], 'total': 0, 'page': 1}
+
+
+def test_search_ranks_title_and_author_hits_first(app, tmp_path):
+    with app.app_context():
+        _library(app, tmp_path)
+        hits = _hits('gardens')
+        assert hits[0] == ('Gardens of the Sea', None)
+        assert _hits('ortiz') == [('City Lights', None)]
+
+
+def test_search_needs_login(app, client, member_client, tmp_path):
+    with app.app_context():
+        _library(app, tmp_path)
+    for url in ('/ebooks/search?q=coral', '/ebooks/search?q=coral&format=json'):
+        response = client.get(url)
+        assert response.status_code == 302 and '/login' in response.headers['Location']
+    assert member_client.get('/ebooks/search?q=coral&format=json').get_json()['total'] == 3
@@ -0,0 +1,32 @@
+"""Ebook chunking."""
+
+import os
+from pypdf import PdfReader, PdfWriter
+from app.services.ebook_service import EBookService
+
+
+def _pdf(path, pages):
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=200, height=200)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_extract_replaces_chunks_without_touching_other_jobs(tmp_path):
+    chunk_dir = tmp_path / 'chunks' / '7'
+    EBookService.extract(_pdf(tmp_path / 'old.pdf', 9), str(chunk_dir), 3)
+    assert sorted(os.listdir(chunk_dir)) == ['0.pdf', '1.pdf', '2.pdf']
+
+    # Another job's staging folder, mid-write
+    other = tmp_path / 'chunks' / '.7-other'
+    other.mkdir()
+    (other / '0.pdf').write_bytes(b'partial')
+
+    result = EBookService.extract(_pdf(tmp_path / 'new.pdf', 4), str(chunk_dir), 3)
+    assert result['page_count'] == 4
+    assert sorted(os.listdir(chunk_dir)) == ['0.pdf', '1.pdf']
+    assert len(PdfReader(str(chunk_dir / '1.pdf')).pages) == 1
+    assert (other / '0.pdf').read_bytes() == b'partial'
+    assert sorted(os.listdir(tmp_path / 'chunks')) == ['.7-other', '7']
@@ -0,0 +1,85 @@
+"""Catalog facet counts kept by the session hooks must match a full recount."""
+
+from sqlalchemy import update
+from sqlalchemy.orm import load_only
+from app import db
+from app.models import Book, CatalogFacet
+from app.services import FacetService
+
+
+def _facet_rows():
+    # Incremental deltas leave zero rows behind where a recount has none; facets() hides both
+    return sorted((f.facet, f.value, f.book_count, f.available_count)
+                  for f in CatalogFacet.query.filter(CatalogFacet.book_count > 0))
+
+
+def _assert_matches_rebuild():
+    kept = _facet_rows()
+    FacetService.rebuild()
+    db.session.commit()
+    assert kept == _facet_rows()
+    return kept
+
+
+def _book(title):
+    return Book.query.filter_by(title=title).one()
+
+
+def test_seeded_counts_match(app):
+    with app.app_context():
+        rows = _assert_matches_rebuild()
+        assert ('category', 'Fiction', 7, 7) in rows
+
+
+def test_orm_edits(app):
+    with app.app_context():
+        book = _book('Book 0')
+        book.author, book.category = 'Someone New', 'Poetry'
+        db.session.commit()
+        rows = _assert_matches_rebuild()
+        assert ('author', 'Someone New', 1, 1) in rows and ('category', 'Poetry', 1, 1) in rows
+
+
+def test_stock_crossing_zero(app):
+    with app.app_context():
+        _book('Book 0').stock_available = 0
+        _book('Book 3').stock_available = 0
+        db.session.commit()
+        assert ('category', 'Fiction', 7, 5) in _assert_matches_rebuild()
+
+        _book('Book 0').stock_available = 4
+        _book('Book 6').stock_available = 3 # Still in stock: no delta
+        db.session.commit()
+        assert ('category', 'Fiction', 7, 6) in _assert_matches_rebuild()
+
+
+def test_insert_and_delete(app):
+    with app.app_context():
+        db.session.add(Book(title='Fresh', author='Author 0', category='Fiction', price=5,
+                            stock_total=0, stock_available=0))
+        db.session.commit()
+        assert ('category', 'Fiction', 8, 7) in _assert_matches_rebuild()
+
+        db.session.delete(_book('Fresh'))
+        db.session.commit()
+        assert ('category', 'Fiction', 7, 7) in _assert_matches_rebuild()
+
+
+def test_bulk_update(app):
+    with app.app_context():
+        db.session.execute(update(Book).where(Book.category == 'Islamic').values(category='History'))
+        db.session.commit()
+        rows = _assert_matches_rebuild()
+        assert ('category', 'History', 7, 7) in rows
+        assert not [row for row in rows if row[1] == 'Islamic']
+
+
+def test_edit_of_unloaded_attributes(app):
+    with app.app_context():
+        # Neither the old category nor stock is known to the session; the flush must recount
+        book = Book.query.options(load_only(Book.id, Book.title)).filter_by(title='Book 1').one()
+        book.category = 'Poetry'
+        book.stock_available = 0
+        db.session.commit()
+        rows = _assert_matches_rebuild()
+        assert ('category', 'Poetry', 1, 0) in rows
@@ -0,0 +1,53 @@
+"""Demand forecasts from a known sales history."""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import Book, DemandForecast, Sale
+from app.services.forecast_service import DemandForecastService
+
+NOW = datetime(2026, 3, 31, 12, 0)
+
+
+def _book(title, available, sales_per_day):
+    """A book with sales_per_day[d] sales d days before NOW."""
+    book = Book(title=title, author='Forecast', price=10, stock_total=available, stock_available=available)
+    db.session.add(book)
+    db.session.flush()
+    db.session.add_all(Sale(book_id=book.id, price_at_sale=10, sale_date=NOW - timedelta(days=age, hours=1))
+                       for age, count in sales_per_day.items() for _ in range(count))
+    return book
+
+
+def test_forecast_from_known_series(app):
+    with app.app_context():
+        days = DemandForecastService.HISTORY_DAYS
+        steady = _book('Steady', available=10, sales_per_day={age: 2 for age in range(days)})
+        spike = _book('Spike', available=0, sales_per_day={0: 7})
+        quiet = _book('Quiet', available=8, sales_per_day={})
+        # Older than the history window: ignored
+        _book('Old news', available=5, sales_per_day={days: 50})
+        db.session.commit()
+
+        assert DemandForecastService.run_forecast(now=NOW) == Book.query.count()
+        forecast = {f.book.title: f for f in DemandForecast.query.filter(
+            DemandForecast.book_id.in_([steady.id, spike.id, quiet.id]))}
+
+        # Two a day, every day: smoothed level 2, no variance
+        # reorder at 2 x 7 lead days, stock up to 2 x (7 + 14) days, order 42 - 10 on hand
+        f = forecast['Steady']
+        assert f.daily_demand == pytest.approx(2.0, abs=1e-4) and f.demand_std == 0
+        assert (f.reorder_point, f.order_up_to, f.order_quantity) == (14, 42, 32)
+
+        # Seven sales today only: level = alpha x 7 = 0.7, std of [0] x 179 + [7] = 0.5203
+        # reorder ceil(0.7 x 7 + 1.65 x 0.5203 x sqrt 7) = ceil(7.17) = 8
+        # up to ceil(0.7 x 21 + 1.65 x 0.5203 x sqrt 21) = ceil(18.63) = 19, none on hand
+        f = forecast['Spike']
+        assert f.daily_demand == pytest.approx(0.7, abs=1e-4)
+        assert f.demand_std == pytest.approx(0.5203, abs=1e-4)
+        assert (f.reorder_point, f.order_up_to, f.order_quantity) == (8, 19, 19)
+
+        # No demand: the minimums, so a sold-out book still gets reordered
+        f = forecast['Quiet']
+        assert (f.daily_demand, f.reorder_point, f.order_up_to, f.order_quantity) == (0, 1, 1, 1)
+        assert DemandForecast.query.join(Book).filter(Book.title == 'Old news').one().daily_demand == 0
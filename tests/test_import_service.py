@@ -0,0 +1,52 @@
+"""Catalog imports: streaming JSON and duplicate detection."""
+
+import io
+import json
+from app.models import Book
+from app.services.import_service import CatalogImportService, JSON_READ_SIZE, _iter_json_rows
+
+
+def test_json_rows_stream_across_read_boundaries():
+    rows = [{'title': f'Title {i}', 'author': 'Someone', 'quantity': 1000 + i, 'price': i / 3} for i in range(3000)]
+    document = json.dumps({'source': 'donation', 'meta': {'books': 'not this one'}, 'books': rows, 'count': 3000})
+    assert len(document) > 3 * JSON_READ_SIZE
+    assert list(_iter_json_rows(io.StringIO(document))) == rows
+    assert list(_iter_json_rows(io.StringIO(json.dumps(rows, indent=2)))) == rows
+    assert list(_iter_json_rows(io.StringIO('{"books": []}'))) == []
+
+
+def test_import_matches_catalog_titles_with_odd_whitespace(app, tmp_path):
+    with app.app_context():
+        from app import db
+        db.session.add(Book(title='\tThe Silent Library\u00a0', author=' Rahim\u2003', price=100,
+                            stock_total=2, stock_available=2))
+        db.session.commit()
+
+        path = tmp_path / 'donation.json'
+        path.write_text(json.dumps([{'title': 'the silent library', 'author': 'RAHIM', 'quantity': 3}]))
+        job = CatalogImportService.import_file(str(path))
+
+        assert (job.status, job.created_count, job.updated_count) == ('completed', 0, 1)
+        book = Book.query.filter(Book.title.like('%Silent Library%')).one()
+        assert book.stock_total == 5
+
+
+def test_dedupe_key_follows_title_and_author_edits(app):
+    with app.app_context():
+        from app import db
+        book = Book(title=' Dune ', author='Frank HERBERT', price=10)
+        db.session.add(book)
+        db.session.commit()
+        assert book.dedupe_key == 'dune\nfrank herbert'
+        book.title = 'Dune Messiah'
+        db.session.commit()
+        assert Book.query.filter_by(dedupe_key=Book.make_dedupe_key('DUNE MESSIAH', 'frank herbert')).one() is book
+
+
+def test_duplicate_lookup_uses_the_index(app):
+    with app.app_context():
+        from app import db
+        query = db.session.query(Book.id, Book.dedupe_key).filter(Book.dedupe_key.in_(['a\nb', 'c\nd']))
+        sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+        assert 'ix_books_dedupe_key' in plan and 'SCAN books' not in plan
@@ -0,0 +1,50 @@
+"""Thumbnails and the srcset built from them."""
+
+from PIL import Image
+from app.services.media_service import MediaService
+
+
+def _original(app, tmp_path, width):
+    app.config['MEDIA_FOLDER'] = str(tmp_path)
+    path = tmp_path / 'ab' / 'cd' / f'abcd{width}.png'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', (width, width)).save(path)
+    MediaService.generate_thumbnails(str(path))
+    return f'media/ab/cd/{path.name}'
+
+
+def test_srcset_lists_real_thumbnail_widths(app, tmp_path):
+    with app.test_request_context('/'):
+        relative = _original(app, tmp_path, 300)
+        srcset = MediaService.srcset(relative)
+    # 'card' and 'detail' are both the original's 300px; listed once, never as 400w or 800w
+    assert [candidate.split()[1] for candidate in srcset.split(', ')] == ['200w', '300w']
+    assert '_card.webp 300w' in srcset
+
+
+def test_srcset_for_large_original_uses_every_size(app, tmp_path):
+    with app.test_request_context('/'):
+        relative = _original(app, tmp_path, 1000)
+        srcset = MediaService.srcset(relative)
+    assert [candidate.split()[1] for candidate in srcset.split(', ')] == ['200w', '400w', '800w']
+
+
+def test_renditions_are_looked_up_once_complete(app, tmp_path, monkeypatch):
+    with app.test_request_context('/'):
+        app.config['MEDIA_FOLDER'] = str(tmp_path)
+        path = tmp_path / 'ef' / '01' / 'ef01.png'
+        path.parent.mkdir(parents=True)
+        Image.new('RGB', (1000, 1000)).save(path)
+        relative = 'media/ef/01/ef01.png'
+
+        # No thumbnails yet: the original, and looked up again next time
+        assert MediaService.src(relative).endswith('/ef01.png')
+        MediaService.generate_thumbnails(str(path))
+        assert MediaService.src(relative).endswith('/ef01_card.webp')
+
+        stats = []
+        monkeypatch.setattr('app.services.media_service.os.path.exists', lambda p: stats.append(p) or True)
+        for _ in range(10):
+            MediaService.src(relative, 'detail')
+            MediaService.srcset(relative)
+        assert stats == []
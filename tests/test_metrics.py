@@ -0,0 +1,16 @@
+"""Access to /metrics."""
+
+
+def test_metrics_hidden_without_token(app, client):
+    app.config['METRICS_TOKEN'] = None
+    # Behind a reverse proxy every request looks like this
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 404
+
+
+def test_metrics_require_the_token(app, client):
+    app.config['METRICS_TOKEN'] = 'scrape-me'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
@@ -0,0 +1,37 @@
+"""Presence coalescing."""
+
+import pytest
+from app.extensions import socketio
+from app.messages.presence import Presence
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    events = []
+    monkeypatch.setattr(socketio, 'emit', lambda event, payload, to: events.append((to, payload['status'])))
+    monkeypatch.setattr(socketio, 'start_background_task', lambda target: object())
+    return events
+
+
+def _status(user_id, status):
+    return {'user_id': user_id, 'status': status, 'username': f'user{user_id}'}
+
+
+def test_reload_within_a_window_sends_nothing(sent):
+    presence = Presence()
+    presence.changed(1, _status(1, 'offline'))
+    presence.changed(1, _status(1, 'online'))
+    presence.changed(2, _status(2, 'online'))
+    assert presence.flush() == 1
+    assert sent == [('presence_2', 'online')]
+    assert presence.stats['coalesced'] == 1
+
+
+def test_windows_do_not_remember_earlier_ones(sent):
+    presence = Presence()
+    presence.changed(1, _status(1, 'online'))
+    presence.flush()
+    # Another node saw this user leave and told their contacts; coming back here must be sent
+    presence.changed(1, _status(1, 'online'))
+    presence.flush()
+    assert sent == [('presence_1', 'online'), ('presence_1', 'online')]
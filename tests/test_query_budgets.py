@@ -0,0 +1,62 @@
+"""Query budgets for key routes, and the N+1 detector that backs them."""
+
+import logging
+import pytest
+from app.models import Loan
+from app.nplusone import NPlusOneError, fingerprint
+
+
+def test_catalog_query_budget(client, assert_max_queries):
+    with assert_max_queries(4):
+        response = client.get('/catalog')
+    assert response.status_code == 200
+
+
+def test_index_query_budget(client, assert_max_queries):
+    with assert_max_queries(6):
+        response = client.get('/')
+    assert response.status_code == 200
+
+
+def test_admin_loans_query_budget(admin_client, assert_max_queries):
+    # 20 loans on the page; the count must not grow with them
+    with assert_max_queries(4):
+        response = admin_client.get('/admin/loans')
+    assert response.status_code == 200
+
+
+def test_fingerprint_ignores_literals_and_in_lists():
+    assert fingerprint("SELECT * FROM books WHERE id = 7 AND title = 'x'") == \
+        fingerprint("SELECT *\n  FROM books WHERE id = 12 AND title = 'y'")
+    assert fingerprint('SELECT * FROM books WHERE id IN (?, ?, ?)') == \
+        fingerprint('SELECT * FROM books WHERE id IN (?)')
+
+
+def _lazy_load_books(app):
+    """A known N+1: one SELECT per loan for its book."""
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        loans = Loan.query.all()
+        titles = [loan.book.title for loan in loans]
+        app.process_response(app.response_class())
+    return titles
+
+
+def test_detector_flags_lazy_load_loop(app, caplog):
+    with caplog.at_level(logging.WARNING, logger=app.logger.name):
+        _lazy_load_books(app)
+    assert 'N+1' in caplog.text
+    assert '20 x SELECT books.' in caplog.text
+    assert 'tests/test_query_budgets.py' in caplog.text
+
+
+def test_detector_raises_when_configured(app):
+    app.config['NPLUSONE_RAISE'] = True
+    with pytest.raises(NPlusOneError):
+        _lazy_load_books(app)
+
+
+def test_budget_overrun_fails_with_repeats(app, assert_max_queries):
+    with pytest.raises(pytest.fail.Exception, match='20 x SELECT books'):
+        with assert_max_queries(5):
+            _lazy_load_books(app)
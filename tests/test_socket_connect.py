@@ -0,0 +1,41 @@
+"""Socket connects and the connection registry."""
+
+import pytest
+from flask import request
+from flask_login import login_user
+from app.db_monitor import DBBudgetExceeded
+from app.messages import events, presence, sync
+from app.messages.connections import connections
+from app.models import User
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    # No real socket behind these sids for the server to put in rooms
+    monkeypatch.setattr(events, 'join_room', lambda room: None)
+    monkeypatch.setattr(presence, 'join_room', lambda room: None)
+    monkeypatch.setattr(connections, '_local', {})
+
+
+def _connect(app, sid, auth=None):
+    with app.test_request_context('/socket.io/'):
+        login_user(User.query.filter_by(username='member').one())
+        request.sid, request.namespace, request.event = sid, '/', {'message': 'connect', 'args': (auth,)}
+        return events.handle_connect(auth)
+
+
+def test_connect_registers_the_socket(app):
+    _connect(app, 'sid-1')
+    assert connections._local == {'sid-1': 2}
+    connections.disconnect(2, 'sid-1')
+
+
+def test_connect_refused_over_budget_is_not_registered(app, monkeypatch):
+    def over_budget(user_id, after):
+        raise DBBudgetExceeded('3 statement(s) took 80ms, budget 50ms')
+    monkeypatch.setattr(sync, 'batch', over_budget)
+
+    # A refused connect never gets a disconnect event to clean up after it
+    with pytest.raises(ConnectionRefusedError):
+        _connect(app, 'sid-2', {'last_event_id': 5})
+    assert connections._local == {}
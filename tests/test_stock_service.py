@@ -0,0 +1,125 @@
+"""The stock ledger: reconciliation, bulk receipts and deleting a book."""
+
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.models import Book, StockCheckpoint, StockMovement, SupplyOrder, SupplyOrderItem
+from app.services import StockService
+
+
+def _ledgered_book(title='Ledgered', stock=5, created_at=None):
+    """A book whose counters match its ledger, like one added through the inventory page."""
+    book = Book(title=title, author='Someone', price=100, stock_total=stock, stock_available=stock,
+                stock_borrowed=0, stock_sold=0)
+    db.session.add(book)
+    movement = StockService.record_new_book(book)
+    db.session.flush()
+    if created_at:
+        movement.created_at = created_at
+    db.session.commit()
+    return book
+
+
+def _drifting_ids(result):
+    return {row['book_id'] for row in result['drift']}
+
+
+def test_reconcile_advances_checkpoints_incrementally(app):
+    with app.app_context():
+        past = datetime.utcnow() - timedelta(minutes=5)
+        book = _ledgered_book(created_at=past)
+        first = StockService.reconcile()
+        assert first['advanced'] == 1 and first['movements'] == 1
+        assert book.id not in _drifting_ids(first)
+        checkpoint = db.session.get(StockCheckpoint, book.id)
+        assert (checkpoint.stock_total, checkpoint.stock_available) == (5, 5)
+
+        # Nothing new: the checkpoint is not re-read
+        assert StockService.reconcile()['movements'] == 0
+
+        StockService.record(book, 'restock', total=3, available=3).created_at = past
+        db.session.commit()
+        again = StockService.reconcile()
+        assert (again['advanced'], again['movements']) == (1, 1)
+        assert db.session.get(StockCheckpoint, book.id).stock_total == 8
+        assert book.id not in _drifting_ids(again)
+
+
+def test_reconcile_leaves_recent_movements_for_the_next_run(app):
+    with app.app_context():
+        book = _ledgered_book()
+        now = datetime.utcnow()
+        # Younger than the lag: possibly part of a transaction still in flight
+        result = StockService.reconcile(now=now)
+        assert result['movements'] == 0
+        assert book.id not in _drifting_ids(result)
+        assert db.session.get(StockCheckpoint, book.id) is None
+
+        later = StockService.reconcile(now=now + timedelta(seconds=StockService.RECONCILE_LAG_SECONDS + 1))
+        assert later['movements'] == 1
+        assert book.id not in _drifting_ids(later)
+
+
+def test_reconcile_reports_drift(app):
+    with app.app_context():
+        book = _ledgered_book(created_at=datetime.utcnow() - timedelta(minutes=5))
+        # A counter changed without a ledger row
+        book.stock_available = 2
+        db.session.commit()
+        drift = {row['book_id']: row for row in StockService.reconcile()['drift']}
+        assert drift[book.id]['counters']['stock_available'] == 2
+        assert drift[book.id]['ledger']['stock_available'] == 5
+        assert drift[book.id]['title'] == 'Ledgered'
+        # The seeded books have counters but no ledger at all
+        assert len(drift) == 21
+
+
+def test_receive_order_adds_received_quantities_per_book(app):
+    with app.app_context():
+        first, second = _ledgered_book('First'), _ledgered_book('Second', stock=0)
+        order = SupplyOrder(status='placed')
+        db.session.add(order)
+        db.session.flush()
+        db.session.add_all([
+            SupplyOrderItem(order_id=order.id, book_id=first.id, mass=4, payload=3),
+            SupplyOrderItem(order_id=order.id, book_id=first.id, mass=2), # never counted
+            SupplyOrderItem(order_id=order.id, book_id=second.id, mass=6, payload=6),
+        ])
+        db.session.commit()
+
+        StockService.receive_order(order, user_id=1)
+
+        assert (first.stock_total, first.stock_available) == (10, 10)
+        assert (second.stock_total, second.stock_available) == (6, 6)
+        assert order.status == 'completed'
+        assert sorted(item.payload for item in order.items) == [2, 3, 6]
+        receipts = StockMovement.query.filter_by(kind='receipt', ref_type='supply_order', ref_id=order.id)
+        assert sorted((m.book_id, m.total_delta, m.available_delta) for m in receipts) == \
+            sorted([(first.id, 5, 5), (second.id, 6, 6)])
+
+        with pytest.raises(ValueError):
+            StockService.receive_order(order)
+
+
+def test_deleting_a_book_keeps_its_ledger(app, admin_client):
+    with app.app_context():
+        past = datetime.utcnow() - timedelta(minutes=5)
+        book = _ledgered_book('Withdrawn', created_at=past)
+        StockService.record(book, 'restock', total=2, available=2).created_at = past
+        db.session.commit()
+        StockService.reconcile()
+        book_id = book.id
+
+    response = admin_client.post(f'/inventory/delete/{book_id}')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Book, book_id) is None
+        assert db.session.get(StockCheckpoint, book_id) is None
+        kept = StockMovement.query.filter_by(book_title='Withdrawn').order_by(StockMovement.id).all()
+        assert [(m.kind, m.book_id, m.total_delta) for m in kept] == [('initial', None, 5), ('restock', None, 2)]
+        # Unlinked rows are history, not a book to reconcile
+        StockService.record(db.session.get(Book, 1), 'restock', total=1, available=1).created_at = past
+        db.session.commit()
+        assert StockService.reconcile()['advanced'] == 1
+        assert StockCheckpoint.query.count() == 1
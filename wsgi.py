@@ -1,7 +1,24 @@
+from config import Config
+
+# Cooperative servers need the standard library patched before anything opens
+# a socket or starts a thread. gunicorn's eventlet/gevent workers do this themselves:
+#   gunicorn -k eventlet -w 1 --worker-connections 10000 wsgi:app
+#   gunicorn -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker -w 1 wsgi:app
+if Config.SOCKETIO_ASYNC_MODE == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif Config.SOCKETIO_ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
 from app import create_app
 from app.extensions import socketio
 
 app = create_app()
 
 if __name__ == "__main__":
-    socketio.run(app, debug=False, host='0.0.0.0', port=5000)
+    options = {}
+    if Config.SOCKETIO_ASYNC_MODE == 'eventlet':
+        # eventlet's server stops accepting at 1024 concurrent requests, and every open socket is one
+        options['max_size'] = app.config['SOCKETIO_MAX_CONNECTIONS']
+    socketio.run(app, debug=False, host='0.0.0.0', port=5000, **options)